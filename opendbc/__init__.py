@@ -15,3 +15,12 @@ def get_generated_dbcs() -> dict[str, str]:
     from opendbc.dbc.generator.generator import generate_all
     _generated_dbc_cache = generate_all()
   return _generated_dbc_cache
+
+
+def get_generated_dbc(name: str) -> str | None:
+  """Generate a single *_generated DBC, running only the generator inputs it depends on.
+  Returns None if there is no such generated DBC."""
+  if _generated_dbc_cache is not None:
+    return _generated_dbc_cache.get(name)
+  from opendbc.dbc.generator.generator import generate_dbc
+  return generate_dbc(name)
@@ -1,21 +1,27 @@
-import re
 import os
+import sys
+import hashlib
+import pickle
+import tempfile
 from collections.abc import Callable
 from dataclasses import dataclass
 from functools import cache
 
-from opendbc import DBC_PATH, get_generated_dbcs
+import numpy as np
+
+from opendbc import DBC_PATH, get_generated_dbc
 
 # TODO: these should just be passed in along with the DBC file
-from opendbc.car.honda.hondacan import honda_checksum
-from opendbc.car.toyota.toyotacan import toyota_checksum
-from opendbc.car.subaru.subarucan import subaru_checksum
-from opendbc.car.chrysler.chryslercan import chrysler_checksum, fca_giorgio_checksum
-from opendbc.car.hyundai.hyundaicanfd import hkg_can_fd_checksum
+from opendbc.car.honda.hondacan import honda_checksum, honda_checksum_batch
+from opendbc.car.toyota.toyotacan import toyota_checksum, toyota_checksum_batch
+from opendbc.car.subaru.subarucan import subaru_checksum, subaru_checksum_batch
+from opendbc.car.chrysler.chryslercan import chrysler_checksum, chrysler_checksum_batch, fca_giorgio_checksum, fca_giorgio_checksum_batch
+from opendbc.car.hyundai.hyundaicanfd import hkg_can_fd_checksum, hkg_can_fd_checksum_batch
 from opendbc.car.volkswagen.mlbcan import volkswagen_mlb_checksum
-from opendbc.car.volkswagen.mqbcan import volkswagen_meb_alt_crc_checksum, volkswagen_mqb_meb_checksum, xor_checksum
-from opendbc.car.tesla.teslacan import tesla_checksum
-from opendbc.car.body.bodycan import body_checksum
+from opendbc.car.volkswagen.mqbcan import (volkswagen_meb_alt_crc_checksum, volkswagen_mqb_meb_checksum, volkswagen_mqb_meb_checksum_batch,
+                                           xor_checksum, xor_checksum_batch)
+from opendbc.car.tesla.teslacan import tesla_checksum, tesla_checksum_batch
+from opendbc.car.body.bodycan import body_checksum, body_checksum_batch
 from opendbc.car.psa.psacan import psa_checksum
 
 
@@ -36,7 +42,7 @@ class SignalType:
   VOLKSWAGEN_MLB_CHECKSUM = 13
 
 
-@dataclass
+@dataclass(slots=True)
 class Signal:
   name: str
   start_bit: int
@@ -48,10 +54,12 @@ class Signal:
   offset: float
   is_little_endian: bool
   type: int = SignalType.DEFAULT
-  calc_checksum: 'Callable[[int, Signal, bytearray], int] | None' = None
+  calc_checksum: 'Callable[[int, Signal, bytes | bytearray | memoryview], int] | None' = None
+  # same as calc_checksum, over a (frames x bytes) uint8 array. not every checksum has one
+  calc_checksum_batch: 'Callable[[int, Signal, np.ndarray], np.ndarray] | None' = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Msg:
   name: str
   address: int
@@ -59,7 +67,7 @@ class Msg:
   sigs: dict[str, Signal]
 
 
-@dataclass
+@dataclass(slots=True)
 class Val:
   name: str
   address: int
@@ -67,42 +75,84 @@ class Val:
   sigs: dict[str, Signal] | None = None
 
 
-BO_RE = re.compile(r"^BO_ (\w+) (\w+) *: (\w+) (\w+)")
-SG_RE = re.compile(r"^SG_ (\w+) : (\d+)\|(\d+)@(\d)([+-]) \(([0-9.+\-eE]+),([0-9.+\-eE]+)\) \[[0-9.+\-eE]+\|[0-9.+\-eE]+\] \".*\" .*")
-SGM_RE = re.compile(r"^SG_ (\w+) (\w+) *: (\d+)\|(\d+)@(\d)([+-]) \(([0-9.+\-eE]+),([0-9.+\-eE]+)\) \[[0-9.+\-eE]+\|[0-9.+\-eE]+\] \".*\" .*")
-VAL_RE = re.compile(r"^VAL_ (\w+) (\w+) (.*);")
-VAL_SPLIT_RE = re.compile(r'["]+')
+# big endian (Motorola) bit numbering, walking from MSB to LSB
+BE_BITS = [j + i * 8 for i in range(64) for j in range(7, -1, -1)]
+BE_BITS_INDEX = {bit: idx for idx, bit in enumerate(BE_BITS)}
+
+
+# parsed DBCs are cached here, set OPENDBC_CACHE_DIR="" to disable
+CACHE_DIR = os.environ.get("OPENDBC_CACHE_DIR", os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "opendbc"))
+
+
+@cache
+def _cache_salt() -> bytes:
+  # Invalidate whenever the parser changes, which also covers opendbc upgrades and
+  # editable installs. Much cheaper at startup than looking up the package version.
+  with open(__file__, "rb") as f:
+    parser_digest = hashlib.sha256(f.read()).hexdigest()
+  return f"{parser_digest}:{sys.version}".encode()
+
+
+def get_cache_path(name: str, source_digest: str) -> str:
+  key = hashlib.sha256(_cache_salt() + f":{name}:{source_digest}".encode()).hexdigest()
+  return os.path.join(CACHE_DIR, f"{name}-{key[:16]}.pkl")
 
 
 @cache
 class DBC:
   def __init__(self, name: str):
     if os.path.exists(name):
-      self._parse_file(name)
+      self._load_file(name)
     else:
       dbc_path = os.path.join(DBC_PATH, name + ".dbc")
-      if content := get_generated_dbcs().get(name):
-        self._parse_content(name, content)
+      if name.endswith("_generated") and not os.path.exists(dbc_path):
+        self._load_generated(name)
       elif os.path.exists(dbc_path):
-        self._parse_file(dbc_path)
+        self._load_file(dbc_path)
       else:
         raise FileNotFoundError(f"DBC not found: {name}")
 
-  def _parse_file(self, path: str):
+  def _load_file(self, path: str):
     self.name = os.path.basename(path).replace(".dbc", "")
     with open(path) as f:
-      lines = f.readlines()
-    self._parse_lines(lines)
+      content = f.read()
+    self._load(hashlib.sha256(content.encode()).hexdigest(), lambda: content)
+
+  def _load_generated(self, name: str):
+    from opendbc.dbc.generator.generator import get_index, inputs_digest
+    if name not in get_index():
+      raise FileNotFoundError(f"DBC not found: {name}")
 
-  def _parse_content(self, name: str, content: str):
     self.name = name
-    lines = content.splitlines(keepends=True)
-    self._parse_lines(lines)
+    self._load(inputs_digest(name), lambda: get_generated_dbc(name) or "")
 
-  def _parse_lines(self, lines: list[str]):
+  def _load(self, source_digest: str, get_content: Callable[[], str]):
+    cache_path = get_cache_path(self.name, source_digest) if CACHE_DIR else None
+    if cache_path is not None and os.path.exists(cache_path):
+      try:
+        with open(cache_path, "rb") as f:
+          self.msgs, self.vals = pickle.load(f)
+        self.addr_to_msg = dict(self.msgs)
+        self.name_to_msg = {msg.name: msg for msg in self.msgs.values()}
+        return
+      except Exception:
+        pass  # stale or corrupt, re-parse and overwrite below
+
+    self._parse_lines(get_content().splitlines(keepends=True))
 
+    if cache_path is not None:
+      try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile("wb", dir=CACHE_DIR, delete=False) as f:
+          pickle.dump((self.msgs, self.vals), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, cache_path)
+      except OSError:
+        pass  # the cache is best effort, e.g. on a read-only filesystem
+
+  def _parse_lines(self, lines: list[str]):
+    """Single pass over the DBC, tokenizing BO_, SG_ (plain and multiplexed), and VAL_ lines with str
+    methods. Malformed lines are skipped, everything else (comments, attributes, ...) is ignored."""
     checksum_state = get_checksum_state(self.name)
-    be_bits = [j + i * 8 for i in range(64) for j in range(7, -1, -1)]
     self.msgs: dict[int, Msg] = {}
     self.addr_to_msg: dict[int, Msg] = {}
     self.name_to_msg: dict[str, Msg] = {}
@@ -111,53 +161,71 @@ class DBC:
     signals_temp: dict[int, dict[str, Signal]] = {}
     for line_num, line in enumerate(lines, 1):
       line = line.strip()
-      if line.startswith("BO_ "):
-        m = BO_RE.match(line)
-        if not m:
+      if line.startswith("SG_ "):
+        # SG_ <name> [<mux>] : <start>|<size>@<endianness><sign> (<factor>,<offset>) [<min>|<max>] "<unit>" <receivers>
+        head, sep, tail = line.partition(":")
+        head_tokens = head.split()
+        tokens = tail.split(None, 2)
+        if not sep or len(head_tokens) not in (2, 3) or len(tokens) < 3:
           continue
-        address = int(m.group(1), 0)
-        msg_name = m.group(2)
-        size = int(m.group(3), 0)
-        sigs = {}
-        self.msgs[address] = Msg(msg_name, address, size, sigs)
-        self.addr_to_msg[address] = self.msgs[address]
-        self.name_to_msg[msg_name] = self.msgs[address]
-        signals_temp[address] = sigs
-      elif line.startswith("SG_ "):
-        m = SG_RE.search(line)
-        offset = 0
-        if not m:
-          m = SGM_RE.search(line)
-          if not m:
-            continue
-          offset = 1
-        sig_name = m.group(1)
-        start_bit = int(m.group(2 + offset))
-        size = int(m.group(3 + offset))
-        is_little_endian = m.group(4 + offset) == "1"
-        is_signed = m.group(5 + offset) == "-"
-        factor = float(m.group(6 + offset))
-        offset_val = float(m.group(7 + offset))
+        layout, scale = tokens[0], tokens[1]
+        start_bit_str, _, layout = layout.partition("|")
+        size_str, _, byte_order = layout.partition("@")
+        factor_str, _, offset_str = scale[1:-1].partition(",")
+        if len(byte_order) != 2 or byte_order[1] not in "+-" or scale[0] != "(" or scale[-1] != ")":
+          continue
+        try:
+          start_bit = int(start_bit_str)
+          size = int(size_str)
+          factor = float(factor_str)
+          offset_val = float(offset_str)
+        except ValueError:
+          continue
+        sig_name = head_tokens[1]
+        is_little_endian = byte_order[0] == "1"
+        is_signed = byte_order[1] == "-"
 
         if is_little_endian:
           lsb = start_bit
           msb = start_bit + size - 1
         else:
-          idx = be_bits.index(start_bit)
-          lsb = be_bits[idx + size - 1]
+          lsb = BE_BITS[BE_BITS_INDEX[start_bit] + size - 1]
           msb = start_bit
 
         sig = Signal(sig_name, start_bit, msb, lsb, size, is_signed, factor, offset_val, is_little_endian)
         set_signal_type(sig, checksum_state, self.name, line_num)
         signals_temp[address][sig_name] = sig
+      elif line.startswith("BO_ "):
+        # BO_ <address> <name>: <size> <transmitter>
+        head, sep, tail = line.partition(":")
+        head_tokens = head.split()
+        tokens = tail.split()
+        if not sep or len(head_tokens) != 3 or len(tokens) < 2:
+          continue
+        try:
+          address = int(head_tokens[1], 0)
+          size = int(tokens[0], 0)
+        except ValueError:
+          continue
+        msg_name = head_tokens[2]
+        sigs = {}
+        self.msgs[address] = Msg(msg_name, address, size, sigs)
+        self.addr_to_msg[address] = self.msgs[address]
+        self.name_to_msg[msg_name] = self.msgs[address]
+        signals_temp[address] = sigs
       elif line.startswith("VAL_ "):
-        m = VAL_RE.search(line)
-        if not m:
+        # VAL_ <address> <signal> <value> "<description>" ... ;
+        body, sep, _ = line[5:].rpartition(";")
+        tokens = body.split(None, 2)
+        if not sep or len(tokens) < 2:
+          continue
+        try:
+          val_addr = int(tokens[0], 0)
+        except ValueError:
           continue
-        val_addr = int(m.group(1), 0)
-        sgname = m.group(2)
-        defs = m.group(3)
-        words = [w.strip() for w in VAL_SPLIT_RE.split(defs) if w.strip()]
+        sgname = tokens[1]
+        defs = tokens[2] if len(tokens) > 2 else ""
+        words = [w.strip() for w in defs.split('"') if w.strip()]
         words = [w.upper().replace(" ", "_") for w in words]
         val_def = " ".join(words).strip()
         self.vals.append(Val(sgname, val_addr, val_def))
@@ -173,6 +241,7 @@ def tesla_setup_signal(sig: Signal, dbc_name: str, line_num: int) -> None:
   elif sig.name.endswith("Checksum"):
     sig.type = SignalType.TESLA_CHECKSUM
     sig.calc_checksum = tesla_checksum
+    sig.calc_checksum_batch = tesla_checksum_batch
 
 
 @dataclass
@@ -183,35 +252,37 @@ class ChecksumState:
   counter_start_bit: int
   little_endian: bool
   checksum_type: int
-  calc_checksum: Callable[[int, Signal, bytearray], int] | None
+  calc_checksum: Callable[[int, Signal, bytes | bytearray | memoryview], int] | None
   setup_signal: Callable[[Signal, str, int], None] | None = None
+  calc_checksum_batch: Callable[[int, Signal, np.ndarray], np.ndarray] | None = None
 
 
 def get_checksum_state(dbc_name: str) -> ChecksumState | None:
   if dbc_name.startswith(("honda_", "acura_")):
-    return ChecksumState(4, 2, 3, 5, False, SignalType.HONDA_CHECKSUM, honda_checksum)
+    return ChecksumState(4, 2, 3, 5, False, SignalType.HONDA_CHECKSUM, honda_checksum, calc_checksum_batch=honda_checksum_batch)
   elif dbc_name.startswith(("toyota_", "lexus_")):
-    return ChecksumState(8, -1, 7, -1, False, SignalType.TOYOTA_CHECKSUM, toyota_checksum)
+    return ChecksumState(8, -1, 7, -1, False, SignalType.TOYOTA_CHECKSUM, toyota_checksum, calc_checksum_batch=toyota_checksum_batch)
   elif dbc_name.startswith("hyundai_canfd_generated"):
-    return ChecksumState(16, -1, 0, -1, True, SignalType.HKG_CAN_FD_CHECKSUM, hkg_can_fd_checksum)
+    return ChecksumState(16, -1, 0, -1, True, SignalType.HKG_CAN_FD_CHECKSUM, hkg_can_fd_checksum, calc_checksum_batch=hkg_can_fd_checksum_batch)
   elif dbc_name.startswith("vw_meb_2024"):
     return ChecksumState(8, 4, 0, 0, True, SignalType.VOLKSWAGEN_MQB_MEB_CHECKSUM, volkswagen_meb_alt_crc_checksum)
   elif dbc_name.startswith(("vw_mqb", "vw_mqbevo", "vw_meb")):
-    return ChecksumState(8, 4, 0, 0, True, SignalType.VOLKSWAGEN_MQB_MEB_CHECKSUM, volkswagen_mqb_meb_checksum)
+    return ChecksumState(8, 4, 0, 0, True, SignalType.VOLKSWAGEN_MQB_MEB_CHECKSUM, volkswagen_mqb_meb_checksum,
+                         calc_checksum_batch=volkswagen_mqb_meb_checksum_batch)
   elif dbc_name.startswith("vw_mlb"):
     return ChecksumState(8, 4, 0, 0, True, SignalType.VOLKSWAGEN_MLB_CHECKSUM, volkswagen_mlb_checksum)
   elif dbc_name.startswith("vw_pq"):
-    return ChecksumState(8, 4, 0, -1, True, SignalType.XOR_CHECKSUM, xor_checksum)
+    return ChecksumState(8, 4, 0, -1, True, SignalType.XOR_CHECKSUM, xor_checksum, calc_checksum_batch=xor_checksum_batch)
   elif dbc_name.startswith("subaru_global_"):
-    return ChecksumState(8, -1, 0, -1, True, SignalType.SUBARU_CHECKSUM, subaru_checksum)
+    return ChecksumState(8, -1, 0, -1, True, SignalType.SUBARU_CHECKSUM, subaru_checksum, calc_checksum_batch=subaru_checksum_batch)
   elif dbc_name.startswith("chrysler_"):
-    return ChecksumState(8, 4, 7, -1, False, SignalType.CHRYSLER_CHECKSUM, chrysler_checksum)
+    return ChecksumState(8, 4, 7, -1, False, SignalType.CHRYSLER_CHECKSUM, chrysler_checksum, calc_checksum_batch=chrysler_checksum_batch)
   elif dbc_name.startswith("fca_giorgio"):
-    return ChecksumState(8, -1, 7, -1, False, SignalType.FCA_GIORGIO_CHECKSUM, fca_giorgio_checksum)
+    return ChecksumState(8, -1, 7, -1, False, SignalType.FCA_GIORGIO_CHECKSUM, fca_giorgio_checksum, calc_checksum_batch=fca_giorgio_checksum_batch)
   elif dbc_name.startswith("comma_body"):
-    return ChecksumState(8, 4, 7, 3, False, SignalType.BODY_CHECKSUM, body_checksum)
+    return ChecksumState(8, 4, 7, 3, False, SignalType.BODY_CHECKSUM, body_checksum, calc_checksum_batch=body_checksum_batch)
   elif dbc_name.startswith("tesla_model3_party"):
-    return ChecksumState(8, -1, 0, -1, True, SignalType.TESLA_CHECKSUM, tesla_checksum, tesla_setup_signal)
+    return ChecksumState(8, -1, 0, -1, True, SignalType.TESLA_CHECKSUM, tesla_checksum, tesla_setup_signal, tesla_checksum_batch)
   elif dbc_name.startswith("psa_"):
     return ChecksumState(4, 4, 7, 3, False, SignalType.PSA_CHECKSUM, psa_checksum)
   return None
@@ -219,11 +290,13 @@ def get_checksum_state(dbc_name: str) -> ChecksumState | None:
 
 def set_signal_type(sig: Signal, chk: ChecksumState | None, dbc_name: str, line_num: int) -> None:
   sig.calc_checksum = None
+  sig.calc_checksum_batch = None
   if chk:
     if chk.setup_signal:
       chk.setup_signal(sig, dbc_name, line_num)
     if sig.name == "CHECKSUM":
       sig.type = chk.checksum_type
       sig.calc_checksum = chk.calc_checksum
+      sig.calc_checksum_batch = chk.calc_checksum_batch
     elif sig.name == "COUNTER":
       sig.type = SignalType.COUNTER
@@ -1,19 +1,108 @@
 import math
+from dataclasses import dataclass
+from typing import NamedTuple
 
 from opendbc.car.carlog import carlog
-from opendbc.can.dbc import DBC, Signal, SignalType
+from opendbc.can.dbc import DBC, Msg, Signal, SignalType
+from opendbc.can.parser import compile_decoders
+
+
+class SignalEncoder(NamedTuple):
+  little_endian: bool
+  shift: int
+  mask: int
+  keep: int  # clears the signal's bits in the integer of its own byte order
+  keep_other: int  # clears the same bits in the integer of the other byte order
+  factor: float
+  offset: float
+
+
+@dataclass
+class PackPlan:
+  size: int
+  encoders: dict[str, SignalEncoder] | None  # None if the message needs the generic set_value path
+  counter_names: frozenset[str]
+  counter: Signal | None
+  checksum: Signal | None
+
+
+def compile_pack_plan(msg: Msg) -> PackPlan:
+  """Signals are packed into one little endian and one big endian integer, which are merged into the
+  frame at the end. Writing a signal also clears its bits in the other integer, so overlapping signals
+  of different byte orders still resolve to the last write, as with set_value."""
+  sigs = list(msg.sigs.values())
+  counter_names = frozenset(s.name for s in sigs if s.type == SignalType.COUNTER or s.name == "COUNTER")
+  counter = next((s for s in sigs if s.name in counter_names), None)
+  checksum = next((s for s in sigs if s.type > SignalType.COUNTER), None)
+
+  encoders = None
+  if (decoders := compile_decoders(msg.size, sigs)) is not None:
+    encoders = {}
+    for sig, d in zip(sigs, decoders, strict=True):
+      bits = (d.mask << d.shift).to_bytes(msg.size, "little" if d.little_endian else "big")
+      other_bits = int.from_bytes(bits, "big" if d.little_endian else "little")
+      encoders[sig.name] = SignalEncoder(d.little_endian, d.shift, d.mask, ~(d.mask << d.shift), ~other_bits, d.factor, d.offset)
+  return PackPlan(msg.size, encoders, counter_names, counter, checksum)
 
 
 class CANPacker:
   def __init__(self, dbc_name: str):
     self.dbc = DBC(dbc_name)
     self.counters: dict[int, int] = {}
+    self.plans: dict[int, PackPlan] = {address: compile_pack_plan(msg) for address, msg in self.dbc.addr_to_msg.items()}
+    self.prepared: dict[tuple[str | int, tuple[str, ...]], PreparedMessage] = {}
 
   def pack(self, address: int, values: dict[str, float]) -> bytearray:
-    msg = self.dbc.addr_to_msg.get(address)
-    if msg is None:
+    plan = self.plans.get(address)
+    if plan is None:
       carlog.error(f"msg not found for {address=}")
       return bytearray()
+    if plan.encoders is None:
+      return self._pack_generic(address, values)
+
+    le = be = 0
+    counter_set = False
+    for name, value in values.items():
+      enc = plan.encoders.get(name)
+      if enc is None:
+        carlog.error(f"unknown signal {name=} in {self.dbc.addr_to_msg[address].name}")
+        continue
+      ival = int(math.floor((value - enc.offset) / enc.factor + 0.5)) & enc.mask
+      if enc.little_endian:
+        le = (le & enc.keep) | (ival << enc.shift)
+        be &= enc.keep_other
+      else:
+        be = (be & enc.keep) | (ival << enc.shift)
+        le &= enc.keep_other
+      if name in plan.counter_names:
+        self.counters[address] = int(value)
+        counter_set = True
+
+    return self._finish(address, plan, le, be, counter_set)
+
+  def _finish(self, address: int, plan: PackPlan, le: int, be: int, counter_set: bool) -> bytearray:
+    # fill in the counter if it wasn't set, merge the byte orders, and set the checksum
+    assert plan.encoders is not None
+    if plan.counter is not None and not counter_set:
+      enc = plan.encoders[plan.counter.name]
+      counter = self.counters.get(address, 0)
+      if enc.little_endian:
+        le = (le & enc.keep) | ((counter & enc.mask) << enc.shift)
+        be &= enc.keep_other
+      else:
+        be = (be & enc.keep) | ((counter & enc.mask) << enc.shift)
+        le &= enc.keep_other
+      self.counters[address] = (counter + 1) % (1 << plan.counter.size)
+
+    dat = bytearray((le | int.from_bytes(be.to_bytes(plan.size, "big"), "little")).to_bytes(plan.size, "little"))
+    if plan.checksum is not None and plan.checksum.calc_checksum:
+      checksum = plan.checksum.calc_checksum(address, plan.checksum, dat)
+      set_value(dat, plan.checksum, checksum)
+    return dat
+
+  def _pack_generic(self, address: int, values: dict[str, float]) -> bytearray:
+    msg = self.dbc.addr_to_msg[address]
+    plan = self.plans[address]
     dat = bytearray(msg.size)
     counter_set = False
     for name, value in values.items():
@@ -25,21 +114,28 @@ class CANPacker:
       if ival < 0:
         ival = (1 << sig.size) + ival
       set_value(dat, sig, ival)
-      if sig.type == SignalType.COUNTER or sig.name == "COUNTER":
+      if name in plan.counter_names:
         self.counters[address] = int(value)
         counter_set = True
-    sig_counter = next((s for s in msg.sigs.values() if s.type == SignalType.COUNTER or s.name == "COUNTER"), None)
-    if sig_counter and not counter_set:
+    if plan.counter is not None and not counter_set:
       if address not in self.counters:
         self.counters[address] = 0
-      set_value(dat, sig_counter, self.counters[address])
-      self.counters[address] = (self.counters[address] + 1) % (1 << sig_counter.size)
-    sig_checksum = next((s for s in msg.sigs.values() if s.type > SignalType.COUNTER), None)
-    if sig_checksum and sig_checksum.calc_checksum:
-      checksum = sig_checksum.calc_checksum(address, sig_checksum, dat)
-      set_value(dat, sig_checksum, checksum)
+      set_value(dat, plan.counter, self.counters[address])
+      self.counters[address] = (self.counters[address] + 1) % (1 << plan.counter.size)
+    if plan.checksum is not None and plan.checksum.calc_checksum:
+      checksum = plan.checksum.calc_checksum(address, plan.checksum, dat)
+      set_value(dat, plan.checksum, checksum)
     return dat
 
+  def prepare(self, name_or_addr, signal_names: tuple[str, ...] | list[str]) -> 'PreparedMessage':
+    """Returns a callable that packs name_or_addr from values given positionally, in the order of
+    signal_names, skipping the values dict and the per-signal name lookups of make_can_msg.
+    Prepared messages are memoized, so this is cheap to call every frame."""
+    key = (name_or_addr, tuple(signal_names))
+    if (prepared := self.prepared.get(key)) is None:
+      prepared = self.prepared[key] = PreparedMessage(self, name_or_addr, key[1])
+    return prepared
+
   def make_can_msg(self, name_or_addr, bus: int, values: dict[str, float]):
     if isinstance(name_or_addr, int):
       addr = name_or_addr
@@ -55,6 +151,59 @@ class CANPacker:
     return addr, bytes(dat), bus
 
 
+class PreparedMessage:
+  def __init__(self, packer: CANPacker, name_or_addr, signal_names: tuple[str, ...]):
+    self.packer = packer
+    self.signal_names = signal_names
+    if isinstance(name_or_addr, int):
+      msg = packer.dbc.addr_to_msg.get(name_or_addr)
+    else:
+      msg = packer.dbc.name_to_msg.get(name_or_addr)
+    if msg is None:
+      carlog.error(f"msg not found for {name_or_addr=}")
+    self.address = msg.address if msg is not None else 0
+    self.plan = packer.plans.get(self.address)
+
+    # unknown signals are ignored like in make_can_msg, but only reported once
+    self.encoders: list[SignalEncoder | None] = []
+    self.counter_idx: int | None = None
+    if self.plan is not None and self.plan.encoders is not None:
+      for i, name in enumerate(signal_names):
+        enc = self.plan.encoders.get(name)
+        if enc is None:
+          carlog.error(f"unknown signal {name=} in {msg.name}")
+        elif name in self.plan.counter_names:
+          self.counter_idx = i
+        self.encoders.append(enc)
+
+  def pack(self, *values: float) -> bytearray:
+    plan = self.plan
+    if plan is None or plan.encoders is None:
+      return self.packer.pack(self.address, dict(zip(self.signal_names, values, strict=True)))
+
+    le = be = 0
+    for enc, value in zip(self.encoders, values, strict=True):
+      if enc is None:
+        continue
+      ival = int(math.floor((value - enc.offset) / enc.factor + 0.5)) & enc.mask
+      if enc.little_endian:
+        le = (le & enc.keep) | (ival << enc.shift)
+        be &= enc.keep_other
+      else:
+        be = (be & enc.keep) | (ival << enc.shift)
+        le &= enc.keep_other
+
+    if self.counter_idx is not None:
+      self.packer.counters[self.address] = int(values[self.counter_idx])
+    return self.packer._finish(self.address, plan, le, be, self.counter_idx is not None)
+
+  def __call__(self, bus: int, *values: float):
+    """Same as CANPacker.make_can_msg"""
+    if self.plan is None:
+      return 0, b'', bus
+    return self.address, bytes(self.pack(*values)), bus
+
+
 def set_value(msg: bytearray, sig: Signal, ival: int) -> None:
   i = sig.lsb // 8
   bits = sig.size
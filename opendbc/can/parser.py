@@ -1,7 +1,14 @@
+import heapq
 import math
 import numbers
-from collections import defaultdict, deque
+import time
+from array import array
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Sequence
 from dataclasses import dataclass, field
+from typing import NamedTuple
+
+import numpy as np
 
 from opendbc.car.carlog import carlog
 from opendbc.can.dbc import DBC, Signal
@@ -9,6 +16,11 @@ from opendbc.can.dbc import DBC, Signal
 
 MAX_BAD_COUNTER = 5
 CAN_INVALID_CNT = 5
+BUS_TIMEOUT_THRESHOLD = 500 * 1_000_000
+
+# checksum and counter validation policies, see CANParser
+VALIDATION_MODES = ("full", "sampled", "deferred", "off")
+DEFERRED_BATCH_MIN = 16  # below this many frames, per-frame checksums beat the NumPy overhead
 
 
 def get_raw_value(dat: bytes | bytearray, sig: Signal) -> int:
@@ -26,7 +38,183 @@ def get_raw_value(dat: bytes | bytearray, sig: Signal) -> int:
   return ret
 
 
-@dataclass
+class SignalDecoder(NamedTuple):
+  little_endian: bool
+  shift: int
+  mask: int
+  sign_bit: int  # 0 for unsigned signals
+  factor: float
+  offset: float
+
+
+def compile_decoders(size: int, signals: list[Signal]) -> list[SignalDecoder] | None:
+  """Compile signals into shift/mask decoders for frames of exactly `size` bytes.
+
+  The frame is read as one integer per byte order, so every signal becomes a single
+  shift and mask. Returns None if any signal does not fit, in which case frames are
+  decoded with get_raw_value."""
+  decoders = []
+  for sig in signals:
+    if max(sig.msb, sig.lsb) // 8 >= size:
+      return None
+    if sig.is_little_endian:
+      shift = sig.lsb
+    else:
+      shift = (size - 1 - sig.lsb // 8) * 8 + sig.lsb % 8
+    sign_bit = (1 << (sig.size - 1)) if sig.is_signed else 0
+    decoders.append(SignalDecoder(sig.is_little_endian, shift, (1 << sig.size) - 1, sign_bit, sig.factor, sig.offset))
+  return decoders
+
+
+def get_raw_values(frames: np.ndarray, sig: Signal) -> np.ndarray:
+  """Vectorized get_raw_value over the rows of a (frames x bytes) uint8 array.
+  Returns signed values as int64 and unsigned values as uint64."""
+  ret = np.zeros(len(frames), dtype=np.uint64)
+  i = sig.msb // 8
+  bits = sig.size
+  while 0 <= i < frames.shape[1] and bits > 0:
+    lsb = sig.lsb if (sig.lsb // 8) == i else i * 8
+    msb = sig.msb if (sig.msb // 8) == i else (i + 1) * 8 - 1
+    size = msb - lsb + 1
+    d = (frames[:, i].astype(np.uint64) >> np.uint64(lsb - (i * 8))) & np.uint64((1 << size) - 1)
+    ret |= d << np.uint64(bits - size)
+    bits -= size
+    i = i - 1 if sig.is_little_endian else i + 1
+
+  if not sig.is_signed:
+    return ret
+  if sig.size == 64:
+    return ret.view(np.int64)
+  signed = ret.astype(np.int64)
+  return signed - (((signed >> (sig.size - 1)) & 1) << sig.size)
+
+
+def calc_checksums(address: int, sig: Signal, frames: np.ndarray) -> np.ndarray:
+  """Expected checksum for each row of a (frames x bytes) uint8 array, vectorized where the checksum supports it"""
+  if sig.calc_checksum_batch is not None:
+    return sig.calc_checksum_batch(address, sig, frames)
+  assert sig.calc_checksum is not None
+  return np.fromiter((sig.calc_checksum(address, sig, row.tobytes()) for row in frames), dtype=np.int64, count=len(frames))
+
+
+def as_frame_array(data, width: int = 64) -> np.ndarray:
+  """Convert a sequence of frame payloads into a zero-padded (frames x width) uint8 array."""
+  if isinstance(data, np.ndarray):
+    frames = np.asarray(data, dtype=np.uint8)
+  else:
+    frames = np.frombuffer(b"".join(bytes(d[:width]).ljust(width, b"\x00") for d in data), dtype=np.uint8).reshape(-1, width)
+  if frames.shape[1] < width:
+    frames = np.pad(frames, ((0, 0), (0, width - frames.shape[1])))
+  return frames
+
+
+class SignalHistory(Sequence):
+  """Fixed-size ring buffer holding the latest values of a signal.
+
+  A bounded drop-in for the vl_all lists: once full, each append overwrites the
+  oldest value, so memory stays flat no matter how many frames an update() gets."""
+  __slots__ = ("depth", "buf", "start", "count")
+
+  def __init__(self, depth: int):
+    assert depth > 0
+    self.depth = depth
+    self.buf = array('d', bytes(8 * depth))
+    self.start = 0
+    self.count = 0
+
+  def append(self, val: float) -> None:
+    if self.count < self.depth:
+      self.buf[(self.start + self.count) % self.depth] = val
+      self.count += 1
+    else:
+      self.buf[self.start] = val
+      self.start = (self.start + 1) % self.depth
+
+  def clear(self) -> None:
+    self.start = 0
+    self.count = 0
+
+  def __len__(self) -> int:
+    return self.count
+
+  def __getitem__(self, idx):
+    if isinstance(idx, slice):
+      return [self[i] for i in range(*idx.indices(self.count))]
+    if idx < 0:
+      idx += self.count
+    if not 0 <= idx < self.count:
+      raise IndexError("SignalHistory index out of range")
+    return self.buf[(self.start + idx) % self.depth]
+
+  def __iter__(self):
+    end = self.start + self.count
+    if end <= self.depth:
+      return iter(self.buf[self.start:end])
+    return iter(self.buf[self.start:] + self.buf[:end - self.depth])
+
+  def __eq__(self, other) -> bool:
+    if isinstance(other, Sequence):
+      return list(self) == list(other)
+    return NotImplemented
+
+  def __repr__(self) -> str:
+    return f"SignalHistory({list(self)!r}, depth={self.depth})"
+
+
+class TimestampRing:
+  """Receive times of a message in nanoseconds, the latest always and a window of the last maxlen
+  while estimating the message's frequency.
+
+  The window is an int64 array that grows up to maxlen and then wraps around. It's dropped with
+  release() once the frequency is known, or right away if it's given, after which only the
+  latest time is kept."""
+  __slots__ = ("maxlen", "buf", "start", "count", "last", "windowed")
+
+  def __init__(self, maxlen: int = 500):
+    self.maxlen = maxlen
+    self.buf: array | None = None
+    self.start = 0
+    self.count = 0
+    self.last = 0
+    self.windowed = True
+
+  def append(self, nanos: int) -> None:
+    self.last = nanos
+    if not self.windowed:
+      self.count = 1
+      return
+    if self.buf is None:
+      self.buf = array("q")
+    if self.count < self.maxlen:
+      # not wrapped around yet, so start is 0
+      self.buf.append(nanos)
+      self.count += 1
+    else:
+      self.buf[self.start] = nanos
+      self.start = (self.start + 1) % self.maxlen
+
+  def release(self) -> None:
+    self.windowed = False
+    self.buf = None
+    self.start = 0
+    self.count = min(self.count, 1)
+
+  def __len__(self) -> int:
+    return self.count
+
+  def __getitem__(self, i: int) -> int:
+    if i == -1 and self.count:
+      return self.last
+    if self.buf is None or not -self.count <= i < self.count:
+      raise IndexError("timestamp index out of range")
+    return self.buf[(self.start + i % self.count) % self.maxlen]
+
+  def __repr__(self) -> str:
+    window = [self[i] for i in range(self.count)] if self.buf is not None else []
+    return f"TimestampRing(last={self.last}, window={window}, maxlen={self.maxlen})"
+
+
+@dataclass(slots=True)
 class MessageState:
   address: int
   name: str
@@ -38,66 +226,134 @@ class MessageState:
   frequency: float = 0.0
   timeout_threshold: float = 1e5  # default to 1Hz threshold
   vals: list[float] = field(default_factory=list)
-  all_vals: list[list[float]] = field(default_factory=list)
-  timestamps: deque[int] = field(default_factory=lambda: deque(maxlen=500))
+  all_vals: list[list[float] | SignalHistory] = field(default_factory=list)
+  history_depth: int = 0  # 0 keeps every value since the last update() in a list
+  timestamps: TimestampRing = field(default_factory=TimestampRing)
   counter: int = 0
   counter_fail: int = 0
   first_seen_nanos: int = 0
   last_warning_log_nanos: int = 0
+  decoders: list[SignalDecoder] | None = None
+  checksum_signals: list[tuple[int, Signal]] = field(default_factory=list)
+  counter_signals: list[tuple[int, Signal]] = field(default_factory=list)
+  signal_names: list[str] = field(default_factory=list)
+  validation: str = "full"
+  sample_every: int = 1
+  checksum_countdown: int = 0
+  deferred: list[tuple[int, bytes | bytearray]] = field(default_factory=list)
+  checksum_fail: int = 0  # frames that failed a deferred check in the last update
+  checksum_errors: int = 0  # failed checksums and counters since the parser was created
+  counter_errors: int = 0
+  on_timeout_change: 'Callable[[MessageState], None] | None' = None
+
+  def __post_init__(self):
+    self.signal_names = [s.name for s in self.signals]
+    self.decoders = compile_decoders(self.size, self.signals)
+    self.checksum_signals = [(i, s) for i, s in enumerate(self.signals) if s.calc_checksum is not None]
+    self.counter_signals = [(i, s) for i, s in enumerate(self.signals) if s.type == 1]  # COUNTER
 
   def rate_limited_log(self, last_update_nanos: int, msg: str) -> None:
     if (last_update_nanos - self.last_warning_log_nanos) >= 1_000_000_000:
       carlog.warning(f"CANParser: {hex(self.address)} {self.name} {msg}")
       self.last_warning_log_nanos = last_update_nanos
 
-  def parse(self, nanos: int, dat: bytes) -> bool:
-    tmp_vals: list[float] = [0.0] * len(self.signals)
+  def parse(self, nanos: int, dat: bytes | bytearray | memoryview) -> bool:
     checksum_failed = False
     counter_failed = False
 
     if self.first_seen_nanos == 0:
       self.first_seen_nanos = nanos
 
-    for i, sig in enumerate(self.signals):
-      tmp = get_raw_value(dat, sig)
-      if sig.is_signed:
-        tmp -= ((tmp >> (sig.size - 1)) & 0x1) * (1 << sig.size)
-
-      if not self.ignore_checksum and sig.calc_checksum is not None:
-        expected_checksum = sig.calc_checksum(self.address, sig, bytearray(dat))
-        if tmp != expected_checksum:
-          checksum_failed = True
-          self.rate_limited_log(nanos, f"checksum failed: received {hex(tmp)}, calculated {hex(expected_checksum)}")
-
-      if not self.ignore_counter and sig.type == 1:  # COUNTER
-        if not self.update_counter(tmp, sig.size):
+    if self.decoders is not None and len(dat) == self.size:
+      le = int.from_bytes(dat, "little")
+      be = int.from_bytes(dat, "big")
+      raw = [((((le if little_endian else be) >> shift) & mask) ^ sign_bit) - sign_bit
+             for little_endian, shift, mask, sign_bit, _, _ in self.decoders]
+    else:
+      raw = [get_raw_value(dat, sig) for sig in self.signals]
+      for i, sig in enumerate(self.signals):
+        if sig.is_signed:
+          raw[i] -= ((raw[i] >> (sig.size - 1)) & 0x1) * (1 << sig.size)
+
+    if not self.ignore_checksum and self.checksum_signals and self.validation != "off":
+      if self.validation == "deferred":
+        # the payload may be a view into a receive buffer that's reused after update()
+        self.deferred.append((nanos, dat if isinstance(dat, bytes) else bytes(dat)))
+      elif self.checksum_countdown > 0:
+        self.checksum_countdown -= 1
+      else:
+        self.checksum_countdown = self.sample_every - 1 if self.validation == "sampled" else 0
+        checksum_failed = not self.check_checksums(nanos, raw, dat)
+
+    # counters are tracked on every frame, so a mode switch or sampled check never sees a stale counter
+    if not self.ignore_counter:
+      for i, sig in self.counter_signals:
+        if self.validation == "off":
+          self.counter = raw[i]
+        elif not self.update_counter(raw[i], sig.size):
           counter_failed = True
 
-      tmp_vals[i] = tmp * sig.factor + sig.offset
-
     # must have good counter and checksum to update data
     if checksum_failed or counter_failed:
       return False
 
     if not self.vals:
-      self.vals = [0.0] * len(self.signals)
-      self.all_vals = [[] for _ in self.signals]
+      if self.history_depth > 0:
+        self.all_vals = [SignalHistory(self.history_depth) for _ in self.signals]
+      else:
+        self.all_vals = [[] for _ in self.signals]
 
-    for i, v in enumerate(tmp_vals):
-      self.vals[i] = v
-      self.all_vals[i].append(v)
+    self.vals = [r * sig.factor + sig.offset for r, sig in zip(raw, self.signals, strict=True)]
+    for v, all_v in zip(self.vals, self.all_vals, strict=True):
+      all_v.append(v)
 
     self.timestamps.append(nanos)
 
     if self.frequency < 1e-5 and len(self.timestamps) >= 3:
-      dt = (self.timestamps[-1] - self.timestamps[0]) * 1e-9
-      if (dt > 1.0 or (self.timestamps.maxlen is not None and len(self.timestamps) >= self.timestamps.maxlen)) and dt != 0:
+      dt = (self.timestamps.last - self.timestamps[0]) * 1e-9
+      if (dt > 1.0 or len(self.timestamps) >= self.timestamps.maxlen) and dt != 0:
         self.frequency = min(len(self.timestamps) / dt, 100.0)
         self.timeout_threshold = (1_000_000_000 / self.frequency) * 10
+        if self.frequency >= 1e-5:
+          self.timestamps.release()
+        if self.on_timeout_change is not None:
+          self.on_timeout_change(self)
     return True
 
+  def check_checksums(self, nanos: int, raw: list[int] | dict[int, int], dat: bytes | bytearray | memoryview) -> bool:
+    # raw holds the received values, indexed like self.signals
+    ok = True
+    for i, sig in self.checksum_signals:
+      expected_checksum = sig.calc_checksum(self.address, sig, dat)
+      if raw[i] != expected_checksum:
+        ok = False
+        self.checksum_errors += 1
+        self.rate_limited_log(nanos, f"checksum failed: received {hex(raw[i])}, calculated {hex(expected_checksum)}")
+    return ok
+
+  def check_deferred(self) -> int:
+    """Checks the checksums of the frames queued by deferred validation, returns how many failed"""
+    frames, self.deferred = self.deferred, []
+    self.checksum_fail = 0
+    if len(frames) >= DEFERRED_BATCH_MIN and all(len(dat) == self.size for _, dat in frames):
+      rows = as_frame_array([dat for _, dat in frames], self.size)
+      ok = np.ones(len(frames), dtype=bool)
+      for _, sig in self.checksum_signals:
+        ok &= get_raw_values(rows, sig) == calc_checksums(self.address, sig, rows)
+      self.checksum_fail = len(frames) - int(ok.sum())
+      self.checksum_errors += self.checksum_fail
+      if self.checksum_fail:
+        self.rate_limited_log(frames[-1][0], f"checksum failed on {self.checksum_fail} of {len(frames)} frames")
+    else:
+      for nanos, dat in frames:
+        raw = {i: get_raw_value(dat, sig) for i, sig in self.checksum_signals}
+        if not self.check_checksums(nanos, raw, dat):
+          self.checksum_fail += 1
+    return self.checksum_fail
+
   def update_counter(self, cur_count: int, cnt_size: int) -> bool:
     if ((self.counter + 1) & ((1 << cnt_size) - 1)) != cur_count:
+      self.counter_errors += 1
       self.counter_fail = min(self.counter_fail + 1, MAX_BAD_COUNTER)
     elif self.counter_fail > 0:
       self.counter_fail -= 1
@@ -109,16 +365,47 @@ class MessageState:
       return True
     if not self.timestamps:
       return False
-    if (current_nanos - self.timestamps[-1]) > self.timeout_threshold:
+    if (current_nanos - self.timestamps.last) > self.timeout_threshold:
       return False
     return True
 
+  @property
+  def deadline(self) -> float:
+    """Time after which this message has timed out, if it isn't received again"""
+    return self.timestamps.last + self.timeout_threshold
+
+
+@dataclass(slots=True)
+class ParserStats:
+  """Opt-in counters of where a CANParser's time goes, see CANParser.enable_stats()"""
+  frames: dict[int, int] = field(default_factory=lambda: defaultdict(int))
+  parse_nanos: dict[int, int] = field(default_factory=lambda: defaultdict(int))
+  dropped: dict[int, int] = field(default_factory=lambda: defaultdict(int))  # frames on the bus with untracked addresses
+  log_interval_nanos: int = 0
+  top_n: int = 5
+  last_log_nanos: int = 0
+
+  def record(self, address: int, nanos: int) -> None:
+    self.frames[address] += 1
+    self.parse_nanos[address] += nanos
 
-class VLDict(dict):
+
+class LazyDict(dict):
+  """Per-message dict view that brings itself up to date with its MessageState on access."""
   def __init__(self, parser):
     super().__init__()
     self.parser = parser
 
+  def __getitem__(self, key):
+    if key in self.parser.dirty:
+      self.parser._sync(self.parser.dirty[key])
+    return super().__getitem__(key)
+
+  def get(self, key, default=None):
+    return self[key] if key in self else default
+
+
+class VLDict(LazyDict):
   def __getitem__(self, key):
     if key not in self:
       self.parser._add_message(key)
@@ -126,17 +413,58 @@ class VLDict(dict):
 
 
 class CANParser:
-  def __init__(self, dbc_name: str, messages: list[tuple[str | int, int]], bus: int):
+  def __init__(self, dbc_name: str, messages: list[tuple[str | int, int]], bus: int, history_depth: int = 0, lazy: bool = False,
+               validation: str = "full", sample_every: int = 10, stats: bool = False):
+    """history_depth > 0 keeps only the last history_depth values per signal in vl_all,
+    in preallocated ring buffers, instead of every value since the last update().
+
+    lazy=True leaves parsed values in the MessageStates and only copies them into vl,
+    vl_all and ts_nanos when a message is looked up, so messages that are never read
+    cost nothing. Iterating over those dicts directly skips the update.
+
+    validation sets how strictly checksums and counters are checked, for trading strictness for
+    throughput on trusted logs:
+      full:     every frame, frames failing either check are dropped
+      sampled:  checksums on one in sample_every frames, counters on every frame
+      deferred: frames are applied right away and their checksums are checked in one batch at
+                the end of update(). failures don't roll values back, but make can_valid false
+      off:      nothing is dropped. counters are still tracked, just never fail
+
+    stats=True enables the performance counters from the start, see enable_stats()."""
+    if validation not in VALIDATION_MODES:
+      raise ValueError(f"unknown validation mode {validation!r}, expected one of {VALIDATION_MODES}")
+    if sample_every < 1:
+      raise ValueError(f"sample_every must be at least 1, got {sample_every}")
     self.dbc_name: str = dbc_name
     self.bus: int = bus
+    self.history_depth: int = history_depth
+    self.lazy: bool = lazy
+    self.validation: str = validation
+    self.sample_every: int = sample_every
+    self.stats: ParserStats | None = None
     self.dbc = DBC(dbc_name)
 
+    # MessageStates with values not yet copied to the dicts, by address and name
+    self.dirty: dict[int | str, MessageState] = {}
     self.vl: dict[int | str, dict[str, float]] = VLDict(self)
-    self.vl_all: dict[int | str, dict[str, list[float]]] = {}
-    self.ts_nanos: dict[int | str, dict[str, int]] = {}
+    self.vl_all: dict[int | str, dict[str, list[float] | SignalHistory]] = LazyDict(self) if lazy else {}
+    self.ts_nanos: dict[int | str, dict[str, int]] = LazyDict(self) if lazy else {}
     self.addresses: set[int] = set()
     self.message_states: dict[int, MessageState] = {}
 
+    # validity is kept up to date incrementally, so that can_valid and bus_timeout don't scale with
+    # the number of messages. timeouts are a min-heap of (deadline, address) that's only refreshed
+    # from the messages' latest timestamps once an entry reaches the top, so parsing pushes nothing
+    self._deadlines: list[tuple[float, int]] = []
+    self._scheduled: dict[int, float] = {}  # address -> deadline of its live heap entry
+    self._invalid: dict[int, MessageState] = {}  # missing or timed out, off the heap until received again
+    self._counter_invalid: dict[int, MessageState] = {}
+    self._checksum_invalid: dict[int, MessageState] = {}
+    self._deferred: dict[int, MessageState] = {}
+    self._to_clear: list[MessageState] = []
+    self._bus_timeout_threshold: float = BUS_TIMEOUT_THRESHOLD
+    self._ignore_alive: bool = True
+
     for name_or_addr, freq in messages:
       if isinstance(name_or_addr, numbers.Number):
         msg = self.dbc.addr_to_msg.get(int(name_or_addr))
@@ -153,6 +481,9 @@ class CANParser:
     self.last_nonempty_nanos: int = 0
     self._last_update_nanos: int = 0
 
+    if stats:
+      self.enable_stats()
+
   def _add_message(self, name_or_addr: str | int, freq: int | None = None) -> None:
     if isinstance(name_or_addr, numbers.Number):
       msg = self.dbc.addr_to_msg.get(int(name_or_addr))
@@ -177,50 +508,86 @@ class CANParser:
       size=msg.size,
       signals=list(msg.sigs.values()),
       ignore_alive=freq is not None and math.isnan(freq),
+      history_depth=self.history_depth,
+      validation=self.validation,
+      sample_every=self.sample_every,
     )
     if freq is not None and freq > 0:
       state.frequency = freq
+      state.timestamps.release()
     else:
       # if frequency not specified, assume 1Hz until we learn it
       freq = 1
     state.timeout_threshold = (1_000_000_000 / freq) * 10
+    state.on_timeout_change = self._on_timeout_change
 
     self.message_states[msg.address] = state
+    if not state.ignore_alive:
+      self._ignore_alive = False
+      self._invalid[state.address] = state
+    self._on_timeout_change(state)
+
+  def _schedule(self, state: MessageState) -> None:
+    deadline = state.deadline
+    self._scheduled[state.address] = deadline
+    heapq.heappush(self._deadlines, (deadline, state.address))
+
+  def _on_timeout_change(self, state: MessageState) -> None:
+    # rare: once per message when it's added, and when its frequency is learned
+    self._bus_timeout_threshold = min([BUS_TIMEOUT_THRESHOLD] + [s.timeout_threshold for s in self.message_states.values() if s.timeout_threshold > 0])
+    if state.address in self._scheduled:
+      # the old entry may be later than the new deadline, so push a new one and let the old one go stale
+      self._schedule(state)
+
+  def _check_timeouts(self, now: int) -> None:
+    deadlines, scheduled = self._deadlines, self._scheduled
+    while deadlines and deadlines[0][0] < now:
+      deadline, address = heapq.heappop(deadlines)
+      if scheduled.get(address) != deadline:
+        continue  # stale entry
+      state = self.message_states[address]
+      if state.deadline >= now:
+        self._schedule(state)
+      else:
+        del scheduled[address]
+        self._invalid[address] = state
+
+  def _sync(self, state: MessageState) -> None:
+    self.dirty.pop(state.address, None)
+    self.dirty.pop(state.name, None)
+    names = state.signal_names
+    dict.__getitem__(self.vl, state.address).update(zip(names, state.vals, strict=True))
+    dict.__getitem__(self.vl_all, state.address).update(zip(names, state.all_vals, strict=True))
+    dict.__getitem__(self.ts_nanos, state.address).update(dict.fromkeys(names, state.timestamps.last))
 
   @property
   def bus_timeout(self) -> bool:
-    ignore_alive = all(s.ignore_alive for s in self.message_states.values())
-    bus_timeout_threshold = 500 * 1_000_000
-    for st in self.message_states.values():
-      if st.timeout_threshold > 0:
-        bus_timeout_threshold = min(bus_timeout_threshold, st.timeout_threshold)
-    return ((self._last_update_nanos - self.last_nonempty_nanos) > bus_timeout_threshold) and not ignore_alive
+    return ((self._last_update_nanos - self.last_nonempty_nanos) > self._bus_timeout_threshold) and not self._ignore_alive
 
   @property
   def can_valid(self) -> bool:
-    valid = True
-    counters_valid = True
-    bus_timeout = self.bus_timeout
-    for state in self.message_states.values():
-      if state.counter_fail >= MAX_BAD_COUNTER:
-        counters_valid = False
+    self._check_timeouts(self._last_update_nanos)
+    valid = not self._invalid
+    for state in self._invalid.values():
+      state.rate_limited_log(self._last_update_nanos, "not valid (timeout or missing)")
+
+    for address, state in list(self._counter_invalid.items()):
+      if state.counter_fail < MAX_BAD_COUNTER:
+        del self._counter_invalid[address]
+      else:
         state.rate_limited_log(self._last_update_nanos, f"counter invalid, {state.counter_fail=} {MAX_BAD_COUNTER=}")
-      if not state.valid(self._last_update_nanos, bus_timeout):
-        valid = False
-        state.rate_limited_log(self._last_update_nanos, "not valid (timeout or missing)")
+    counters_valid = not self._counter_invalid
+    checksums_valid = not self._checksum_invalid
 
     # TODO: probably only want to increment this once per update() call
     self.can_invalid_cnt = 0 if valid else min(self.can_invalid_cnt + 1, CAN_INVALID_CNT)
-    return self.can_invalid_cnt < CAN_INVALID_CNT and counters_valid
+    return self.can_invalid_cnt < CAN_INVALID_CNT and counters_valid and checksums_valid
 
   def update(self, strings, sendcan: bool = False):
     if strings and not isinstance(strings[0], list | tuple):
       strings = [strings]
 
-    for addr in self.addresses:
-      for k in self.vl_all[addr]:
-        self.vl_all[addr][k].clear()
-
+    self._start_update()
     updated_addrs: set[int] = set()
     for entry in strings:
       t = entry[0]
@@ -231,26 +598,238 @@ class CANParser:
           continue
         bus_empty = False
         state = self.message_states.get(address)
-        if state is None or len(dat) > 64:
-          continue
-        if state.parse(t, dat):
-          updated_addrs.add(address)
+        if state is not None:
+          self._parse(state, t, dat, updated_addrs)
+        elif self.stats is not None:
+          self.stats.dropped[address] += 1
+      self._end_entry(t, bus_empty)
 
-          vl_addr = self.vl[address]
-          vl_all_addr = self.vl_all[address]
-          ts_addr = self.ts_nanos[address]
+    self._finish_update(updated_addrs)
+    return updated_addrs
 
-          for i, sig in enumerate(state.signals):
-            vl_addr[sig.name] = state.vals[i]
-            vl_all_addr[sig.name] = state.all_vals[i]
-            ts_addr[sig.name] = state.timestamps[-1]
+  # update() in steps, so that CANParserGroup can feed several parsers from one pass over the frames
+  def _start_update(self) -> None:
+    # only messages updated last time have values in vl_all
+    for state in self._to_clear:
+      for vals in state.all_vals:
+        vals.clear()
+
+  def _parse(self, state: MessageState, t: int, dat, updated_addrs: set[int]) -> None:
+    if len(dat) > 64:
+      return
+    if state.parse(t, dat):
+      updated_addrs.add(state.address)
+      if self._invalid and self._invalid.pop(state.address, None) is not None:
+        self._schedule(state)
+      if self.lazy:
+        self.dirty[state.address] = state
+        self.dirty[state.name] = state
+      else:
+        self._sync(state)
+    elif state.counter_fail >= MAX_BAD_COUNTER:
+      self._counter_invalid[state.address] = state
+    if state.deferred:
+      self._deferred[state.address] = state
+
+  def _parse_profiled(self, state: MessageState, t: int, dat, updated_addrs: set[int]) -> None:
+    start = time.perf_counter_ns()
+    CANParser._parse(self, state, t, dat, updated_addrs)
+    if self.stats is not None:
+      self.stats.record(state.address, time.perf_counter_ns() - start)
+
+  def _drop(self, address: int) -> None:
+    if self.stats is not None:
+      self.stats.dropped[address] += 1
+
+  def _end_entry(self, t: int, bus_empty: bool) -> None:
+    if not bus_empty:
+      self.last_nonempty_nanos = t
+    self._last_update_nanos = t
+
+  def _finish_update(self, updated_addrs: set[int]) -> None:
+    self._to_clear = [self.message_states[address] for address in updated_addrs]
+    if self.validation == "deferred":
+      # failures only count for the update they happened in
+      for state in self._checksum_invalid.values():
+        state.checksum_fail = 0
+      self._checksum_invalid = {address: state for address, state in self._deferred.items() if state.check_deferred()}
+      self._deferred = {}
+    if self.stats is not None and self.stats.log_interval_nanos > 0:
+      self._log_stats()
+
+  def enable_stats(self, log_interval: float = 0., top_n: int = 5) -> None:
+    """Start counting frames and parse time per address and frames with untracked addresses,
+    for snapshot(). Disabled parsers skip the timing entirely. With log_interval > 0, the
+    snapshot's top_n messages are logged to carlog at most every log_interval seconds of CAN time."""
+    self.stats = ParserStats(log_interval_nanos=int(log_interval * 1e9), top_n=top_n)
+    # shadow the method on this instance, so the timing costs nothing while disabled
+    self._parse = self._parse_profiled
+
+  def disable_stats(self) -> None:
+    self.stats = None
+    self.__dict__.pop("_parse", None)
+
+  def snapshot(self, top_n: int | None = None) -> dict:
+    """Returns the performance counters as plain, JSON serializable values, with the messages
+    sorted by total parse time and limited to the top_n most expensive. Checksum and counter
+    errors are counted since the parser was created, the rest since enable_stats()."""
+    stats = self.stats if self.stats is not None else ParserStats()
+    messages = []
+    for address, state in self.message_states.items():
+      frames, nanos = stats.frames.get(address, 0), stats.parse_nanos.get(address, 0)
+      messages.append({
+        "address": address,
+        "name": state.name,
+        "frames": frames,
+        "parse_nanos": nanos,
+        "mean_nanos": nanos / frames if frames else 0.0,
+        "checksum_errors": state.checksum_errors,
+        "counter_errors": state.counter_errors,
+      })
+    messages.sort(key=lambda m: (m["parse_nanos"], m["frames"]), reverse=True)
+    dropped = sorted(stats.dropped.items(), key=lambda item: item[1], reverse=True)
+
+    return {
+      "dbc": self.dbc_name,
+      "bus": self.bus,
+      "enabled": self.stats is not None,
+      "frames": sum(stats.frames.values()),
+      "parse_nanos": sum(stats.parse_nanos.values()),
+      "checksum_errors": sum(m["checksum_errors"] for m in messages),
+      "counter_errors": sum(m["counter_errors"] for m in messages),
+      "dropped": sum(stats.dropped.values()),
+      "dropped_addresses": [{"address": address, "frames": frames} for address, frames in dropped[:top_n]],
+      "messages": messages[:top_n],
+    }
+
+  def _log_stats(self) -> None:
+    stats = self.stats
+    assert stats is not None
+    if (self._last_update_nanos - stats.last_log_nanos) >= stats.log_interval_nanos:
+      carlog.info({"event": "CANParser stats", **self.snapshot(stats.top_n)})
+      stats.last_log_nanos = self._last_update_nanos
+
+  def update_buffer(self, nanos: int, buf, index) -> set[int]:
+    """Update from frames packed in one contiguous receive buffer, such as a panda USB bulk
+    transfer or the payloads of a capnp can list. index is a sequence of (address, offset,
+    length, src) entries into buf. Frames are passed on as memoryview slices, so payloads are
+    never copied, including into the checksum functions."""
+    mv = memoryview(buf)
+    return self.update([(nanos, ((address, mv[offset:offset + length], src) for address, offset, length, src in index))])
+
+  def decode_batch(self, addresses, data, timestamps, buses=None, check_checksums: bool = False) -> dict[int | str, np.ndarray]:
+    """Decode a whole segment of frames at once, for offline replay.
+
+    Takes columnar inputs: frame addresses, payloads (a (frames x bytes) uint8 array or a
+    sequence of bytes) and timestamps in nanoseconds. If buses is given, only frames on this
+    parser's bus are decoded. Returns a structured array with a "nanos" field and one float64
+    field per signal for each tracked message, keyed by address and name like vl.
+
+    Unlike update(), this doesn't check counters and doesn't touch parser state. With check_checksums,
+    frames with a bad checksum are dropped, using the vectorized checksums where available."""
+    addresses = np.asarray(addresses, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    frames = as_frame_array(data)
+
+    sel = np.flatnonzero(np.asarray(buses) == self.bus) if buses is not None else np.arange(len(addresses))
+    order = sel[np.argsort(addresses[sel], kind="stable")]
+    sorted_addresses = addresses[order]
+
+    ret: dict[int | str, np.ndarray] = {}
+    for address, state in self.message_states.items():
+      start, end = np.searchsorted(sorted_addresses, [address, address + 1])
+      idxs = order[start:end]
+      rows = frames[idxs]
+      if check_checksums and not state.ignore_checksum and state.checksum_signals:
+        ok = np.ones(len(idxs), dtype=bool)
+        for _, sig in state.checksum_signals:
+          ok &= get_raw_values(rows, sig) == calc_checksums(address, sig, rows[:, :state.size])
+        idxs, rows = idxs[ok], rows[ok]
+
+      out = np.empty(len(idxs), dtype=[("nanos", np.int64)] + [(sig.name, np.float64) for sig in state.signals])
+      out["nanos"] = timestamps[idxs]
+      for sig in state.signals:
+        out[sig.name] = get_raw_values(rows, sig) * sig.factor + sig.offset
+      ret[address] = out
+      ret[state.name] = out
+    return ret
+
+
+class CANParserGroup:
+  """Updates several CANParsers, usually one per bus, from one pass over the frames.
+
+  CANParser.update() scans every frame and skips those on other buses, so updating each parser
+  in turn scans every frame once per parser. Here each frame is routed once by its bus and
+  address to the MessageStates tracking it. Each parser ends up in the same state as if it
+  had been updated on its own."""
+
+  def __init__(self, parsers: Iterable[CANParser | None]):
+    self.parsers: list[CANParser] = [cp for cp in parsers if cp is not None]
+    self.routes: dict[int, dict[int, list[tuple[CANParser, MessageState | None]]]] = {}
+    self.unrouted: dict[int, list[CANParser]] = {}
+    self._routed: tuple[int, tuple[bool, ...]] = (-1, ())
+
+  def _routing_key(self) -> tuple[int, tuple[bool, ...]]:
+    # parsers add messages when vl is looked up by an unknown key, and stats may be enabled or disabled at any time
+    return sum(len(cp.message_states) for cp in self.parsers), tuple(cp.stats is not None for cp in self.parsers)
+
+  def _build_routes(self) -> None:
+    # bus -> address -> the parsers and states tracking it
+    self.routes = {cp.bus: {} for cp in self.parsers}
+    for cp in self.parsers:
+      for address, state in cp.message_states.items():
+        self.routes[cp.bus].setdefault(address, []).append((cp, state))
+
+    # parsers with stats count the frames on their bus they don't track, whether another parser does or not
+    profiled = [cp for cp in self.parsers if cp.stats is not None]
+    self.unrouted = {bus: [cp for cp in profiled if cp.bus == bus] for bus in self.routes}
+    for cp in profiled:
+      for address, targets in self.routes[cp.bus].items():
+        if address not in cp.message_states:
+          targets.append((cp, None))
+    self._routed = self._routing_key()
+
+  def snapshot(self, top_n: int | None = None) -> list[dict]:
+    """Returns the snapshot() of each parser"""
+    return [cp.snapshot(top_n) for cp in self.parsers]
+
+  def update(self, strings) -> list[set[int]]:
+    """Returns the updated addresses of each parser, like CANParser.update()"""
+    if strings and not isinstance(strings[0], list | tuple):
+      strings = [strings]
 
-      if not bus_empty:
-        self.last_nonempty_nanos = t
+    if self._routing_key() != self._routed:
+      self._build_routes()
+    routes, unrouted = self.routes, self.unrouted
 
-      self._last_update_nanos = t
+    for cp in self.parsers:
+      cp._start_update()
+    updated_addrs: dict[int, set[int]] = {id(cp): set() for cp in self.parsers}
 
-    return updated_addrs
+    for entry in strings:
+      t = entry[0]
+      nonempty = dict.fromkeys(routes, False)
+      for address, dat, src in entry[1]:
+        bus_routes = routes.get(src)
+        if bus_routes is None:
+          continue
+        nonempty[src] = True
+        targets = bus_routes.get(address)
+        if targets is not None:
+          for cp, state in targets:
+            if state is not None:
+              cp._parse(state, t, dat, updated_addrs[id(cp)])
+            else:
+              cp._drop(address)
+        else:
+          for cp in unrouted[src]:
+            cp._drop(address)
+      for cp in self.parsers:
+        cp._end_entry(t, not nonempty[cp.bus])
+
+    for cp in self.parsers:
+      cp._finish_update(updated_addrs[id(cp)])
+    return [updated_addrs[id(cp)] for cp in self.parsers]
 
 
 class CANDefine:
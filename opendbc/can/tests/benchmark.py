@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
+import os
 import time
-from opendbc.can import CANPacker, CANParser
 
+import numpy as np
 
-def _benchmark(checks, n):
-  parser = CANParser('toyota_new_mc_pt_generated', checks, 0)
+from opendbc import DBC_PATH, get_generated_dbc
+from opendbc.can import CANPacker, CANParser, CANParserGroup
+from opendbc.can.dbc import DBC
+from opendbc.can.parser import calc_checksums
+from opendbc.can.tests import ALL_DBCS
+
+
+def _benchmark(checks, n, lazy=False, validation="full"):
+  parser = CANParser('toyota_new_mc_pt_generated', checks, 0, lazy=lazy, validation=validation)
   packer = CANPacker('toyota_new_mc_pt_generated')
 
   t1 = time.process_time_ns()
@@ -36,7 +44,123 @@ def _benchmark(checks, n):
 
   et = sum(ets) / len(ets)
   avg_nanos = et / len(can_msgs)
-  print('[%d] %.1fms to pack, %.1fms to parse %s messages, avg: %dns' % (n, pack_dt/1e6, et/1e6, len(can_msgs), avg_nanos))
+  label = ('%d%s %s' % (n, ' lazy' if lazy else '', validation))
+  print('[%s] %.1fms to pack, %.1fms to parse %s messages, avg: %dns' % (label, pack_dt/1e6, et/1e6, len(can_msgs), avg_nanos))
+
+
+def _benchmark_decode(msg_name, n):
+  parser = CANParser('toyota_new_mc_pt_generated', [(msg_name, 10)], 0)
+  packer = CANPacker('toyota_new_mc_pt_generated')
+  addr, dat, _ = packer.make_can_msg(msg_name, 0, {})
+  state = parser.message_states[addr]
+  state.ignore_counter = True
+
+  # compare the compiled decoders against the generic get_raw_value path
+  for label, decoders in (('compiled', state.decoders), ('generic', None)):
+    state.decoders = decoders
+    t1 = time.process_time_ns()
+    for _ in range(n):
+      state.parse(0, dat)
+    t2 = time.process_time_ns()
+    for vals in state.all_vals:
+      vals.clear()
+    print('[%s] %s: %dns per frame (%d signals)' % (label, msg_name, (t2 - t1) / n, len(state.signals)))
+
+
+def _benchmark_pack(dbc_name, msg_name, n):
+  packer = CANPacker(dbc_name)
+  msg = packer.dbc.name_to_msg[msg_name]
+  values = {s: 1 for s in msg.sigs if s not in ("COUNTER", "CHECKSUM")}
+  plan = packer.plans[msg.address]
+
+  # compare the compiled pack plan against the generic set_value path
+  for label, encoders in (('compiled', plan.encoders), ('generic', None)):
+    plan.encoders = encoders
+    t1 = time.process_time_ns()
+    for _ in range(n):
+      packer.pack(msg.address, values)
+    t2 = time.process_time_ns()
+    print('[%s] %s: %dns per pack (%d bytes, %d signals)' % (label, msg_name, (t2 - t1) / n, msg.size, len(values)))
+
+
+def _benchmark_group(n_parsers, n):
+  # a tick of traffic on four buses, with one parser per bus tracking a message that isn't sent,
+  # so this only times scanning and routing the frames
+  dbc_name = 'toyota_new_mc_pt_generated'
+  packer = CANPacker(dbc_name)
+  names = list(packer.dbc.name_to_msg)
+  frames = [packer.make_can_msg(name, bus, {}) for bus in range(4) for name in names[1:80]]
+
+  def make_parsers():
+    return [CANParser(dbc_name, [(names[0], 0)], bus) for bus in range(n_parsers)]
+
+  parsers = make_parsers()
+  t1 = time.process_time_ns()
+  for i in range(n):
+    for cp in parsers:
+      cp.update([i * 10_000_000, frames])
+  t2 = time.process_time_ns()
+  group = CANParserGroup(make_parsers())
+  for i in range(n):
+    group.update([i * 10_000_000, frames])
+  t3 = time.process_time_ns()
+  print('%d frames per tick, %d parsers: %dus per tick separately, %dus per tick grouped' % (len(frames), n_parsers, (t2 - t1) / n / 1e3,
+                                                                                          (t3 - t2) / n / 1e3))
+
+
+def _benchmark_can_valid(n_msgs, n):
+  # a radar-like parser tracking many messages, receiving a few of them each tick
+  dbc_name = 'hyundai_canfd_generated'
+  packer = CANPacker(dbc_name)
+  names = list(packer.dbc.name_to_msg)[:n_msgs]
+  frames = [packer.make_can_msg(name, 0, {}) for name in names]
+  parser = CANParser(dbc_name, [(name, 20) for name in names], 0, validation="off")
+  parser.update([0, frames])
+
+  et = 0
+  for i in range(n):
+    parser.update([i * 10_000_000, frames[i % 8::8]])
+    t1 = time.process_time_ns()
+    parser.can_valid  # noqa: B018
+    parser.bus_timeout  # noqa: B018
+    et += time.process_time_ns() - t1
+  print('can_valid + bus_timeout with %d messages: %dns per tick' % (len(names), et / n))
+
+
+def _benchmark_checksum(dbc_name, msg_name, n):
+  msg = DBC(dbc_name).name_to_msg[msg_name]
+  sig = msg.sigs["CHECKSUM"]
+  frames = np.frombuffer(os.urandom(msg.size * n), dtype=np.uint8).reshape(n, msg.size)
+
+  # per-frame calls against the vectorized path over the whole array
+  rows = [row.tobytes() for row in frames]
+  t1 = time.process_time_ns()
+  for dat in rows:
+    sig.calc_checksum(msg.address, sig, dat)
+  t2 = time.process_time_ns()
+  calc_checksums(msg.address, sig, frames)
+  t3 = time.process_time_ns()
+  print('%s checksum (%d bytes): %dns per frame, %dns per frame batched' % (msg_name, msg.size, (t2 - t1) / n, (t3 - t2) / n))
+
+
+def _benchmark_dbc_parse():
+  # read and generate up front to only time parsing, and bypass the DBC memoization and disk cache
+  contents = {}
+  for name in ALL_DBCS:
+    if (content := get_generated_dbc(name)) is None:
+      with open(os.path.join(DBC_PATH, name + ".dbc")) as f:
+        content = f.read()
+    contents[name] = content.splitlines(keepends=True)
+
+  times = {}
+  for name, lines in contents.items():
+    dbc = DBC.__wrapped__.__new__(DBC.__wrapped__)
+    dbc.name = name
+    t1 = time.process_time_ns()
+    dbc._parse_lines(lines)
+    times[name] = time.process_time_ns() - t1
+  slowest = max(times, key=lambda k: times[k])
+  print('parsed %d DBCs in %.1fms, slowest: %s %.1fms' % (len(times), sum(times.values()) / 1e6, slowest, times[slowest] / 1e6))
 
 
 if __name__ == "__main__":
@@ -44,3 +168,17 @@ if __name__ == "__main__":
   _benchmark([('ACC_CONTROL', 10)], 1)
   _benchmark([('ACC_CONTROL', 10)], 5)
   _benchmark([('ACC_CONTROL', 10)], 10)
+  _benchmark([('ACC_CONTROL', 10)], 1, lazy=True)
+  for validation in ("full", "sampled", "deferred", "off"):
+    _benchmark([('ACC_CONTROL', 10)], 100, validation=validation)
+  _benchmark_decode('ACC_CONTROL', 100000)
+  _benchmark_group(3, 1000)
+  _benchmark_group(6, 1000)
+  _benchmark_can_valid(8, 10000)
+  _benchmark_can_valid(64, 10000)
+  _benchmark_pack('hyundai_canfd_generated', 'LKAS', 20000)
+  _benchmark_pack('hyundai_canfd_generated', 'SCC_CONTROL', 20000)
+  _benchmark_checksum('hyundai_canfd_generated', 'LKAS', 100000)
+  _benchmark_checksum('vw_mqb', 'HCA_01', 100000)
+  _benchmark_checksum('honda_civic_touring_2016_can_generated', 'STEERING_CONTROL', 100000)
+  _benchmark_dbc_parse()
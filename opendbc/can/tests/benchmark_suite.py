@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Benchmarks every DBC and every platform, and writes the results as JSON.
+
+For each DBC in opendbc/dbc and each generated DBC:
+  - load time, cold (parsed from source) and cached (from the on-disk cache)
+  - pack and parse throughput over synthetic frames of all its messages
+
+For each platform in PLATFORMS, the latency of one CarInterface.update() + apply() cycle,
+fed with synthetic traffic from opendbc/car/tests/benchmark_tick.py.
+
+Results are also averaged per brand, so regressions in a brand's hot paths stand out.
+
+  python opendbc/can/tests/benchmark_suite.py -o benchmark.json
+  python opendbc/can/tests/benchmark_suite.py --dbc toyota --platform TOYOTA
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import opendbc.can.dbc as dbc_module
+from opendbc.can import CANPacker, CANParser
+from opendbc.can.dbc import DBC
+from opendbc.can.tests import ALL_DBCS
+
+
+def synthetic_ticks(packer: CANPacker, addresses, bus: int, n: int) -> list[list[tuple[int, bytes, int]]]:
+  """n ticks of one frame per message, with counters counting up and valid checksums"""
+  msgs = [packer.dbc.addr_to_msg[address] for address in addresses]
+  counters = {msg.address: [s for s in msg.sigs.values() if s.type == 1] for msg in msgs}  # COUNTER
+  ticks = []
+  for i in range(n):
+    ticks.append([packer.make_can_msg(msg.address, bus, {s.name: i % (1 << s.size) for s in counters[msg.address]}) for msg in msgs])
+  return ticks
+
+
+def _time_load(name: str, cache_dir: str) -> float:
+  dbc_module.CACHE_DIR = cache_dir
+  t1 = time.perf_counter_ns()
+  DBC.__wrapped__(name)
+  return (time.perf_counter_ns() - t1) / 1e6
+
+
+def bench_dbc(name: str, ticks: int) -> dict:
+  cache_dir = dbc_module.CACHE_DIR
+  try:
+    with tempfile.TemporaryDirectory() as tmp:
+      load_cold_ms = _time_load(name, "")
+      _time_load(name, tmp)  # fill the cache
+      load_cached_ms = _time_load(name, tmp)
+  finally:
+    dbc_module.CACHE_DIR = cache_dir
+
+  dbc = DBC(name)
+  addresses = [address for address, msg in dbc.addr_to_msg.items() if 0 < msg.size <= 64 and msg.sigs]
+  ret = {
+    "brand": name.split("_")[0],
+    "messages": len(addresses),
+    "load_cold_ms": load_cold_ms,
+    "load_cached_ms": load_cached_ms,
+  }
+  if not addresses:
+    return ret
+
+  packer = CANPacker(name)
+  t1 = time.process_time_ns()
+  frames = synthetic_ticks(packer, addresses, 0, ticks)
+  pack_nanos = time.process_time_ns() - t1
+
+  parser = CANParser(name, [(address, 0) for address in addresses], 0)
+  t1 = time.process_time_ns()
+  for i, tick in enumerate(frames):
+    parser.update([i * 10_000_000, tick])
+  parse_nanos = time.process_time_ns() - t1
+
+  n_frames = len(addresses) * ticks
+  ret["pack_ns"] = pack_nanos / n_frames
+  ret["parse_ns"] = parse_nanos / n_frames
+  return ret
+
+
+def bench_platform(name: str, ticks: int) -> dict:
+  from opendbc.car import DT_CTRL
+  from opendbc.car.tests.benchmark_tick import benchmark_platform
+
+  ret = benchmark_platform(name, seconds=ticks * DT_CTRL, warmup=0.5, alloc_seconds=0)
+  return {
+    "brand": ret["brand"],
+    "frames_per_second": ret["frames_per_second"],
+    "tick_us": ret["latency"]["mean_us"],
+    "tick_p99_us": ret["latency"]["p99_us"],
+  }
+
+
+def by_brand(results: dict[str, dict]) -> dict[str, dict]:
+  """Mean of each numeric field over the brand's entries"""
+  groups: dict[str, list[dict]] = defaultdict(list)
+  for result in results.values():
+    if "error" not in result:
+      groups[result["brand"]].append(result)
+
+  ret = {}
+  for brand, entries in sorted(groups.items()):
+    keys = {k for e in entries for k, v in e.items() if isinstance(v, float)}
+    ret[brand] = {"count": len(entries)} | {k: sum(e[k] for e in entries if k in e) / sum(k in e for e in entries) for k in sorted(keys)}
+  return ret
+
+
+def run(dbc_filter: str = "", platform_filter: str = "", ticks: int = 100, cars: bool = True) -> dict:
+  dbcs = {}
+  for name in ALL_DBCS:
+    if dbc_filter in name:
+      try:
+        dbcs[name] = bench_dbc(name, ticks)
+      except Exception as e:
+        dbcs[name] = {"brand": name.split("_")[0], "error": repr(e)}
+
+  platforms = {}
+  if cars:
+    from opendbc.car.values import PLATFORMS
+    for name in sorted(PLATFORMS):
+      if platform_filter in name:
+        try:
+          platforms[name] = bench_platform(name, ticks)
+        except Exception as e:
+          platforms[name] = {"brand": "", "error": repr(e)}
+
+  return {
+    "python": sys.version,
+    "machine": platform.machine(),
+    "ticks": ticks,
+    "dbcs": dbcs,
+    "dbc_brands": by_brand(dbcs),
+    "platforms": platforms,
+    "platform_brands": by_brand(platforms),
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("-o", "--output", help="write the JSON here instead of stdout")
+  parser.add_argument("--dbc", default="", help="only DBCs with this in their name")
+  parser.add_argument("--platform", default="", help="only platforms with this in their name")
+  parser.add_argument("--ticks", type=int, default=100, help="synthetic 100Hz ticks per DBC and platform")
+  parser.add_argument("--no-cars", action="store_true", help="skip the CarInterface benchmarks")
+  args = parser.parse_args()
+
+  results = run(args.dbc, args.platform, args.ticks, not args.no_cars)
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(results, f, indent=2)
+  else:
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+  main()
@@ -1,6 +1,13 @@
 import copy
+import random
 import unittest
+
+import numpy as np
+
 from opendbc.can import CANPacker, CANParser
+from opendbc.can.dbc import DBC
+from opendbc.can.parser import calc_checksums
+from opendbc.can.tests import ALL_DBCS
 
 
 class TestCanChecksums(unittest.TestCase):
@@ -28,6 +35,18 @@ class TestCanChecksums(unittest.TestCase):
       with self.subTest(counter=expected[counter_field]):
         assert tested[checksum_field] == expected[checksum_field]
 
+  def test_batch_checksums(self):
+    """Test that the vectorized checksums match the per-frame ones"""
+    for dbc_name in ALL_DBCS:
+      for msg in DBC(dbc_name).msgs.values():
+        for sig in msg.sigs.values():
+          if sig.calc_checksum is None:
+            continue
+          with self.subTest(dbc=dbc_name, msg=msg.name):
+            frames = np.frombuffer(random.randbytes(msg.size * 100), dtype=np.uint8).reshape(100, msg.size)
+            expected = [sig.calc_checksum(msg.address, sig, row.tobytes()) for row in frames]
+            assert list(calc_checksums(msg.address, sig, frames)) == expected
+
   def verify_fca_giorgio_crc(self, msg_name: str, msg_addr: int, test_messages: list[bytes]):
     """Test modified SAE J1850 CRCs, with special final XOR cases for EPS messages"""
     assert len(test_messages) == 3
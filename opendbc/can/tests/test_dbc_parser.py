@@ -1,6 +1,15 @@
+import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
+
+from opendbc import get_generated_dbcs
 from opendbc.can import CANParser
-from opendbc.can.tests import ALL_DBCS
+from opendbc.can.dbc import DBC
+from opendbc.can.tests import ALL_DBCS, TEST_DBC
+from opendbc.dbc.generator import generator
+from opendbc.dbc.generator.generator import generate_dbc, get_index, inputs_digest
 
 
 class TestDBCParser(unittest.TestCase):
@@ -20,3 +29,82 @@ class TestDBCParser(unittest.TestCase):
     for dbc in ALL_DBCS:
       with self.subTest(dbc=dbc):
         CANParser(dbc, [], 0)
+
+  def test_tokenizer(self):
+    dbc = DBC.__wrapped__.__new__(DBC.__wrapped__)
+    dbc.name = "test_tokenizer"
+    dbc._parse_lines("""
+BO_ 512 MUX_MSG: 8 XXX
+ SG_ MUX M : 1|2@0+ (1,0) [0|3] "" XXX
+ SG_ SIG_M0 m0 : 15|8@0- (0.5,-10) [0|255] "unit: deg" XXX
+ SG_ SIG_LE : 32|12@1+ (1e-1,0) [0|255] "" XXX,YYY
+ SG_ BROKEN : 40|8@2 (1,0) [0|255] "" XXX
+CM_ SG_ 512 SIG_LE "SG_ 1|1@0+ (1,0) [0|1] \"\" XXX";
+VAL_ 512 MUX 0 "first mode" 1 "second" ;
+""".splitlines(keepends=True))
+
+    msg = dbc.name_to_msg["MUX_MSG"]
+    assert dbc.addr_to_msg[512] is msg and msg.size == 8
+    assert list(msg.sigs) == ["MUX", "SIG_M0", "SIG_LE"]
+    sig = msg.sigs["SIG_M0"]
+    assert (sig.start_bit, sig.msb, sig.lsb, sig.size) == (15, 15, 8, 8)
+    assert sig.is_signed and not sig.is_little_endian and (sig.factor, sig.offset) == (0.5, -10)
+    sig = msg.sigs["SIG_LE"]
+    assert (sig.msb, sig.lsb, sig.factor) == (43, 32, 0.1) and sig.is_little_endian
+    assert [(v.address, v.name, v.def_val) for v in dbc.vals] == [(512, "MUX", "0 FIRST_MODE 1 SECOND")]
+
+  def test_cache(self):
+    with tempfile.TemporaryDirectory() as tmp, mock.patch("opendbc.can.dbc.CACHE_DIR", os.path.join(tmp, "cache")):
+      dbc_path = os.path.join(tmp, "test_cache.dbc")
+      shutil.copy(TEST_DBC, dbc_path)
+
+      # DBC is memoized, so construct through __wrapped__ to hit the disk cache
+      parsed = DBC.__wrapped__(dbc_path)
+      with mock.patch.object(DBC.__wrapped__, "_parse_lines", side_effect=AssertionError("cache not used")):
+        cached = DBC.__wrapped__(dbc_path)
+      assert cached.msgs == parsed.msgs
+      assert cached.vals == parsed.vals
+      assert cached.name_to_msg == parsed.name_to_msg
+      assert cached.addr_to_msg == parsed.addr_to_msg
+
+      # editing the DBC invalidates its cache entry
+      with open(dbc_path, "a") as f:
+        f.write('\nBO_ 1000 NEW_MESSAGE: 8 XXX\n SG_ NEW_SIGNAL : 0|8@1+ (1,0) [0|255] "" XXX\n')
+      edited = DBC.__wrapped__(dbc_path)
+      assert "NEW_MESSAGE" in edited.name_to_msg
+      assert len(os.listdir(os.path.join(tmp, "cache"))) == 2
+
+  def test_cache_generated(self):
+    with tempfile.TemporaryDirectory() as tmp, mock.patch("opendbc.can.dbc.CACHE_DIR", tmp):
+      parsed = DBC.__wrapped__("honda_civic_touring_2016_can_generated")
+      with mock.patch("opendbc.can.dbc.get_generated_dbc", side_effect=AssertionError("generator ran")):
+        cached = DBC.__wrapped__("honda_civic_touring_2016_can_generated")
+      assert cached.msgs == parsed.msgs
+      assert cached.vals == parsed.vals
+
+  def test_inputs_digest_script_inputs(self):
+    # the RAM DBCs include files generated from _stellantis_common.dbc, which no template names
+    with tempfile.TemporaryDirectory() as tmp:
+      gen_path = os.path.join(tmp, "generator")
+      shutil.copytree(generator.generator_path, gen_path)
+      try:
+        with mock.patch.object(generator, "generator_path", gen_path):
+          get_index.cache_clear()
+          before = {name: inputs_digest(name) for name in ("chrysler_ram_dt_generated", "chrysler_ram_hd_generated", "honda_civic_touring_2016_can_generated")}
+          with open(os.path.join(gen_path, "chrysler", "_stellantis_common.dbc"), "a") as f:
+            f.write("\n")
+          after = {name: inputs_digest(name) for name in before}
+      finally:
+        get_index.cache_clear()
+
+    assert after["chrysler_ram_dt_generated"] != before["chrysler_ram_dt_generated"]
+    assert after["chrysler_ram_hd_generated"] != before["chrysler_ram_hd_generated"]
+    assert after["honda_civic_touring_2016_can_generated"] == before["honda_civic_touring_2016_can_generated"]
+
+  def test_generate_single_dbc(self):
+    generated = get_generated_dbcs()
+    assert set(get_index()) == set(generated)
+    for name, content in generated.items():
+      with self.subTest(dbc=name):
+        assert generate_dbc(name) == content
+    assert generate_dbc("not_a_dbc_generated") is None
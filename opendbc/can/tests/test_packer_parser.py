@@ -1,10 +1,14 @@
 import unittest
 import random
+from collections import deque
 
-from opendbc.can import CANPacker, CANParser
-from opendbc.can.tests import TEST_DBC
+from opendbc.can import CANPacker, CANParser, CANParserGroup
+from opendbc.can.dbc import DBC
+from opendbc.can.parser import VALIDATION_MODES, MessageState, TimestampRing
+from opendbc.can.tests import ALL_DBCS, TEST_DBC
 
 MAX_BAD_COUNTER = 5
+CAN_INVALID_CNT = 5
 
 
 class TestCanParserPacker(unittest.TestCase):
@@ -67,6 +71,34 @@ class TestCanParserPacker(unittest.TestCase):
       parser.update([t, [msg]])
       assert parser.can_valid
 
+  def test_parser_can_valid_incremental(self):
+    """Test the incrementally kept can_valid and bus_timeout against scanning every message"""
+    dbc_name = "honda_civic_touring_2016_can_generated"
+    packer = CANPacker(dbc_name)
+    msgs = [("STEERING_CONTROL", 100), ("POWERTRAIN_DATA", 0), ("GAS_PEDAL_2", float('nan')), ("SCM_FEEDBACK", 10), ("CRUISE", 50)]
+
+    for _ in range(20):
+      parser = CANParser(dbc_name, msgs, 0)
+      invalid_cnt = CAN_INVALID_CNT
+      t = 0
+      for _ in range(300):
+        # bursts, gaps long enough to time out, bad counters and other buses
+        t += random.choice([10_000_000] * 8 + [random.randint(0, 3_000_000_000)])
+        frames = []
+        for name, _ in random.sample(msgs, random.randint(0, len(msgs))):
+          frames.append(packer.make_can_msg(name, random.choice([0, 0, 0, 1]), {"COUNTER": random.randint(0, 3)} if random.random() < 0.05 else {}))
+        parser.update([t, frames])
+
+        ignore_alive = all(st.ignore_alive for st in parser.message_states.values())
+        threshold = min([500_000_000] + [st.timeout_threshold for st in parser.message_states.values() if st.timeout_threshold > 0])
+        bus_timeout = (t - parser.last_nonempty_nanos) > threshold and not ignore_alive
+        valid = all(st.valid(t, bus_timeout) for st in parser.message_states.values())
+        counters_valid = all(st.counter_fail < MAX_BAD_COUNTER for st in parser.message_states.values())
+        invalid_cnt = 0 if valid else min(invalid_cnt + 1, CAN_INVALID_CNT)
+
+        assert parser.bus_timeout == bus_timeout
+        assert parser.can_valid == (invalid_cnt < CAN_INVALID_CNT and counters_valid)
+
   def test_parser_updated_list(self):
     msgs = [("CAN_FD_MESSAGE", 10), ]
     parser = CANParser(TEST_DBC, msgs, 0)
@@ -138,6 +170,151 @@ class TestCanParserPacker(unittest.TestCase):
     assert parser.vl["STEERING_CONTROL"]["STEER_TORQUE"] == 300
     assert parser.vl_all["STEERING_CONTROL"]["STEER_TORQUE"] == [300]
 
+  def test_validation_modes(self):
+    """Test which frames each validation mode lets through, and that counters are tracked in all of them"""
+    dbc_name = "honda_civic_touring_2016_can_generated"
+    packer = CANPacker(dbc_name)
+
+    frames = []
+    for i in range(40):
+      addr, dat, bus = packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": i})
+      if i % 5 == 1:
+        dat = bytearray(dat)
+        dat[4] ^= 0x01  # flip a checksum bit
+        dat = bytes(dat)
+      frames.append((addr, dat, bus))
+    good = [i for i in range(40) if i % 5 != 1]
+
+    with self.assertRaises(ValueError):
+      CANParser(dbc_name, [("STEERING_CONTROL", 0)], 0, validation="strict")
+
+    for validation, sample_every, expected in (("full", 10, good), ("sampled", 3, [i for i in range(40) if i % 5 != 1 or i % 3 != 0]),
+                                               ("deferred", 10, list(range(40))), ("off", 10, list(range(40)))):
+      with self.subTest(validation=validation):
+        # one frame per update, then all of them in a single update
+        parser = CANParser(dbc_name, [("STEERING_CONTROL", 0)], 0, validation=validation, sample_every=sample_every)
+        received = []
+        for t, frame in enumerate(frames):
+          if parser.update([t, [frame]]):
+            received.append(parser.vl["STEERING_CONTROL"]["STEER_TORQUE"])
+          if validation == "deferred":
+            assert parser.can_valid == (t % 5 != 1)
+        assert received == expected
+        assert parser.message_states[frames[0][0]].counter == 39 % 4
+        assert parser.message_states[frames[0][0]].counter_fail == 0
+
+        parser = CANParser(dbc_name, [("STEERING_CONTROL", 0)], 0, validation=validation, sample_every=sample_every, history_depth=40)
+        parser.update([0, frames])
+        assert list(parser.vl_all["STEERING_CONTROL"]["STEER_TORQUE"]) == expected
+        assert parser.message_states[frames[0][0]].checksum_fail == (8 if validation == "deferred" else 0)
+
+    # counter errors are only ignored with validation off, but the counter is still followed
+    for validation in VALIDATION_MODES:
+      with self.subTest(validation=validation):
+        parser = CANParser(dbc_name, [("STEERING_CONTROL", 0)], 0, validation=validation)
+        for _ in range(10):
+          parser.update([0, [packer.make_can_msg("STEERING_CONTROL", 0, {"COUNTER": 2})]])
+        assert parser.message_states[frames[0][0]].counter == 2
+        assert (validation == "off") == parser.can_valid
+
+  def test_parser_group(self):
+    """Test that a CANParserGroup leaves each parser in the same state as updating it on its own"""
+    dbc_name = "honda_civic_touring_2016_can_generated"
+    packer = CANPacker(dbc_name)
+    msgs = ["STEERING_CONTROL", "POWERTRAIN_DATA", "GAS_PEDAL_2"]
+
+    def make_parsers():
+      # two parsers share bus 0, and nothing listens on bus 3
+      return [CANParser(dbc_name, [(m, 0) for m in msgs[:2]], 0), CANParser(dbc_name, [(m, 0) for m in msgs[1:]], 0),
+              CANParser(dbc_name, [(m, 0) for m in msgs], 1), CANParser(dbc_name, [(msgs[0], 0)], 2, lazy=True)]
+    single, grouped = make_parsers(), make_parsers()
+    group = CANParserGroup(grouped + [None])
+
+    for i in range(100):
+      strings = []
+      for j in range(random.randint(0, 3)):
+        frames = [packer.make_can_msg(random.choice(msgs), random.randint(0, 3), {"STEER_TORQUE": i}) for _ in range(random.randint(0, 6))]
+        strings.append([(i * 4 + j) * 10_000_000, frames])
+      expected = [cp.update(strings) for cp in single]
+      assert group.update(strings) == expected
+
+      for a, b in zip(single, grouped, strict=True):
+        assert (a.can_valid, a.bus_timeout, a.last_nonempty_nanos) == (b.can_valid, b.bus_timeout, b.last_nonempty_nanos)
+        for m in msgs:
+          if m in a.message_states or packer.dbc.name_to_msg[m].address in a.message_states:
+            assert a.vl[m] == b.vl[m]
+            assert a.vl_all[m] == b.vl_all[m]
+            assert a.ts_nanos[m] == b.ts_nanos[m]
+
+  def test_stats(self):
+    """Test the performance counters, on their own and through a CANParserGroup"""
+    dbc_name = "honda_civic_touring_2016_can_generated"
+    packer = CANPacker(dbc_name)
+    msgs = ["STEERING_CONTROL", "POWERTRAIN_DATA", "GAS_PEDAL_2"]
+
+    def make_parsers():
+      return [CANParser(dbc_name, [(m, 0) for m in msgs[:2]], 0, stats=True), CANParser(dbc_name, [(msgs[2], 0)], 0)]
+    single, grouped = make_parsers(), make_parsers()
+    group = CANParserGroup(grouped)
+
+    for i in range(20):
+      frames = [packer.make_can_msg(m, 0, {"COUNTER": i % 4}) for m in msgs]
+      frames.append(packer.make_can_msg(msgs[0], 1, {}))
+      if i % 5 == 0:
+        addr, dat, bus = frames[1]
+        frames[1] = (addr, bytes(dat[:-1]) + bytes([dat[-1] ^ 0x0F]), bus)
+      strings = [[i * 10_000_000, frames]]
+      single[0].update(strings)
+      single[1].update(strings)
+      group.update(strings)
+      if i == 0:
+        # after the group has built its routes
+        single[1].enable_stats()
+        grouped[1].enable_stats()
+
+    snap = single[0].snapshot()
+    assert snap["enabled"] and snap["dbc"] == dbc_name
+    by_name = {m["name"]: m for m in snap["messages"]}
+    assert by_name["STEERING_CONTROL"]["frames"] == by_name["POWERTRAIN_DATA"]["frames"] == 20
+    assert by_name["POWERTRAIN_DATA"]["checksum_errors"] == 4
+    assert by_name["STEERING_CONTROL"]["parse_nanos"] > 0
+    assert snap["dropped"] == 20 and snap["dropped_addresses"] == [{"address": packer.dbc.name_to_msg[msgs[2]].address, "frames": 20}]
+    assert [m["name"] for m in single[0].snapshot(top_n=1)["messages"]] == [snap["messages"][0]["name"]]
+
+    def counts(snapshot):
+      return {k: v for k, v in snapshot.items() if k not in ("parse_nanos", "messages")}, \
+             [(m["address"], m["frames"], m["checksum_errors"], m["counter_errors"]) for m in snapshot["messages"]]
+    for a, b in zip(single, grouped, strict=True):
+      assert sorted(counts(a.snapshot())[1]) == sorted(counts(b.snapshot())[1])
+      assert counts(a.snapshot())[0] == counts(b.snapshot())[0]
+    assert [s["dbc"] for s in group.snapshot()] == [dbc_name] * 2
+
+    grouped[0].disable_stats()
+    group.update([[1_000_000_000, [packer.make_can_msg(m, 0, {}) for m in msgs]]])
+    assert not grouped[0].snapshot()["enabled"] and grouped[0].snapshot()["frames"] == 0
+
+  def test_stats_toggle_group(self):
+    """Test a CANParserGroup reroutes when stats move from one parser to another"""
+    dbc_name = "honda_civic_touring_2016_can_generated"
+    packer = CANPacker(dbc_name)
+    a = CANParser(dbc_name, [("STEERING_CONTROL", 0)], 0, stats=True)
+    b = CANParser(dbc_name, [("STEERING_CONTROL", 0)], 2)
+    group = CANParserGroup([a, b])
+
+    def frames():
+      # each bus gets a tracked and an untracked message
+      return [packer.make_can_msg(m, bus, {}) for m in ("STEERING_CONTROL", "POWERTRAIN_DATA") for bus in (0, 2)]
+
+    group.update([[0, frames()]])
+    assert a.snapshot()["dropped"] == 1
+
+    a.disable_stats()
+    b.enable_stats()
+    group.update([[10_000_000, frames()]])
+    snap = b.snapshot()
+    assert snap["frames"] == 1 and snap["dropped"] == 1
+    assert snap["dropped_addresses"] == [{"address": packer.dbc.name_to_msg["POWERTRAIN_DATA"].address, "frames": 1}]
+
   def test_packer_parser(self):
     msgs = [
       ("Brake_Status", 0),
@@ -175,6 +352,118 @@ class TestCanParserPacker(unittest.TestCase):
         for sig in ("STEER_TORQUE", "STEER_TORQUE_REQUEST", "COUNTER", "CHECKSUM"):
           assert parser.vl["STEERING_CONTROL"][sig] == parser.vl[228][sig]
 
+  def test_decoders_match_generic(self):
+    """Test that the compiled decoders produce the same values as get_raw_value"""
+    for dbc_name in ALL_DBCS:
+      with self.subTest(dbc=dbc_name):
+        for msg in DBC(dbc_name).msgs.values():
+          states = [MessageState(msg.address, msg.name, msg.size, list(msg.sigs.values()), ignore_checksum=True, ignore_counter=True)
+                    for _ in range(2)]
+          states[1].decoders = None
+          for _ in range(5):
+            dat = random.randbytes(msg.size)
+            assert all(state.parse(0, dat) for state in states)
+            assert states[0].vals == states[1].vals
+
+  def test_pack_plans_match_generic(self):
+    """Test that the compiled pack plans produce the same frames as set_value"""
+    for dbc_name in ALL_DBCS:
+      with self.subTest(dbc=dbc_name):
+        packers = [CANPacker(dbc_name) for _ in range(2)]
+        for plan in packers[1].plans.values():
+          plan.encoders = None
+        for msg in packers[0].dbc.msgs.values():
+          for _ in range(3):
+            sigs = random.sample(list(msg.sigs.values()), random.randint(0, len(msg.sigs)))
+            values = {s.name: random.randint(-2 ** min(s.size, 32), 2 ** min(s.size, 32)) * s.factor + s.offset for s in sigs}
+            assert packers[0].pack(msg.address, values) == packers[1].pack(msg.address, values)
+
+  def test_prepare(self):
+    """Test that prepared messages pack the same frames as make_can_msg"""
+    for dbc_name in ("honda_civic_touring_2016_can_generated", "hyundai_canfd_generated", "toyota_nodsu_pt_generated", "vw_mqb"):
+      with self.subTest(dbc=dbc_name):
+        packers = [CANPacker(dbc_name) for _ in range(2)]
+        for msg in packers[0].dbc.msgs.values():
+          sigs = random.sample(list(msg.sigs.values()), random.randint(0, len(msg.sigs)))
+          names = [s.name for s in sigs] + ["NOT_A_SIGNAL"]
+          prepared = packers[1].prepare(msg.name, names)
+          assert packers[1].prepare(msg.name, tuple(names)) is prepared
+
+          # counters are incremented if not given, and tracked across both APIs
+          for _ in range(3):
+            values = [random.randint(0, 2 ** min(s.size, 32) - 1) * s.factor + s.offset for s in sigs] + [1]
+            expected = packers[0].make_can_msg(msg.name, 1, dict(zip(names, values, strict=True)))
+            assert prepared(1, *values) == expected
+            assert packers[0].counters == packers[1].counters
+
+    packer = CANPacker(TEST_DBC)
+    assert packer.prepare("NOT_A_MESSAGE", ("COUNTER",))(0, 1) == (0, b'', 0)
+    with self.assertRaises(ValueError):
+      packer.prepare("CAN_FD_MESSAGE", ("COUNTER",))(0)
+
+  def test_decode_batch(self):
+    """Test that decode_batch matches frame-by-frame decoding"""
+    for dbc_name in (TEST_DBC, "honda_civic_touring_2016_can_generated", "hyundai_canfd_generated", "vw_mqb"):
+      with self.subTest(dbc=dbc_name):
+        dbc = DBC(dbc_name)
+        msgs = list(dbc.msgs.values())[:20]
+        parser = CANParser(dbc_name, [(m.address, 0) for m in msgs], 0)
+
+        frames = [(random.choice(msgs), random.randint(0, 2)) for _ in range(500)]
+        data = [random.randbytes(m.size) for m, _ in frames]
+        decoded = parser.decode_batch([m.address for m, _ in frames], data, range(len(frames)), [bus for _, bus in frames])
+
+        for m in msgs:
+          on_bus = [(t, d) for t, ((msg, bus), d) in enumerate(zip(frames, data, strict=True)) if msg is m and bus == 0]
+          assert decoded[m.name] is decoded[m.address]
+          assert list(decoded[m.name]["nanos"]) == [t for t, _ in on_bus]
+
+          state = MessageState(m.address, m.name, m.size, list(m.sigs.values()), ignore_checksum=True, ignore_counter=True)
+          for row, (_, d) in zip(decoded[m.name], on_bus, strict=True):
+            state.parse(0, d)
+            for sig, val in zip(state.signals, state.vals, strict=True):
+              assert row[sig.name] == val, (m.name, sig.name)
+
+  def test_decode_batch_checksums(self):
+    """Test that decode_batch drops the frames update() would reject for their checksum"""
+    for dbc_name, msg_name in (("honda_civic_touring_2016_can_generated", "STEERING_CONTROL"), ("hyundai_canfd_generated", "LKAS"),
+                               ("vw_mqb", "HCA_01"), ("psa_aee2010_r3", "STEERING")):
+      with self.subTest(dbc=dbc_name):
+        packer = CANPacker(dbc_name)
+        parser = CANParser(dbc_name, [(msg_name, 0)], 0)
+        msg = packer.dbc.name_to_msg[msg_name]
+
+        data = []
+        for i in range(200):
+          dat = bytearray(packer.make_can_msg(msg_name, 0, {})[1])
+          if i % 3 == 0:
+            dat[random.randrange(len(dat))] ^= 1 << random.randrange(8)
+          data.append(bytes(dat))
+        state = MessageState(msg.address, msg.name, msg.size, list(msg.sigs.values()), ignore_counter=True)
+        good = [t for t, d in enumerate(data) if state.parse(t, d)]
+        assert 0 < len(good) < len(data)
+
+        decoded = parser.decode_batch([msg.address] * len(data), data, range(len(data)), check_checksums=True)
+        assert list(decoded[msg_name]["nanos"]) == good
+
+  def test_update_buffer(self):
+    """Test parsing frames out of one contiguous, read-only receive buffer"""
+    for dbc_name, msg_name, sig_name in (("honda_civic_touring_2016_can_generated", "STEERING_CONTROL", "STEER_TORQUE"),
+                                         ("psa_aee2010_r3", "STEERING", "DRIVER_TORQUE")):
+      with self.subTest(dbc=dbc_name):
+        packer = CANPacker(dbc_name)
+        parser = CANParser(dbc_name, [(msg_name, 0)], 0)
+
+        buf, index = b"", []
+        for val in range(-5, 5):
+          addr, dat, bus = packer.make_can_msg(msg_name, 0, {sig_name: val})
+          index.append((addr, len(buf), len(dat), bus))
+          buf += dat
+
+        assert parser.update_buffer(0, buf, index) == {index[0][0]}
+        assert parser.vl_all[msg_name][sig_name] == list(range(-5, 5))
+        assert parser.vl[msg_name][sig_name] == 4
+
   def test_scale_offset(self):
     """Test that both scale and offset are correctly preserved"""
     dbc_file = "honda_civic_touring_2016_can_generated"
@@ -284,6 +573,62 @@ class TestCanParserPacker(unittest.TestCase):
       if len(user_brake_vals):
         assert vl_all[-1] == parser.vl["VSA_STATUS"]["USER_BRAKE"]
 
+  def test_history_depth(self):
+    """Test bounded vl_all history"""
+    dbc_file = "honda_civic_touring_2016_can_generated"
+    parser = CANParser(dbc_file, [("VSA_STATUS", 50)], 0, history_depth=3)
+    packer = CANPacker(dbc_file)
+
+    for user_brake_vals in ([1, 2], list(range(10)), [5], []):
+      parser.update([0, [packer.make_can_msg("VSA_STATUS", 0, {"USER_BRAKE": v}) for v in user_brake_vals]])
+      vl_all = parser.vl_all["VSA_STATUS"]["USER_BRAKE"]
+      assert vl_all == user_brake_vals[-3:]
+      assert list(vl_all) == user_brake_vals[-3:]
+      assert len(vl_all) == len(user_brake_vals[-3:])
+      if len(user_brake_vals):
+        assert vl_all[-1] == parser.vl["VSA_STATUS"]["USER_BRAKE"]
+
+  def test_timestamp_ring(self):
+    """Test the timestamp ring against a bounded deque"""
+    ring, ref = TimestampRing(8), deque(maxlen=8)
+    for t in range(1, 20):
+      ring.append(t)
+      ref.append(t)
+      assert len(ring) == len(ref)
+      assert [ring[i] for i in range(len(ring))] == list(ref)
+      assert ring[0] == ref[0] and ring[-1] == ref[-1]
+
+    ring.release()
+    ring.append(25)
+    assert len(ring) == 1 and ring[-1] == 25
+    with self.assertRaises(IndexError):
+      ring[0]
+
+    # slotted state has no per-instance dict
+    for obj in (ring, MessageState(0x100, "TEST", 8, [])):
+      assert not hasattr(obj, "__dict__")
+
+  def test_lazy(self):
+    """Test that lazy views match eagerly updated ones"""
+    dbc_file = "honda_civic_touring_2016_can_generated"
+    msgs = [("VSA_STATUS", 50), ("STEERING_CONTROL", 100), ("POWERTRAIN_DATA", 100)]
+    parsers = [CANParser(dbc_file, msgs, 0), CANParser(dbc_file, msgs, 0, lazy=True)]
+    packer = CANPacker(dbc_file)
+
+    for t in range(50):
+      can_msgs = [packer.make_can_msg("VSA_STATUS", 0, {"USER_BRAKE": random.randrange(100)}) for _ in range(random.randrange(3))]
+      if t % 2:
+        can_msgs.append(packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": random.randrange(-100, 100)}))
+      for parser in parsers:
+        parser.update([t, can_msgs])
+
+      for name, _ in msgs:
+        assert parsers[0].vl[name] == parsers[1].vl[name]
+        assert parsers[0].vl_all[name] == parsers[1].vl_all[name]
+        assert parsers[0].ts_nanos[name] == parsers[1].ts_nanos[name]
+      assert parsers[0].vl.get(228) == parsers[1].vl.get(228)
+      assert not parsers[1].dirty
+
   def test_timestamp_nanos(self):
     """Test message timestamp dict"""
     dbc_file = "honda_civic_touring_2016_can_generated"
@@ -1,4 +1,6 @@
-from opendbc.car.crc import CRC8BODY
+import numpy as np
+
+from opendbc.car.crc import crc8_body
 
 
 def create_control(packer, torque_l, torque_r):
@@ -10,8 +12,10 @@ def create_control(packer, torque_l, torque_r):
   return packer.make_can_msg("TORQUE_CMD", 0, values)
 
 
-def body_checksum(address: int, sig, d: bytearray) -> int:
-  crc = 0xFF
-  for i in range(len(d) - 2, -1, -1):
-    crc = CRC8BODY[crc ^ d[i]]
-  return crc
+def body_checksum(address: int, sig, d: bytes | bytearray | memoryview) -> int:
+  # CRC8 over all but the last byte, back to front
+  return crc8_body.update(0xFF, d[-2::-1])
+
+
+def body_checksum_batch(address: int, sig, frames: np.ndarray) -> np.ndarray:
+  return crc8_body.update_batch(0xFF, frames[:, -2::-1])
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""Columnar CAN logs, for replaying long drives without decoding capnp events.
+
+A log is a directory of flat little endian arrays, memory-mapped on read, so only the parts
+that are read are ever loaded, and iterating over an hour-long drive takes constant memory:
+
+  meta.json        format version and array lengths
+  nanos.bin        int64, receive time of each frame (the logMonoTime of its can event)
+  bus.bin          uint8, src of each frame
+  address.bin      uint32
+  length.bin       uint8
+  offset.bin       int64, start of each frame's payload in data.bin
+  data.bin         uint8, the payloads back to back
+  events.bin       int64, index of the first frame of each can event
+  event_nanos.bin  int64, logMonoTime of each can event, including those without frames
+
+  python opendbc/car/canlog.py rlog.zst drive.canlog
+"""
+import json
+import os
+import sys
+from collections.abc import Iterable, Iterator
+
+import numpy as np
+
+from opendbc.car.can_definitions import CanData
+
+VERSION = 1
+COLUMNS = {
+  "nanos": np.dtype("<i8"),
+  "bus": np.dtype("u1"),
+  "address": np.dtype("<u4"),
+  "length": np.dtype("u1"),
+  "offset": np.dtype("<i8"),
+}
+CHUNK_FRAMES = 1 << 16
+
+
+def write_can_log(path: str, events: Iterable[tuple[int, Iterable]]) -> dict:
+  """Writes (nanos, frames) events, such as the ticks passed to CarInterface.update(), as a
+  CAN log. Frames are (address, dat, src), like CanData. Only a chunk of frames is buffered at
+  a time. Returns the metadata"""
+  os.makedirs(path, exist_ok=True)
+  files = {name: open(os.path.join(path, f"{name}.bin"), "wb") for name in (*COLUMNS, "data", "events", "event_nanos")}
+  n_frames = n_events = n_bytes = 0
+  cols: dict[str, list[int]] = {name: [] for name in COLUMNS}
+  payloads: list[bytes] = []
+  event_starts: list[int] = []
+  event_nanos: list[int] = []
+
+  def flush():
+    for name, dtype in COLUMNS.items():
+      files[name].write(np.asarray(cols[name], dtype=dtype).tobytes())
+      cols[name].clear()
+    files["data"].write(b"".join(payloads))
+    payloads.clear()
+    files["events"].write(np.asarray(event_starts, dtype="<i8").tobytes())
+    files["event_nanos"].write(np.asarray(event_nanos, dtype="<i8").tobytes())
+    event_starts.clear()
+    event_nanos.clear()
+
+  try:
+    for nanos, frames in events:
+      event_starts.append(n_frames)
+      event_nanos.append(nanos)
+      n_events += 1
+      for address, dat, src in frames:
+        cols["nanos"].append(nanos)
+        cols["bus"].append(src)
+        cols["address"].append(address)
+        cols["length"].append(len(dat))
+        cols["offset"].append(n_bytes)
+        payloads.append(bytes(dat))
+        n_frames += 1
+        n_bytes += len(dat)
+      if len(payloads) >= CHUNK_FRAMES or len(event_starts) >= CHUNK_FRAMES:
+        flush()
+    flush()
+  finally:
+    for f in files.values():
+      f.close()
+
+  meta = {"version": VERSION, "frames": n_frames, "events": n_events, "bytes": n_bytes}
+  with open(os.path.join(path, "meta.json"), "w") as f:
+    json.dump(meta, f)
+  return meta
+
+
+def convert_log(fn: str, path: str) -> dict:
+  """Converts the can events of an rlog or qlog to a CAN log"""
+  from opendbc.car.logreader import LogReader
+  lr = LogReader(fn, only_union_types=True, sort_by_time=True, streaming=True)
+  return write_can_log(path, ((m.logMonoTime, ((c.address, c.dat, c.src) for c in m.can)) for m in lr if m.which() == "can"))
+
+
+class CanLog:
+  """Memory-mapped reader of a CAN log written by write_can_log().
+
+  The columns are NumPy arrays indexed by frame, and the events array maps can events to
+  their first frame. Reading a slice of them only pages in that slice."""
+
+  def __init__(self, path: str):
+    with open(os.path.join(path, "meta.json")) as f:
+      self.meta = json.load(f)
+    if self.meta["version"] != VERSION:
+      raise ValueError(f"unsupported CAN log version {self.meta['version']}, expected {VERSION}")
+
+    def load(name: str, dtype, count: int) -> np.ndarray:
+      # np.memmap can't map empty files
+      if count == 0:
+        return np.empty(0, dtype=dtype)
+      return np.memmap(os.path.join(path, f"{name}.bin"), dtype=dtype, mode="r", shape=(count,))
+
+    self.nanos, self.bus, self.address, self.length, self.offset = (load(name, dtype, self.meta["frames"]) for name, dtype in COLUMNS.items())
+    self.data = load("data", np.dtype("u1"), self.meta["bytes"])
+    self.events = load("events", np.dtype("<i8"), self.meta["events"])
+    self.event_nanos = load("event_nanos", np.dtype("<i8"), self.meta["events"])
+
+  def __len__(self) -> int:
+    return self.meta["frames"]
+
+  @property
+  def n_events(self) -> int:
+    return self.meta["events"]
+
+  def seek(self, nanos: int) -> int:
+    """Index of the first event at or after nanos, in a log sorted by time. Only the pages
+    the binary search touches are read"""
+    return int(np.searchsorted(self.event_nanos, nanos))
+
+  def _event_bounds(self, start: int, end: int) -> tuple[int, int]:
+    first = int(self.events[start]) if start < self.n_events else len(self)
+    last = int(self.events[end]) if end < self.n_events else len(self)
+    return first, last
+
+  def iter_events(self, start: int = 0, end: int | None = None, addresses: Iterable[int] | None = None,
+                  buses: Iterable[int] | None = None, chunk_events: int = 1000) -> Iterator[tuple[int, list[CanData]]]:
+    """Yields (nanos, frames) for events [start, end), ready for CarInterface.update(). With
+    addresses or buses, frames not matching are left out. Events are read chunk_events at a
+    time, so memory use doesn't grow with the log."""
+    end = self.n_events if end is None else min(end, self.n_events)
+    addresses = np.fromiter(addresses, dtype=np.int64) if addresses is not None else None
+    buses = np.fromiter(buses, dtype=np.int64) if buses is not None else None
+
+    for chunk_start in range(start, end, chunk_events):
+      chunk_end = min(chunk_start + chunk_events, end)
+      first, last = self._event_bounds(chunk_start, chunk_end)
+      starts = (np.append(self.events[chunk_start:chunk_end], last) - first).tolist()
+      nanos = self.event_nanos[chunk_start:chunk_end].tolist()
+      keep = np.ones(last - first, dtype=bool)
+      if addresses is not None:
+        keep &= np.isin(self.address[first:last], addresses)
+      if buses is not None:
+        keep &= np.isin(self.bus[first:last], buses)
+
+      address, bus, length = self.address[first:last].tolist(), self.bus[first:last].tolist(), self.length[first:last].tolist()
+      offset = (self.offset[first:last] - (self.offset[first] if last > first else 0)).tolist()
+      blob = self.data[self.offset[first]:self.offset[last - 1] + self.length[last - 1]].tobytes() if last > first else b""
+      keep_list = keep.tolist()
+      for i in range(len(starts) - 1):
+        frames = [CanData(address[j], blob[offset[j]:offset[j] + length[j]], bus[j]) for j in range(starts[i], starts[i + 1]) if keep_list[j]]
+        yield nanos[i], frames
+
+  def frame_indices(self, addresses: Iterable[int] | None = None, buses: Iterable[int] | None = None,
+                    start: int = 0, end: int | None = None) -> np.ndarray:
+    """Indices of the frames matching addresses and buses, in frames [start, end)"""
+    end = len(self) if end is None else end
+    keep = np.ones(end - start, dtype=bool)
+    if addresses is not None:
+      keep &= np.isin(self.address[start:end], np.fromiter(addresses, dtype=np.int64))
+    if buses is not None:
+      keep &= np.isin(self.bus[start:end], np.fromiter(buses, dtype=np.int64))
+    return np.flatnonzero(keep) + start
+
+  def payloads(self, indices: np.ndarray, width: int = 64) -> np.ndarray:
+    """Payloads of the given frames as a (frames x width) uint8 array, zero padded, as taken by
+    CANParser.decode_batch()"""
+    indices = np.asarray(indices, dtype=np.int64)
+    cols = np.arange(width)
+    lengths = self.length[indices].astype(np.int64)
+    pos = self.offset[indices][:, None] + cols
+    valid = cols < lengths[:, None]
+    out = np.zeros((len(indices), width), dtype=np.uint8)
+    out[valid] = self.data[pos[valid]]
+    return out
+
+  def columns(self, indices: np.ndarray, width: int = 64) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(addresses, payloads, timestamps, buses) of the given frames, the arguments of CANParser.decode_batch()"""
+    indices = np.asarray(indices, dtype=np.int64)
+    return self.address[indices], self.payloads(indices, width), self.nanos[indices], self.bus[indices]
+
+
+if __name__ == "__main__":
+  if len(sys.argv) != 3:
+    print(f"usage: {sys.argv[0]} <rlog> <output dir>", file=sys.stderr)
+    sys.exit(1)
+  print(convert_log(sys.argv[1], sys.argv[2]))
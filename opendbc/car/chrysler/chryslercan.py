@@ -1,5 +1,7 @@
+import numpy as np
+
 from opendbc.car import structs
-from opendbc.car.crc import CRC8J1850
+from opendbc.car.crc import crc8_j1850
 from opendbc.car.chrysler.values import CUSW_CARS, RAM_CARS
 
 GearShifter = structs.CarState.GearShifter
@@ -78,41 +80,21 @@ def create_cruise_buttons(packer, frame, bus, cancel=False, resume=False, accel=
   return packer.make_can_msg("CRUISE_BUTTONS", bus, values)
 
 
-def chrysler_checksum(address: int, sig, d: bytearray) -> int:
-  checksum = 0xFF
-  for j in range(len(d) - 1):
-    curr = d[j]
-    shift = 0x80
-    for _ in range(8):
-      bit_sum = curr & shift
-      temp_chk = checksum & 0x80
-      if bit_sum:
-        bit_sum = 0x1C
-        if temp_chk:
-          bit_sum = 1
-        checksum = (checksum << 1) & 0xFF
-        temp_chk = checksum | 1
-        bit_sum ^= temp_chk
-      else:
-        if temp_chk:
-          bit_sum = 0x1D
-        checksum = (checksum << 1) & 0xFF
-        bit_sum ^= checksum
-      checksum = bit_sum & 0xFF
-      shift >>= 1
-  return (~checksum) & 0xFF
-
-
-def fca_giorgio_checksum(address: int, sig, d: bytearray) -> int:
-  crc = 0
-  for i in range(len(d) - 1):
-    crc ^= d[i]
-    crc = CRC8J1850[crc]
-  if address == 0xDE:
-    return crc ^ 0x10
-  elif address == 0x106:
-    return crc ^ 0xF6
-  elif address == 0x122:
-    return crc ^ 0xF1
-  else:
-    return crc ^ 0x0A
+def chrysler_checksum(address: int, sig, d: bytes | bytearray | memoryview) -> int:
+  # SAE J1850 CRC8 over all but the checksum byte
+  return crc8_j1850.update(0xFF, d[:-1]) ^ 0xFF
+
+
+def chrysler_checksum_batch(address: int, sig, frames: np.ndarray) -> np.ndarray:
+  return crc8_j1850.update_batch(0xFF, frames[:, :-1]) ^ 0xFF
+
+
+FCA_GIORGIO_CHECKSUM_XOR = {0xDE: 0x10, 0x106: 0xF6, 0x122: 0xF1}
+
+
+def fca_giorgio_checksum(address: int, sig, d: bytes | bytearray | memoryview) -> int:
+  return crc8_j1850.update(0, d[:-1]) ^ FCA_GIORGIO_CHECKSUM_XOR.get(address, 0x0A)
+
+
+def fca_giorgio_checksum_batch(address: int, sig, frames: np.ndarray) -> np.ndarray:
+  return crc8_j1850.update_batch(0, frames[:, :-1]) ^ FCA_GIORGIO_CHECKSUM_XOR.get(address, 0x0A)
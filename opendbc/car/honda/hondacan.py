@@ -1,3 +1,5 @@
+import numpy as np
+
 from opendbc.car import CanBusBase
 from opendbc.car.common.conversions import Conversions as CV
 from opendbc.car.honda.values import (HondaFlags, HONDA_BOSCH, HONDA_BOSCH_ALT_RADAR, HONDA_BOSCH_RADARLESS,
@@ -235,19 +237,23 @@ def spam_buttons_command(packer, CAN, button_val, car_fingerprint):
   return packer.make_can_msg("SCM_BUTTONS", bus, values)
 
 
-def honda_checksum(address: int, sig, d: bytearray) -> int:
+def _honda_checksum_init(address: int) -> int:
   s = 0
-  extended = address > 0x7FF
   addr = address
   while addr:
     s += addr & 0xF
     addr >>= 4
-  for i in range(len(d)):
-    x = d[i]
-    if i == len(d) - 1:
-      x >>= 4
+  return 8 - s + (3 if address > 0x7FF else 0)
+
+
+def honda_checksum(address: int, sig, d: bytes | bytearray | memoryview) -> int:
+  # the checksum is the low nibble of the last byte
+  s = d[-1] >> 4
+  for x in d[:-1]:
     s += (x & 0xF) + (x >> 4)
-  s = 8 - s
-  if extended:
-    s += 3
-  return s & 0xF
+  return (_honda_checksum_init(address) - s) & 0xF
+
+
+def honda_checksum_batch(address: int, sig, frames: np.ndarray) -> np.ndarray:
+  s = (frames[:, :-1] & 0xF).sum(axis=1, dtype=np.int64) + (frames[:, :-1] >> 4).sum(axis=1, dtype=np.int64) + (frames[:, -1] >> 4)
+  return (_honda_checksum_init(address) - s) & 0xF
@@ -1,6 +1,6 @@
 import numpy as np
 from opendbc.car import CanBusBase
-from opendbc.car.crc import CRC16_XMODEM
+from opendbc.car.crc import crc16_xmodem
 from opendbc.car.hyundai.values import HyundaiFlags
 from opendbc.sunnypilot.car.hyundai.lead_data_ext import CanFdLeadData
 
@@ -36,26 +36,30 @@ class CanBus(CanBusBase):
     return self._cam
 
 
+STEERING_SIGNALS = ("LKA_OptUsmSta", "LKA_SysIndReq", "StrTqReqVal", "LKA_SysWrn", "ActToiSta", "LKA_UsmMod", "LKA_RcgSta", "Damping_Gain")
+
+
 def create_steering_messages(packer, CP, CAN, enabled, lat_active, apply_torque, lkas_icon):
-  values = {
-    "LKA_OptUsmSta": 2,
-    "LKA_SysIndReq": lkas_icon,
-    "StrTqReqVal": apply_torque,
-    "LKA_SysWrn": 0,
-    "ActToiSta": 1 if lat_active else 0,
-    "LKA_UsmMod": 0,  # hide LKAS settings
-    "LKA_RcgSta": 0,
-    "Damping_Gain": 100,  # can potentially tuned for better perf [3, 200]
-  }
+  # sent every frame, so pack positionally in the order of STEERING_SIGNALS
+  values = (
+    2,                        # LKA_OptUsmSta
+    lkas_icon,                # LKA_SysIndReq
+    apply_torque,             # StrTqReqVal
+    0,                        # LKA_SysWrn
+    1 if lat_active else 0,   # ActToiSta
+    0,                        # LKA_UsmMod, hide LKAS settings
+    0,                        # LKA_RcgSta
+    100,                      # Damping_Gain, can potentially tuned for better perf [3, 200]
+  )
 
   ret = []
   if CP.flags & HyundaiFlags.CANFD_LKA_STEER_MSG:
     lkas_msg = "LKAS_ALT" if CP.flags & HyundaiFlags.CANFD_LKA_STEER_MSG_ALT else "LKAS"
     if CP.openpilotLongitudinalControl:
-      ret.append(packer.make_can_msg("LFA", CAN.ECAN, values))
-    ret.append(packer.make_can_msg(lkas_msg, CAN.ACAN, values))
+      ret.append(packer.prepare("LFA", STEERING_SIGNALS)(CAN.ECAN, *values))
+    ret.append(packer.prepare(lkas_msg, STEERING_SIGNALS)(CAN.ACAN, *values))
   else:
-    ret.append(packer.make_can_msg("LFA", CAN.ECAN, values))
+    ret.append(packer.prepare("LFA", STEERING_SIGNALS)(CAN.ECAN, *values))
 
   return ret
 
@@ -236,18 +240,17 @@ def create_adrv_messages(packer, CAN, frame):
   return ret
 
 
-def hkg_can_fd_checksum(address: int, sig, d: bytearray) -> int:
-  crc = 0
-  for i in range(2, len(d)):
-    crc = ((crc << 8) ^ CRC16_XMODEM[(crc >> 8) ^ d[i]]) & 0xFFFF
-  crc = ((crc << 8) ^ CRC16_XMODEM[(crc >> 8) ^ ((address >> 0) & 0xFF)]) & 0xFFFF
-  crc = ((crc << 8) ^ CRC16_XMODEM[(crc >> 8) ^ ((address >> 8) & 0xFF)]) & 0xFFFF
-  if len(d) == 8:
-    crc ^= 0x5F29
-  elif len(d) == 16:
-    crc ^= 0x041D
-  elif len(d) == 24:
-    crc ^= 0x819D
-  elif len(d) == 32:
-    crc ^= 0x9F5B
-  return crc
+HKG_CAN_FD_CHECKSUM_XOR = {8: 0x5F29, 16: 0x041D, 24: 0x819D, 32: 0x9F5B}
+
+
+def hkg_can_fd_checksum(address: int, sig, d: bytes | bytearray | memoryview) -> int:
+  crc = crc16_xmodem.update(0, d[2:])
+  crc = crc16_xmodem.update(crc, (address & 0xFFFF).to_bytes(2, "little"))
+  return crc ^ HKG_CAN_FD_CHECKSUM_XOR.get(len(d), 0)
+
+
+def hkg_can_fd_checksum_batch(address: int, sig, frames: np.ndarray) -> np.ndarray:
+  crc = crc16_xmodem.update_batch(0, frames[:, 2:])
+  addr = np.frombuffer((address & 0xFFFF).to_bytes(2, "little"), dtype=np.uint8)
+  crc = crc16_xmodem.update_batch(crc, np.broadcast_to(addr, (len(frames), 2)))
+  return crc ^ HKG_CAN_FD_CHECKSUM_XOR.get(frames.shape[1], 0)
@@ -15,7 +15,7 @@ from opendbc.car.common.basedir import BASEDIR
 from opendbc.car.common.conversions import Conversions as CV
 from opendbc.car.common.simple_kalman import KF1D, get_kalman_gain
 from opendbc.car.values import PLATFORMS
-from opendbc.can import CANParser
+from opendbc.can import CANParser, CANParserGroup
 from opendbc.car.carlog import carlog
 
 from opendbc.sunnypilot.car.interfaces import CarInterfaceBaseSP
@@ -112,6 +112,7 @@ class CarInterfaceBase(ABC, CarInterfaceBaseSP):
 
     self.CS: CarStateBase = self.CarState(CP, CP_SP)
     self.can_parsers: dict[StrEnum, CANParser] = self.CS.get_can_parsers(CP, CP_SP)
+    self.can_parser_group = CANParserGroup(self.can_parsers.values())
 
     dbc_names = {bus: cp.dbc_name for bus, cp in self.can_parsers.items()}
     self.CC: CarControllerBase = self.CarController(dbc_names, CP, CP_SP)
@@ -266,10 +267,8 @@ class CarInterfaceBase(ABC, CarInterfaceBaseSP):
     tune.torque.steeringAngleDeadzoneDeg = steering_angle_deadzone_deg
 
   def update(self, can_packets: list[tuple[int, list[CanData]]]) -> tuple[structs.CarState, structs.CarStateSP]:
-    # parse can
-    for cp in self.can_parsers.values():
-      if cp is not None:
-        cp.update(can_packets)
+    # parse can, routing each frame once to the parser for its bus
+    self.can_parser_group.update(can_packets)
 
     # get CarState
     ret, ret_sp = self.CS.update(self.can_parsers)
@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
+import heapq
+import io
 import os
+import struct
 import capnp
 import urllib.parse
 import warnings
@@ -10,6 +13,10 @@ from opendbc.car.common.basedir import BASEDIR
 
 capnp_log = capnp.load(os.path.join(BASEDIR, "rlog.capnp"))
 
+ZSTD_MAGIC = b'\x28\xB5\x2F\xFD'
+STREAM_READ_SIZE = 1 << 18
+SEGMENT_HEADER = struct.Struct("<II")  # segment count - 1, size of the first segment in words
+
 
 def decompress_stream(data: bytes):
   dctx = zstd.ZstdDecompressor()
@@ -21,9 +28,73 @@ def decompress_stream(data: bytes):
   return decompressed_data
 
 
+def capnp_message_end(buf, pos: int) -> int | None:
+  """End of the capnp message starting at pos, or None if buf doesn't hold all of it yet"""
+  if len(buf) < pos + 8:
+    return None
+  n_segments, size = SEGMENT_HEADER.unpack_from(buf, pos)
+  if n_segments == 0:
+    # single segment, most events
+    end = pos + 8 + 8 * size
+  else:
+    header = (8 + 4 * n_segments + 7) & ~7
+    if len(buf) < pos + header:
+      return None
+    end = pos + header + 8 * sum(struct.unpack_from(f"<{n_segments + 1}I", buf, pos + 4))
+  return end if end <= len(buf) else None
+
+
+def stream_events(f):
+  """Yields the events of a serialized log as they're read from the file object f,
+  decompressing it incrementally if it's zstd compressed. Events are decoded one read
+  at a time, and each holds on to only the chunk it was decoded from."""
+  if not hasattr(f, "peek"):
+    f = io.BufferedReader(f)
+  if f.peek(4)[:4] == ZSTD_MAGIC:
+    # https://github.com/facebook/zstd/blob/dev/doc/zstd_compression_format.md#zstandard-frames
+    f = zstd.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+
+  buf = b""
+  while True:
+    chunk = f.read(STREAM_READ_SIZE)
+    buf += chunk
+    end = 0
+    while (msg_end := capnp_message_end(buf, end)) is not None:
+      end = msg_end
+    if end:
+      yield from capnp_log.Event.read_multiple_bytes(buf[:end])
+      buf = buf[end:]
+    if not chunk:
+      if buf:
+        warnings.warn("Corrupted events detected", RuntimeWarning, stacklevel=1)
+      return
+
+
+def sort_window(ents, window: int):
+  """Sorts events by logMonoTime, as long as none is more than window events out of order.
+  Only window events are held at a time. Ties keep their order in the log."""
+  heap: list = []
+  for i, e in enumerate(ents):
+    heapq.heappush(heap, (e.logMonoTime, i, e))
+    if len(heap) > window:
+      yield heapq.heappop(heap)[2]
+  while heap:
+    yield heapq.heappop(heap)[2]
+
+
 class LogReader:
-  def __init__(self, fn, only_union_types=False, sort_by_time=False):
+  def __init__(self, fn, only_union_types=False, sort_by_time=False, streaming=False, sort_window_size=1000):
+    """streaming=True reads and decodes the log lazily, every time it's iterated over, so the
+    first event arrives right away and memory use doesn't depend on the size of the log.
+    sort_by_time then only sorts within a window of sort_window_size events, which is enough
+    for the logs openpilot writes, instead of globally."""
     self._only_union_types = only_union_types
+    self._fn = fn
+    self._sort_by_time = sort_by_time
+    self._sort_window_size = sort_window_size
+    self._streaming = streaming
+    if streaming:
+      return
     _, ext = os.path.splitext(urllib.parse.urlparse(fn).path)
 
     if fn.startswith("http"):
@@ -33,7 +104,7 @@ class LogReader:
       with open(fn, "rb") as f:
         dat = f.read()
 
-    if ext == ".zst" or dat.startswith(b'\x28\xB5\x2F\xFD'):
+    if ext == ".zst" or dat.startswith(ZSTD_MAGIC):
       # https://github.com/facebook/zstd/blob/dev/doc/zstd_compression_format.md#zstandard-frames
       dat = decompress_stream(dat)
 
@@ -49,8 +120,26 @@ class LogReader:
     if sort_by_time:
       self._ents.sort(key=lambda x: x.logMonoTime)
 
+  def _stream(self):
+    if self._fn.startswith("http"):
+      f = urlopen(self._fn)
+    else:
+      f = open(self._fn, "rb")
+    with f:
+      try:
+        yield from stream_events(f)
+      except capnp.KjException:
+        warnings.warn("Corrupted events detected", RuntimeWarning, stacklevel=1)
+
   def __iter__(self):
-    for ent in self._ents:
+    if self._streaming:
+      ents = self._stream()
+      if self._sort_by_time:
+        ents = sort_window(ents, self._sort_window_size)
+    else:
+      ents = iter(self._ents)
+
+    for ent in ents:
       if self._only_union_types:
         try:
           ent.which()
@@ -1,8 +1,12 @@
-def psa_checksum(address: int, sig, d: bytearray) -> int:
+def psa_checksum(address: int, sig, d: bytes | bytearray | memoryview) -> int:
   chk_ini = {0x452: 0x4, 0x38D: 0x7, 0x42D: 0xC}.get(address, 0xB)
   byte = sig.start_bit // 8
-  d[byte] &= 0x0F if sig.start_bit % 8 >= 4 else 0xF0
-  checksum = sum((b >> 4) + (b & 0xF) for b in d)
+  checksum = 0
+  for i, b in enumerate(d):
+    if i == byte:
+      # skip the checksum nibble without modifying the frame
+      b &= 0x0F if sig.start_bit % 8 >= 4 else 0xF0
+    checksum += (b >> 4) + (b & 0xF)
   return (chk_ini - checksum) & 0xF
 
 
@@ -1,3 +1,5 @@
+import numpy as np
+
 from opendbc.car import structs
 from opendbc.car.subaru.values import CanBus
 
@@ -326,12 +328,11 @@ def create_preglobal_es_distance(packer, cruise_button, es_distance_msg):
   return packer.make_can_msg("ES_Distance", CanBus.main, values)
 
 
-def subaru_checksum(address: int, sig, d: bytearray) -> int:
-  s = 0
-  addr = address
-  while addr:
-    s += addr & 0xFF
-    addr >>= 8
-  for i in range(1, len(d)):
-    s += d[i]
+def subaru_checksum(address: int, sig, d: bytes | bytearray | memoryview) -> int:
+  s = sum(address.to_bytes(4, "little")) + sum(d[1:])
+  return s & 0xFF
+
+
+def subaru_checksum_batch(address: int, sig, frames: np.ndarray) -> np.ndarray:
+  s = sum(address.to_bytes(4, "little")) + frames[:, 1:].sum(axis=1, dtype=np.int64)
   return s & 0xFF
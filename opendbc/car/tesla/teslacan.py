@@ -1,3 +1,5 @@
+import numpy as np
+
 from opendbc.car.common.conversions import Conversions as CV
 from opendbc.car.tesla.values import CANBUS, CarControllerParams, TeslaFlags
 
@@ -51,10 +53,11 @@ class TeslaCAN:
     return self.packer.make_can_msg("APS_eacMonitor", CANBUS.party, values)
 
 
-def tesla_checksum(address: int, sig, d: bytearray) -> int:
-  checksum = (address & 0xFF) + ((address >> 8) & 0xFF)
-  checksum_byte = sig.start_bit // 8
-  for i in range(len(d)):
-    if i != checksum_byte:
-      checksum += d[i]
+def tesla_checksum(address: int, sig, d: bytes | bytearray | memoryview) -> int:
+  checksum = (address & 0xFF) + ((address >> 8) & 0xFF) + sum(d) - d[sig.start_bit // 8]
+  return checksum & 0xFF
+
+
+def tesla_checksum_batch(address: int, sig, frames: np.ndarray) -> np.ndarray:
+  checksum = (address & 0xFF) + ((address >> 8) & 0xFF) + frames.sum(axis=1, dtype=np.int64) - frames[:, sig.start_bit // 8]
   return checksum & 0xFF
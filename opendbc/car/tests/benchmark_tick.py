@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Latency of one 100Hz cycle, CarInterface.update() + apply(), for each platform.
+
+Each interface is fed synthetic bus traffic: every message its CAN parsers track, at the
+frequency the port declares for it or DEFAULT_FREQUENCY if it's left to be learned, packed
+by CANPacker with counters counting up and valid checksums. The latency of each cycle is timed over --seconds of traffic, and a shorter
+second pass under tracemalloc counts what the cycles allocate. Runs entirely offline.
+
+  python opendbc/car/tests/benchmark_tick.py TOYOTA_RAV4 HONDA_CIVIC
+  python opendbc/car/tests/benchmark_tick.py --brand hyundai --json hyundai.json
+"""
+import argparse
+import gc
+import json
+import logging
+import math
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from opendbc.can import CANPacker, CANParser
+from opendbc.car import DT_CTRL, structs
+from opendbc.car.carlog import carlog
+from opendbc.car.car_helpers import interfaces
+from opendbc.car.interfaces import CarInterfaceBase
+from opendbc.car.values import PLATFORMS
+
+DEFAULT_FREQUENCY = 50.  # Hz, for messages a port leaves to the parser to learn
+HISTOGRAM_EDGES_US = [0, 25, 50, 100, 200, 400, 800, 1600, 3200, math.inf]
+
+
+class SyntheticTraffic:
+  """Frames of every message tracked by an interface's CAN parsers, each sent at its declared
+  frequency. Counters count up per message and checksums are valid, so nothing is dropped."""
+
+  def __init__(self, can_parsers: list[CANParser], dt: float = DT_CTRL):
+    self.dt = dt
+    self.messages = []  # packer, address, bus, period in seconds, counter signals
+    for cp in can_parsers:
+      packer = CANPacker(cp.dbc_name)
+      for address, state in cp.message_states.items():
+        freq = state.frequency if state.frequency > 0 else DEFAULT_FREQUENCY
+        counters = [s for s in state.signals if s.type == 1]  # COUNTER
+        self.messages.append((packer, address, cp.bus, 1. / freq, counters))
+
+  def generate(self, ticks: int, start_nanos: int = 0) -> list[tuple[int, list[tuple[int, bytes, int]]]]:
+    """Returns ticks of (nanos, frames), ready for CarInterface.update()"""
+    next_send = [0.] * len(self.messages)
+    sent = [0] * len(self.messages)
+    ret = []
+    for i in range(ticks):
+      t = i * self.dt
+      frames = []
+      for j, (packer, address, bus, period, counters) in enumerate(self.messages):
+        # faster than the tick rate sends several frames per tick
+        while next_send[j] <= t + 1e-9:
+          frames.append(packer.make_can_msg(address, bus, {s.name: sent[j] % (1 << s.size) for s in counters}))
+          sent[j] += 1
+          next_send[j] += period
+      ret.append((start_nanos + int(t * 1e9), frames))
+    return ret
+
+
+def make_interface(platform: str) -> CarInterfaceBase:
+  CarInterface = interfaces[platform]
+  CP = CarInterface.get_non_essential_params(platform)
+  CP_SP = CarInterface.get_non_essential_params_sp(CP, platform)
+  return CarInterface(CP, CP_SP)
+
+
+def discover_messages(CI: CarInterfaceBase, CC, CC_SP) -> None:
+  # most ports pass empty message lists, and the parsers add messages as CarState looks them up
+  CI.update([])
+  CI.apply(CC, CC_SP, 0)
+
+
+def engaged_car_control() -> tuple[structs.CarControl, structs.CarControlSP]:
+  CC = structs.CarControl()
+  CC.enabled = CC.latActive = CC.longActive = True
+  return CC.as_reader(), structs.CarControlSP()
+
+
+def run_ticks(CI: CarInterfaceBase, ticks, CC, CC_SP) -> list[int]:
+  """Runs a cycle per tick, returns the latency of each in nanoseconds"""
+  ret = []
+  for nanos, frames in ticks:
+    t1 = time.perf_counter_ns()
+    CI.update([(nanos, frames)])
+    CI.apply(CC, CC_SP, nanos)
+    ret.append(time.perf_counter_ns() - t1)
+  return ret
+
+
+def latency_stats(nanos: list[int]) -> dict:
+  us = np.array(nanos, dtype=np.float64) / 1e3
+  counts, _ = np.histogram(us, bins=HISTOGRAM_EDGES_US)
+  p50, p90, p99 = np.percentile(us, [50, 90, 99])
+  return {
+    "mean_us": float(us.mean()),
+    "p50_us": float(p50),
+    "p90_us": float(p90),
+    "p99_us": float(p99),
+    "max_us": float(us.max()),
+    # counts of cycles faster than each upper edge
+    "histogram": {f"<{edge:g}": int(c) for edge, c in zip(HISTOGRAM_EDGES_US[1:], counts, strict=True)},
+  }
+
+
+def allocation_stats(CI: CarInterfaceBase, ticks, CC, CC_SP, top_n: int = 5) -> dict:
+  """Allocations by the cycles, from tracemalloc. retained is what's still held afterwards"""
+  gc.collect()
+  tracemalloc.start()
+  before = tracemalloc.take_snapshot()
+  tracemalloc.reset_peak()
+  start_size, _ = tracemalloc.get_traced_memory()
+  run_ticks(CI, ticks, CC, CC_SP)
+  _, peak_size = tracemalloc.get_traced_memory()
+  after = tracemalloc.take_snapshot()
+  tracemalloc.stop()
+
+  diff = after.compare_to(before, "lineno")
+  return {
+    "ticks": len(ticks),
+    "peak_kb": (peak_size - start_size) / 1024,
+    "retained_blocks": sum(d.count_diff for d in diff),
+    "retained_kb": sum(d.size_diff for d in diff) / 1024,
+    "top": [{"site": str(d.traceback), "kb": d.size_diff / 1024, "blocks": d.count_diff} for d in diff[:top_n]],
+  }
+
+
+def benchmark_platform(platform: str, seconds: float = 5., warmup: float = 1., alloc_seconds: float = 1.) -> dict:
+  CI = make_interface(platform)
+  CC, CC_SP = engaged_car_control()
+  discover_messages(CI, CC, CC_SP)
+  n_warmup, n_timed, n_alloc = (round(s / DT_CTRL) for s in (warmup, seconds, alloc_seconds))
+  ticks = SyntheticTraffic(list(CI.can_parsers.values())).generate(n_warmup + n_timed + n_alloc, int(DT_CTRL * 1e9))
+
+  # the warmup lets the parsers see every message and learn the frequencies they weren't given
+  run_ticks(CI, ticks[:n_warmup], CC, CC_SP)
+  latencies = run_ticks(CI, ticks[n_warmup:n_warmup + n_timed], CC, CC_SP)
+
+  ret = {
+    "brand": type(CI).__module__.split(".")[-2],
+    "frames_per_second": sum(len(frames) for _, frames in ticks[n_warmup:n_warmup + n_timed]) / seconds,
+    "ticks": n_timed,
+    "can_valid": all(cp.can_valid for cp in CI.can_parsers.values()),
+    "latency": latency_stats(latencies),
+  }
+  if n_alloc:
+    ret["alloc"] = allocation_stats(CI, ticks[n_warmup + n_timed:], CC, CC_SP)
+  return ret
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("platforms", nargs="*", help="platforms to run, all by default")
+  parser.add_argument("--brand", help="only this brand's platforms")
+  parser.add_argument("--seconds", type=float, default=5., help="seconds of traffic to time")
+  parser.add_argument("--alloc-seconds", type=float, default=1., help="seconds of traffic under tracemalloc, 0 to skip")
+  parser.add_argument("--json", help="write the results as JSON here")
+  parser.add_argument("-v", "--verbose", action="store_true", help="show carlog warnings, such as parsers missing messages while warming up")
+  args = parser.parse_args()
+  if not args.verbose:
+    carlog.setLevel(logging.ERROR)
+
+  platforms = args.platforms or sorted(PLATFORMS)
+  if args.brand:
+    platforms = [p for p in platforms if interfaces[p].__module__.split(".")[-2] == args.brand]
+
+  results = {}
+  print(f"{'platform':40} {'frames/s':>8} {'p50 us':>8} {'p99 us':>8} {'max us':>8} {'alloc kb':>9}")
+  for platform in platforms:
+    try:
+      results[platform] = ret = benchmark_platform(platform, args.seconds, alloc_seconds=args.alloc_seconds)
+    except Exception as e:
+      results[platform] = {"error": repr(e)}
+      print(f"{platform:40} failed: {e!r}", file=sys.stderr)
+      continue
+    lat = ret["latency"]
+    alloc = f"{ret['alloc']['peak_kb']:9.1f}" if "alloc" in ret else f"{'':9}"
+    print(f"{platform:40} {ret['frames_per_second']:8.0f} {lat['p50_us']:8.1f} {lat['p99_us']:8.1f} {lat['max_us']:8.1f} {alloc}")
+
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,90 @@
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from opendbc.can import CANPacker, CANParser
+from opendbc.car import canlog
+from opendbc.car.can_definitions import CanData
+from opendbc.car.canlog import CanLog, write_can_log
+
+
+def random_events(n: int, seed: int = 0) -> list[tuple[int, list[CanData]]]:
+  rng = random.Random(seed)
+  events = []
+  for i in range(n):
+    frames = [CanData(rng.choice([0x100, 0x200, 0x2ff, 0x18daf1e8]), bytes(rng.getrandbits(8) for _ in range(rng.choice([0, 1, 8, 32, 64]))),
+                      rng.choice([0, 1, 2, 128])) for _ in range(rng.randint(0, 5))]
+    events.append((i * 10_000_000, frames))
+  return events
+
+
+class TestCanLog(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.tmp.name, "test.canlog")
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def test_round_trip(self):
+    events = random_events(500)
+    meta = write_can_log(self.path, events)
+    assert meta["events"] == len(events) and meta["frames"] == sum(len(f) for _, f in events)
+
+    log = CanLog(self.path)
+    assert len(log) == meta["frames"] and log.n_events == len(events)
+    for chunk_events in (1, 7, 1000):
+      assert list(log.iter_events(chunk_events=chunk_events)) == events
+    assert list(log.iter_events(100, 200)) == events[100:200]
+
+  def test_chunked_writes(self):
+    # flushing in the middle of the log doesn't change the result
+    events = random_events(300, seed=1)
+    old = canlog.CHUNK_FRAMES
+    try:
+      canlog.CHUNK_FRAMES = 16
+      write_can_log(self.path, events)
+    finally:
+      canlog.CHUNK_FRAMES = old
+    assert list(CanLog(self.path).iter_events()) == events
+
+  def test_empty(self):
+    write_can_log(self.path, [])
+    log = CanLog(self.path)
+    assert len(log) == 0 and list(log.iter_events()) == []
+
+  def test_seek_and_filter(self):
+    events = random_events(200, seed=2)
+    write_can_log(self.path, events)
+    log = CanLog(self.path)
+
+    assert log.seek(0) == 0
+    assert log.seek(505_000_000) == 51
+    assert log.seek(10**18) == len(events)
+
+    filtered = list(log.iter_events(addresses=[0x100], buses=[0]))
+    assert filtered == [(t, [f for f in frames if f.address == 0x100 and f.src == 0]) for t, frames in events]
+
+    idxs = log.frame_indices(addresses=[0x200])
+    all_frames = [f for _, frames in events for f in frames]
+    assert [all_frames[i] for i in idxs] == [f for f in all_frames if f.address == 0x200]
+
+  def test_decode_batch(self):
+    dbc_name = "honda_civic_touring_2016_can_generated"
+    packer = CANPacker(dbc_name)
+    events = [(i * 10_000_000, [CanData(*packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": i})),
+                                CanData(*packer.make_can_msg("GAS_PEDAL_2", 1, {}))]) for i in range(50)]
+    write_can_log(self.path, events)
+    log = CanLog(self.path)
+
+    parser = CANParser(dbc_name, [("STEERING_CONTROL", 0)], 0)
+    out = parser.decode_batch(*log.columns(log.frame_indices(buses=[0])))
+    np.testing.assert_array_equal(out["STEERING_CONTROL"]["STEER_TORQUE"], np.arange(50))
+    np.testing.assert_array_equal(out["STEERING_CONTROL"]["nanos"], [t for t, _ in events])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,91 @@
+import os
+import random
+import tempfile
+import unittest
+import zstandard as zstd
+
+from opendbc.car import logreader
+from opendbc.car.logreader import LogReader, capnp_log
+
+
+def make_log(n: int, shuffle_window: int = 0, seed: int = 0) -> bytes:
+  rng = random.Random(seed)
+  times = list(range(n))
+  # swap events at most shuffle_window apart
+  for i in range(0, n - shuffle_window, shuffle_window + 1 if shuffle_window else n):
+    j = i + rng.randint(0, shuffle_window)
+    times[i], times[j] = times[j], times[i]
+
+  dat = b""
+  for i, t in enumerate(times):
+    e = capnp_log.Event.new_message(logMonoTime=t * 10_000_000)
+    if i == n // 2:
+      # big enough to be split into several segments
+      for c in e.init("can", 3000):
+        c.dat = bytes(64)
+    elif i % 3:
+      can = e.init("can", i % 5)
+      for j, c in enumerate(can):
+        c.address, c.dat, c.src = 0x100 + j, bytes([i % 256]) * (i % 9), j % 3
+    else:
+      e.frame = None
+    dat += e.to_bytes()
+  return dat
+
+
+def summary(lr) -> list:
+  return [(e.logMonoTime, e.which(), [(c.address, c.dat, c.src) for c in e.can] if e.which() == "can" else None) for e in lr]
+
+
+class TestLogReader(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def write(self, name: str, dat: bytes) -> str:
+    fn = os.path.join(self.tmp.name, name)
+    with open(fn, "wb") as f:
+      f.write(dat)
+    return fn
+
+  def test_streaming(self):
+    dat = make_log(2000)
+    # several zstd frames, like a log written in parts
+    compressed = b"".join(zstd.ZstdCompressor().compress(dat[i:i + 10000]) for i in range(0, len(dat), 10000))
+    for fn in (self.write("rlog", dat), self.write("rlog.zst", compressed)):
+      expected = summary(LogReader(fn))
+      assert len(expected) == 2000
+      for read_size in (7, 1000, logreader.STREAM_READ_SIZE):
+        old, logreader.STREAM_READ_SIZE = logreader.STREAM_READ_SIZE, read_size
+        try:
+          lr = LogReader(fn, streaming=True)
+          assert summary(lr) == expected
+          # streaming logs can be iterated over again
+          assert summary(lr) == expected
+        finally:
+          logreader.STREAM_READ_SIZE = old
+
+  def test_streaming_sort_by_time(self):
+    fn = self.write("rlog", make_log(1000, shuffle_window=20, seed=1))
+    expected = summary(LogReader(fn, sort_by_time=True))
+    assert [t for t, _, _ in expected] == sorted(t for t, _, _ in expected)
+    assert summary(LogReader(fn, sort_by_time=True, streaming=True, sort_window_size=25)) == expected
+
+  def test_streaming_filter(self):
+    fn = self.write("rlog", make_log(100))
+    lr = LogReader(fn, streaming=True)
+    assert lr.first("can") is not None
+    assert len(list(lr.filter("can"))) == len(list(LogReader(fn).filter("can")))
+
+  def test_streaming_truncated(self):
+    dat = make_log(50)
+    fn = self.write("rlog", dat[:-3])
+    with self.assertWarns(RuntimeWarning):
+      ents = list(LogReader(fn, streaming=True))
+    assert len(ents) == 49
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,3 +1,5 @@
+import numpy as np
+
 from opendbc.car.structs import CarParams
 
 SteerControlType = CarParams.SteerControlType
@@ -6,12 +8,9 @@ SteerControlType = CarParams.SteerControlType
 def create_steer_command(packer, steer, steer_req):
   """Creates a CAN message for the Toyota Steer Command."""
 
-  values = {
-    "STEER_REQUEST": steer_req,
-    "STEER_TORQUE_CMD": steer,
-    "SET_ME_1": 1,
-  }
-  return packer.make_can_msg("STEERING_LKA", 0, values)
+  # sent every frame, so pack positionally
+  pack = packer.prepare("STEERING_LKA", ("STEER_REQUEST", "STEER_TORQUE_CMD", "SET_ME_1"))
+  return pack(0, steer_req, steer, 1)
 
 
 def create_lta_steer_command(packer, steer_control_type, steer_angle, steer_req, frame, torque_wind_down):
@@ -155,12 +154,11 @@ def create_ui_command(packer, steer, chime, left_line, right_line, left_lane_dep
   return packer.make_can_msg("LKAS_HUD", 0, values)
 
 
-def toyota_checksum(address: int, sig, d: bytearray) -> int:
-  s = len(d)
-  addr = address
-  while addr:
-    s += addr & 0xFF
-    addr >>= 8
-  for i in range(len(d) - 1):
-    s += d[i]
+def toyota_checksum(address: int, sig, d: bytes | bytearray | memoryview) -> int:
+  s = len(d) + sum(address.to_bytes(4, "little")) + sum(d[:-1])
+  return s & 0xFF
+
+
+def toyota_checksum_batch(address: int, sig, frames: np.ndarray) -> np.ndarray:
+  s = frames.shape[1] + sum(address.to_bytes(4, "little")) + frames[:, :-1].sum(axis=1, dtype=np.int64)
   return s & 0xFF
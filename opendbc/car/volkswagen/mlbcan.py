@@ -52,7 +52,7 @@ def create_acc_hud_control(packer, bus, acc_hud_status, set_speed, lead_distance
   values = {}
   return packer.make_can_msg("ACC_02", bus, values)
 
-def volkswagen_mlb_checksum(address: int, sig, d: bytearray) -> int:
+def volkswagen_mlb_checksum(address: int, sig, d: bytes | bytearray | memoryview) -> int:
   xor_starting_value = {
     0x109: 0x08, # ACC_01
     0x111: 0x10, # TSK_05
@@ -1,4 +1,6 @@
-from opendbc.car.crc import CRC8H2F
+import numpy as np
+
+from opendbc.car.crc import CRC8H2F, crc8_h2f
 
 
 def create_steering_control(packer, bus, apply_torque, lkas_enabled):
@@ -172,32 +174,31 @@ def create_aeb_hud(packer, aeb_supported, fcw_active):
   return packer.make_can_msg("ACC_15", 0, values)
 
 
-def volkswagen_mqb_meb_checksum(address: int, sig, d: bytearray) -> int:
-  crc = 0xFF
-  for i in range(1, len(d)):
-    crc ^= d[i]
-    crc = CRC8H2F[crc]
+def volkswagen_mqb_meb_checksum(address: int, sig, d: bytes | bytearray | memoryview) -> int:
+  crc = crc8_h2f.update(0xFF, d[1:])
   counter = d[1] & 0x0F
   const = VOLKSWAGEN_MQB_MEB_CONSTANTS.get(address)
   if const:
-    crc ^= const[counter]
-    crc = CRC8H2F[crc]
+    crc = CRC8H2F[crc ^ const[counter]]
+  return crc ^ 0xFF
+
+
+def volkswagen_mqb_meb_checksum_batch(address: int, sig, frames: np.ndarray) -> np.ndarray:
+  crc = crc8_h2f.update_batch(0xFF, frames[:, 1:])
+  const = VOLKSWAGEN_MQB_MEB_CONSTANTS.get(address)
+  if const:
+    crc = crc8_h2f.np_table[crc ^ np.array(const, dtype=np.uint8)[frames[:, 1] & 0x0F]]
   return crc ^ 0xFF
 
 
-def volkswagen_mqb_meb_dyn_len_checksum(address: int, sig, d: bytearray, length: int, const: list[int]) -> int:
-  d = d[:length]
-  crc = 0xFF
-  for i in range(1, len(d)):
-    crc ^= d[i]
-    crc = CRC8H2F[crc]
+def volkswagen_mqb_meb_dyn_len_checksum(address: int, sig, d: bytes | bytearray | memoryview, length: int, const: list[int]) -> int:
+  crc = crc8_h2f.update(0xFF, d[1:length])
   counter = d[1] & 0x0F
-  crc ^= const[counter]
-  crc = CRC8H2F[crc]
+  crc = CRC8H2F[crc ^ const[counter]]
   return crc ^ 0xFF
 
 
-def volkswagen_meb_alt_crc_checksum(address: int, sig, d: bytearray) -> int:
+def volkswagen_meb_alt_crc_checksum(address: int, sig, d: bytes | bytearray | memoryview) -> int:
   entry = VOLKSWAGEN_MEB_ALT_CRC_CONSTANTS.get(address)
   if entry:
     length, const = entry
@@ -208,15 +209,20 @@ def volkswagen_meb_alt_crc_checksum(address: int, sig, d: bytearray) -> int:
   return volkswagen_mqb_meb_checksum(address, sig, d)
 
 
-def xor_checksum(address: int, sig, d: bytearray, initial_value: int = 0) -> int:
+def xor_checksum(address: int, sig, d: bytes | bytearray | memoryview, initial_value: int = 0) -> int:
   checksum = initial_value
   checksum_byte = sig.start_bit // 8
-  for i in range(len(d)):
+  for i, b in enumerate(d):
     if i != checksum_byte:
-      checksum ^= d[i]
+      checksum ^= b
   return checksum
 
 
+def xor_checksum_batch(address: int, sig, frames: np.ndarray) -> np.ndarray:
+  checksum = np.bitwise_xor.reduce(frames, axis=1)
+  return checksum ^ frames[:, sig.start_bit // 8]
+
+
 VOLKSWAGEN_MQB_MEB_CONSTANTS: dict[int, list[int]] = {
     0x40:  [0x40] * 16,  # Airbag_01
     0x86:  [0x86] * 16,  # LWI_01
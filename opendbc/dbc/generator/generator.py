@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
+import hashlib
 import importlib
 import os
 import re
+from dataclasses import dataclass
+from functools import cache
 from pathlib import Path
 
 generator_path = os.path.dirname(os.path.realpath(__file__))
@@ -31,6 +34,87 @@ def _create_dbc_content(src_dir: str, filename: str, extra_files: dict[str, str]
   return ''.join(parts)
 
 
+@dataclass(frozen=True)
+class GeneratedDBCSource:
+  src_dir: str
+  filename: str  # template, read from src_dir or produced by script
+  script: str | None = None
+
+
+def _is_script(filename: str) -> bool:
+  return filename.endswith(".py") and not filename.startswith("test_") and filename != "generator.py"
+
+
+@cache
+def get_index() -> dict[str, GeneratedDBCSource]:
+  """Map each generated DBC name to its source without running any generator scripts.
+  Scripts produce the template named after them, e.g. tesla_radar_bosch.py -> tesla_radar_bosch.dbc."""
+  index = {}
+  for src_dir, _, filenames in os.walk(generator_path):
+    if src_dir == generator_path:
+      continue
+    for filename in sorted(filenames):
+      if filename.startswith("_"):
+        continue
+      if filename.endswith(".dbc"):
+        index[filename.replace(".dbc", "_generated")] = GeneratedDBCSource(src_dir, filename)
+      elif _is_script(filename):
+        index[filename.replace(".py", "_generated")] = GeneratedDBCSource(src_dir, filename.replace(".py", ".dbc"), filename)
+  return index
+
+
+def _run_scripts(src_dir: str, scripts: list[str]) -> dict[str, str]:
+  outputs: dict[str, str] = {}
+  for script in scripts:
+    mod = importlib.import_module(f"opendbc.dbc.generator.{os.path.basename(src_dir)}.{script.removesuffix('.py')}")
+    if hasattr(mod, 'generate'):
+      outputs.update(mod.generate())
+  return outputs
+
+
+def _dir_scripts(src_dir: str) -> list[str]:
+  return sorted(f for f in os.listdir(src_dir) if _is_script(f))
+
+
+def generate_dbc(name: str) -> str | None:
+  """Generate a single DBC in memory, touching only its own template, includes, and scripts."""
+  src = get_index().get(name)
+  if src is None:
+    return None
+
+  extra = _run_scripts(src.src_dir, [src.script]) if src.script else {}
+  includes = include_pattern.findall(_read_dbc(src.src_dir, src.filename, extra))
+  if any(f not in extra and not os.path.exists(os.path.join(src.src_dir, f)) for f in includes):
+    # some includes are script outputs
+    extra.update(_run_scripts(src.src_dir, _dir_scripts(src.src_dir)))
+  return _create_dbc_content(src.src_dir, src.filename, extra)
+
+
+def inputs_digest(name: str | None = None) -> str:
+  """Hash of the generator inputs that determine the named generated DBC, or all of them if no name is given.
+  Scripts in the DBC's directory are always included, since they can produce its template or includes,
+  and so is every DBC in a directory with scripts, since they can read any of them."""
+  if name is None:
+    paths = [p for p in Path(generator_path).rglob("*") if p.is_file() and p.suffix in (".dbc", ".py")]
+  elif (src := get_index().get(name)) is not None:
+    paths = [Path(src.src_dir, f) for f in _dir_scripts(src.src_dir)]
+    if paths:
+      paths += Path(src.src_dir).glob("*.dbc")
+    template = Path(src.src_dir, src.filename)
+    if template.exists():
+      paths.append(template)
+      paths += [Path(src.src_dir, f) for f in include_pattern.findall(template.read_text(encoding='utf-8'))]
+  else:
+    paths = []
+
+  h = hashlib.sha256()
+  for path in sorted(set(paths)):
+    h.update(str(path.relative_to(generator_path)).encode() + b"\0")
+    if path.exists():
+      h.update(path.read_bytes())
+  return h.hexdigest()
+
+
 def _collect_script_outputs() -> dict[str, dict[str, str]]:
   """Import and call generate() from each sub-generator script.
   Returns {dir_name: {filename: content}}."""
@@ -210,6 +210,25 @@ typedef struct {
   bool disable_forwarding;
 } safety_config;
 
+// open addressing hash tables of the current config's rx_checks and tx_msgs, keyed on address and bus
+#define ADDR_LOOKUP_BITS 8U
+#define ADDR_LOOKUP_SIZE (1U << ADDR_LOOKUP_BITS)
+#define ADDR_LOOKUP_MAX_ENTRIES 192  // keeps the tables at most 3/4 full, larger configs are scanned instead
+
+typedef struct {
+  int16_t rx[ADDR_LOOKUP_SIZE];  // rx_checks index * MAX_ADDR_CHECK_MSGS + msg index, -1 if empty
+  int16_t tx[ADDR_LOOKUP_SIZE];  // tx_msgs index, -1 if empty
+  bool rx_indexed;
+  bool tx_indexed;
+  int tx_relay_checks;           // number of tx_msgs with check_relay
+} AddrLookup;
+
+typedef enum {
+  TX_MSG_WHITELISTED,   // same address, bus and length
+  TX_MSG_RELAY_CHECK,   // same address and bus, with check_relay
+  TX_MSG_STATIC_BLOCK,  // same address and bus, with check_relay and static blocking enabled
+} TxMsgMatch;
+
 typedef uint32_t (*get_checksum_t)(const CANPacket_t *msg);
 typedef uint32_t (*compute_checksum_t)(const CANPacket_t *msg);
 typedef uint8_t (*get_counter_t)(const CANPacket_t *msg);
@@ -111,30 +111,96 @@ static bool is_msg_valid(RxCheck addr_list[], int index) {
   return valid;
 }
 
+static AddrLookup addr_lookup;
+
+static uint32_t addr_lookup_slot(int addr, unsigned int bus) {
+  // Fibonacci hashing, addresses take up to 29 bits and the bus goes in the top 3
+  uint32_t key = ((uint32_t)addr) ^ (bus << 29U);
+  return (key * 2654435761U) >> (32U - ADDR_LOOKUP_BITS);
+}
+
+static uint32_t addr_lookup_next(uint32_t slot) {
+  return (slot + 1U) & (ADDR_LOOKUP_SIZE - 1U);
+}
+
+static void addr_lookup_insert(int16_t table[], int addr, unsigned int bus, int value) {
+  uint32_t slot = addr_lookup_slot(addr, bus);
+  while (table[slot] != -1) {
+    slot = addr_lookup_next(slot);
+  }
+  table[slot] = (int16_t)value;
+}
+
+// called on safety mode init. entries are inserted in config order, so probing
+// visits the matches for an address in the same order as scanning the config
+static void addr_lookup_build(const safety_config *cfg) {
+  for (uint32_t i = 0U; i < ADDR_LOOKUP_SIZE; i++) {
+    addr_lookup.rx[i] = -1;
+    addr_lookup.tx[i] = -1;
+  }
+
+  int rx_entries = 0;
+  for (int i = 0; i < cfg->rx_checks_len; i++) {
+    for (uint8_t j = 0U; (j < MAX_ADDR_CHECK_MSGS) && (cfg->rx_checks[i].msg[j].addr != 0); j++) {
+      rx_entries++;
+    }
+  }
+  addr_lookup.rx_indexed = rx_entries <= ADDR_LOOKUP_MAX_ENTRIES;
+  if (addr_lookup.rx_indexed) {
+    for (int i = 0; i < cfg->rx_checks_len; i++) {
+      for (uint8_t j = 0U; (j < MAX_ADDR_CHECK_MSGS) && (cfg->rx_checks[i].msg[j].addr != 0); j++) {
+        addr_lookup_insert(addr_lookup.rx, cfg->rx_checks[i].msg[j].addr, cfg->rx_checks[i].msg[j].bus, (i * (int)MAX_ADDR_CHECK_MSGS) + (int)j);
+      }
+    }
+  }
+
+  addr_lookup.tx_relay_checks = 0;
+  for (int i = 0; i < cfg->tx_msgs_len; i++) {
+    if (cfg->tx_msgs[i].check_relay) {
+      addr_lookup.tx_relay_checks++;
+    }
+  }
+  addr_lookup.tx_indexed = cfg->tx_msgs_len <= ADDR_LOOKUP_MAX_ENTRIES;
+  if (addr_lookup.tx_indexed) {
+    for (int i = 0; i < cfg->tx_msgs_len; i++) {
+      addr_lookup_insert(addr_lookup.tx, cfg->tx_msgs[i].addr, cfg->tx_msgs[i].bus, i);
+    }
+  }
+}
+
+static bool rx_check_matches(RxCheck addr_list[], int i, int j, int addr, unsigned int bus, int length) {
+  bool match = false;
+  // if multiple msgs are allowed, determine which one is present on the bus
+  if ((addr == addr_list[i].msg[j].addr) && (bus == addr_list[i].msg[j].bus) && (length == addr_list[i].msg[j].len)) {
+    if (!addr_list[i].status.msg_seen) {
+      addr_list[i].status.index = j;
+      addr_list[i].status.msg_seen = true;
+    }
+    match = addr_list[i].status.index == j;
+  }
+  return match;
+}
+
 static int get_addr_check_index(const CANPacket_t *msg, RxCheck addr_list[], const int len) {
   int addr = msg->addr;
   int length = GET_LEN(msg);
 
   int index = -1;
-  for (int i = 0; i < len; i++) {
-    // if multiple msgs are allowed, determine which one is present on the bus
-    if (!addr_list[i].status.msg_seen) {
-      for (uint8_t j = 0U; (j < MAX_ADDR_CHECK_MSGS) && (addr_list[i].msg[j].addr != 0); j++) {
-        if ((addr == addr_list[i].msg[j].addr) && (msg->bus == addr_list[i].msg[j].bus) &&
-              (length == addr_list[i].msg[j].len)) {
-          addr_list[i].status.index = j;
-          addr_list[i].status.msg_seen = true;
-          break;
-        }
+  if (addr_lookup.rx_indexed) {
+    uint32_t slot = addr_lookup_slot(addr, msg->bus);
+    while ((index == -1) && (addr_lookup.rx[slot] != -1)) {
+      int i = addr_lookup.rx[slot] / (int)MAX_ADDR_CHECK_MSGS;
+      if (rx_check_matches(addr_list, i, addr_lookup.rx[slot] % (int)MAX_ADDR_CHECK_MSGS, addr, msg->bus, length)) {
+        index = i;
       }
+      slot = addr_lookup_next(slot);
     }
-
-    if (addr_list[i].status.msg_seen) {
-      int idx = addr_list[i].status.index;
-      if ((addr == addr_list[i].msg[idx].addr) && (msg->bus == addr_list[i].msg[idx].bus) &&
-          (length == addr_list[i].msg[idx].len)) {
-        index = i;
-        break;
+  } else {
+    for (int i = 0; (i < len) && (index == -1); i++) {
+      for (uint8_t j = 0U; (j < MAX_ADDR_CHECK_MSGS) && (addr_list[i].msg[j].addr != 0) && (index == -1); j++) {
+        if (rx_check_matches(addr_list, i, j, addr, msg->bus, length)) {
+          index = i;
+        }
       }
     }
   }
@@ -159,9 +225,9 @@ static void update_counter(RxCheck addr_list[], int index, uint8_t counter) {
 
 static bool rx_msg_safety_check(const CANPacket_t *msg,
                                 const safety_config *cfg,
-                                const safety_hooks *safety_hooks) {
+                                const safety_hooks *safety_hooks,
+                                int index) {
 
-  int index = get_addr_check_index(msg, cfg->rx_checks, cfg->rx_checks_len);
   update_addr_timestamp(cfg->rx_checks, index);
 
   if (index != -1) {
@@ -192,11 +258,39 @@ static bool rx_msg_safety_check(const CANPacket_t *msg,
   return is_msg_valid(cfg->rx_checks, index);
 }
 
+static bool tx_msg_matches(const CanMsg *m, int addr, unsigned int bus, int len, TxMsgMatch match) {
+  bool ret = (m->addr == addr) && (m->bus == bus);
+  if (match == TX_MSG_WHITELISTED) {
+    ret = ret && (m->len == len);
+  } else {
+    ret = ret && m->check_relay && ((match == TX_MSG_RELAY_CHECK) || !m->disable_static_blocking);
+  }
+  return ret;
+}
+
+// true if the current config has a tx msg with this address and bus that fits match. len is only compared for TX_MSG_WHITELISTED
+static bool find_tx_msg(int addr, unsigned int bus, int len, TxMsgMatch match) {
+  bool found = false;
+  if (addr_lookup.tx_indexed) {
+    uint32_t slot = addr_lookup_slot(addr, bus);
+    while (!found && (addr_lookup.tx[slot] != -1)) {
+      found = tx_msg_matches(&current_safety_config.tx_msgs[addr_lookup.tx[slot]], addr, bus, len, match);
+      slot = addr_lookup_next(slot);
+    }
+  } else {
+    for (int i = 0; (i < current_safety_config.tx_msgs_len) && !found; i++) {
+      found = tx_msg_matches(&current_safety_config.tx_msgs[i], addr, bus, len, match);
+    }
+  }
+  return found;
+}
+
 bool safety_rx_hook(const CANPacket_t *msg) {
   bool controls_allowed_prev = controls_allowed;
 
-  bool valid = rx_msg_safety_check(msg, &current_safety_config, current_hooks);
-  bool whitelisted = get_addr_check_index(msg, current_safety_config.rx_checks, current_safety_config.rx_checks_len) != -1;
+  int index = get_addr_check_index(msg, current_safety_config.rx_checks, current_safety_config.rx_checks_len);
+  bool valid = rx_msg_safety_check(msg, &current_safety_config, current_hooks, index);
+  bool whitelisted = index != -1;
   if (valid && whitelisted) {
     current_hooks->rx(msg);
   }
@@ -207,12 +301,10 @@ bool safety_rx_hook(const CANPacket_t *msg) {
   // the relay malfunction hook runs on all incoming rx messages.
   // check all applicable tx msgs for liveness on sending bus.
   // used to detect a relay malfunction or control messages from disabled ECUs like the radar
-  const int addr = msg->addr;
-  for (int i = 0; i < current_safety_config.tx_msgs_len; i++) {
-    const CanMsg *m = &current_safety_config.tx_msgs[i];
-    if (m->check_relay) {
-      stock_ecu_check((m->addr == addr) && (m->bus == msg->bus));
-    }
+  // stock_ecu_check also steps the MADS state, so it still runs once per check_relay msg
+  const bool stock_ecu_detected = find_tx_msg(msg->addr, msg->bus, 0, TX_MSG_RELAY_CHECK);
+  for (int i = 0; i < addr_lookup.tx_relay_checks; i++) {
+    stock_ecu_check(stock_ecu_detected);
   }
 
   // reset mismatches on rising edge of controls_allowed to avoid rare race condition
@@ -223,22 +315,12 @@ bool safety_rx_hook(const CANPacket_t *msg) {
   return valid;
 }
 
-static bool tx_msg_safety_check(const CANPacket_t *msg, const CanMsg msg_list[], int len) {
-  int addr = msg->addr;
-  int length = GET_LEN(msg);
-
-  bool whitelisted = false;
-  for (int i = 0; i < len; i++) {
-    if ((addr == msg_list[i].addr) && (msg->bus == msg_list[i].bus) && (length == msg_list[i].len)) {
-      whitelisted = true;
-      break;
-    }
-  }
-  return whitelisted;
+static bool tx_msg_safety_check(const CANPacket_t *msg) {
+  return find_tx_msg(msg->addr, msg->bus, GET_LEN(msg), TX_MSG_WHITELISTED);
 }
 
 bool safety_tx_hook(CANPacket_t *msg) {
-  bool whitelisted = tx_msg_safety_check(msg, current_safety_config.tx_msgs, current_safety_config.tx_msgs_len);
+  bool whitelisted = tx_msg_safety_check(msg);
   if ((current_safety_mode == SAFETY_ALLOUTPUT) || (current_safety_mode == SAFETY_ELM327)) {
     whitelisted = true;
   }
@@ -270,13 +352,7 @@ int safety_fwd_hook(int bus_num, int addr) {
   // in the case of selective AEB forwarding
   const int destination_bus = get_fwd_bus(bus_num);
   if (!blocked) {
-    for (int i = 0; i < current_safety_config.tx_msgs_len; i++) {
-      const CanMsg *m = &current_safety_config.tx_msgs[i];
-      if (m->check_relay && !m->disable_static_blocking && (m->addr == addr) && (m->bus == (unsigned int)destination_bus)) {
-        blocked = true;
-        break;
-      }
-    }
+    blocked = find_tx_msg(addr, (unsigned int)destination_bus, 0, TX_MSG_STATIC_BLOCK);
   }
 
   if (!blocked && (current_hooks->fwd != NULL)) {
@@ -503,6 +579,7 @@ int set_safety_hooks(uint16_t mode, uint16_t param) {
       current_safety_config.rx_checks[j].status = (RxStatus){0};
     }
   }
+  addr_lookup_build(&current_safety_config);
   return set_status;
 }
 
@@ -1,8 +1,10 @@
+import hashlib
 import os
 import subprocess
 import tempfile
 from pathlib import Path
 
+import numpy as np
 from cffi import FFI
 
 from opendbc.safety import LEN_TO_DLC
@@ -10,20 +12,33 @@ from opendbc.safety import LEN_TO_DLC
 libsafety_dir = os.path.dirname(os.path.abspath(__file__))
 
 
-def _build_libsafety(release: bool = False) -> str:
-  """Compile libsafety.so to a temp file and return its path."""
+# perf builds are cached here, set OPENDBC_CACHE_DIR="" to disable
+_cache_base = os.environ.get("OPENDBC_CACHE_DIR", os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "opendbc"))
+CACHE_DIR = os.path.join(_cache_base, "libsafety") if _cache_base else ""
+
+UBSAN_FLAGS = ['-fsanitize=undefined', '-fno-sanitize-recover=undefined']
+
+
+def _build_libsafety(release: bool = False, perf: bool = False, sanitize: bool = True) -> str:
+  """Compile libsafety.so to a temp file and return its path.
+
+  perf builds are optimized and not instrumented for coverage, for replays and long property tests,
+  and are only sanitized if asked to. Unless CACHE_DIR is disabled, they're cached by a hash of the
+  safety sources, flags and compiler, so they're only rebuilt when one of those changes."""
   root = str(Path(libsafety_dir).parents[3])
   safety_c = os.path.join(libsafety_dir, "safety.c")
 
   cflags = [
     '-Wall', '-Wextra', '-Werror', '-nostdlib', '-fno-builtin',
     '-std=gnu11', '-Wfatal-errors', '-Wno-pointer-to-int-cast',
-    '-g', '-O0', '-fno-omit-frame-pointer',
+    '-g', '-O2' if perf else '-O0', '-fno-omit-frame-pointer',
   ]
-  ldflags = [
-    '-fsanitize=undefined', '-fno-sanitize-recover=undefined',
-  ]
-  if not release:
+  ldflags = [*UBSAN_FLAGS] if (sanitize or not perf) else []
+  if perf:
+    cflags += ['-DALLOW_DEBUG', *ldflags]
+    if CACHE_DIR:
+      return _build_cached(root, safety_c, cflags, ldflags)
+  elif not release:
     cflags += ['-DALLOW_DEBUG', '-fprofile-arcs', '-ftest-coverage']
     ldflags += ['-fprofile-arcs', '-ftest-coverage']
 
@@ -37,6 +52,28 @@ def _build_libsafety(release: bool = False) -> str:
   return libsafety_so
 
 
+def _build_cached(root: str, safety_c: str, cflags: list[str], ldflags: list[str]) -> str:
+  h = hashlib.sha256()
+  for path in sorted(Path(root, "opendbc", "safety").rglob("*.[ch]")):
+    h.update(f"{path.relative_to(root)}\0".encode())
+    h.update(path.read_bytes())
+  h.update(subprocess.check_output(['cc', '--version']))
+  h.update(" ".join([*cflags, "|", *ldflags]).encode())
+
+  libsafety_so = os.path.join(CACHE_DIR, f"libsafety-{h.hexdigest()[:16]}.so")
+  if os.path.exists(libsafety_so):
+    return libsafety_so
+
+  # built next to the cache entry and moved in place, so concurrent builds don't see a partial library
+  os.makedirs(CACHE_DIR, exist_ok=True)
+  with tempfile.TemporaryDirectory(dir=CACHE_DIR) as tmp:
+    safety_o, tmp_so = os.path.join(tmp, "safety.o"), os.path.join(tmp, "libsafety.so")
+    subprocess.check_call(['cc', '-fPIC', *cflags, '-I', root, '-c', safety_c, '-o', safety_o])
+    subprocess.check_call(['cc', '-shared', safety_o, '-o', tmp_so, *ldflags])
+    os.replace(tmp_so, libsafety_so)
+  return libsafety_so
+
+
 ffi = FFI()
 
 ffi.cdef("""
@@ -102,6 +139,8 @@ bool get_cruise_engaged_prev(void);
 void set_cruise_engaged_prev(bool engaged);
 bool get_vehicle_moving(void);
 void set_timer(uint32_t t);
+void set_addr_lookup_indexed(bool c);
+bool get_addr_lookup_indexed(void);
 
 void safety_tick_current_safety_config();
 bool safety_config_valid();
@@ -145,8 +184,24 @@ void set_heartbeat_engaged_mads(bool c);
 void mads_heartbeat_engaged_check(void);
 void set_steering_disengage(bool c);
 int get_gas_interceptor_prev(void);
+
+void safety_replay_batch(int n, const uint64_t nanos[], const uint32_t addr[], const uint8_t bus[], const uint8_t len[],
+                         const uint8_t data[], const uint8_t flags[], uint8_t result[], uint32_t state[]);
 """)
 
+# safety_replay_batch() frame flags, result bits and state bits, see safety.c
+REPLAY_RX, REPLAY_TX, REPLAY_TICK = 1, 2, 4
+REPLAY_OK, REPLAY_RX_CHECKS_VALID = 1, 2
+REPLAY_STATE_BITS = {
+  'controls_allowed': 1,
+  'controls_allowed_lateral': 2,
+  'longitudinal_tx_allowed': 4,
+  'controls_requested_lateral': 8,
+  'stock_acc_main': 16,
+  'mads_acc_main': 32,
+  'mads_enabled': 64,
+}
+
 class LibSafety:
   pass
 libsafety: LibSafety
@@ -156,8 +211,10 @@ def load(path):
   libsafety = ffi.dlopen(str(path))
 
 def __getattr__(name):
+  # LIBSAFETY_PROFILE=perf for an optimized build, LIBSAFETY_SANITIZE=1 to keep UBSan in it
   if name == "libsafety":
-    load(_build_libsafety())
+    perf = os.environ.get("LIBSAFETY_PROFILE", "") == "perf"
+    load(_build_libsafety(perf=perf, sanitize=not perf or os.environ.get("LIBSAFETY_SANITIZE", "0") == "1"))
     return libsafety
   raise AttributeError(name)
 
@@ -169,3 +226,25 @@ def make_CANPacket(addr: int, bus: int, dat):
   ret[0].bus = bus
   ret[0].data = bytes(dat)
   return ret
+
+
+def replay_batch(safety, nanos, addr, bus, length, data, flags) -> tuple[np.ndarray, np.ndarray]:
+  """Runs frames through the safety hooks in one call into libsafety, instead of one per frame.
+  Each argument is an array with an entry per frame, data is (frames x 64) and zero padded.
+  bus is the src of each frame, passed to the fwd hook as is and put on the packets modulo 4.
+  Returns the REPLAY_OK/REPLAY_RX_CHECKS_VALID bits and the state sampled after each frame."""
+  n = len(nanos)
+  data = np.ascontiguousarray(data, dtype=np.uint8)
+  assert data.shape == (n, 64)
+  result = np.zeros(n, dtype=np.uint8)
+  state = np.zeros(n, dtype=np.uint32)
+  args = [(nanos, "uint64_t"), (addr, "uint32_t"), (bus, "uint8_t"), (length, "uint8_t"), (data, "uint8_t"), (flags, "uint8_t"),
+          (result, "uint8_t"), (state, "uint32_t")]
+  safety.safety_replay_batch(n, *(ffi.from_buffer(f"{ctype}[]", np.ascontiguousarray(a, dtype=ctype.removesuffix("_t"))) for a, ctype in args))
+  return result, state
+
+def replay_state(state: int) -> dict:
+  """Decodes a state sampled by replay_batch()"""
+  ret = {name: bool(state & bit) for name, bit in REPLAY_STATE_BITS.items()}
+  ret['current_disengage_reason'] = state >> 24
+  return ret
@@ -130,6 +130,16 @@ void set_timer(uint32_t t){
   timer_cnt = t;
 }
 
+// configs too big for the address lookup are scanned, tests force that path
+void set_addr_lookup_indexed(bool c){
+  addr_lookup.rx_indexed = c;
+  addr_lookup.tx_indexed = c;
+}
+
+bool get_addr_lookup_indexed(void){
+  return addr_lookup.rx_indexed || addr_lookup.tx_indexed;
+}
+
 void set_torque_meas(int min, int max){
   torque_meas.min = min;
   torque_meas.max = max;
@@ -342,3 +352,81 @@ void init_tests(void){
   heartbeat_engaged_mads = false;
   heartbeat_engaged_mads_mismatches = 0U;
 }
+
+// *** batched replay ***
+// runs frames through the hooks without a Python call per frame. frames are given as columns,
+// frame i's payload is data[i * 64U] to data[(i * 64U) + len[i]]
+
+// frame flags
+#define REPLAY_RX 1U    // received, run the fwd and rx hooks
+#define REPLAY_TX 2U    // sent by openpilot, run the tx hook
+#define REPLAY_TICK 4U  // run safety_tick before the frame, with the timer already at its time
+
+// result bits
+#define REPLAY_OK 1U                // rx valid or tx allowed
+#define REPLAY_RX_CHECKS_VALID 2U   // safety_config_valid() after the tick
+
+// state bits, sampled after each frame. the MADS disengage reason is in the top byte
+#define REPLAY_CONTROLS_ALLOWED 1U
+#define REPLAY_CONTROLS_ALLOWED_LATERAL 2U
+#define REPLAY_LONGITUDINAL_ALLOWED 4U
+#define REPLAY_CONTROLS_REQUESTED_LATERAL 8U
+#define REPLAY_ACC_MAIN_ON 16U
+#define REPLAY_MADS_ACC_MAIN 32U
+#define REPLAY_MADS_ENABLED 64U
+
+static unsigned char dlc_from_len(uint8_t len) {
+  unsigned char dlc = 0U;
+  while ((dlc < 15U) && (dlc_to_len[dlc] < len)) {
+    dlc++;
+  }
+  return dlc;
+}
+
+void safety_replay_batch(int n, const uint64_t nanos[], const uint32_t addr[], const uint8_t bus[], const uint8_t len[],
+                         const uint8_t data[], const uint8_t flags[], uint8_t result[], uint32_t state[]) {
+  CANPacket_t msg = {0};
+  for (int i = 0; i < n; i++) {
+    set_timer((nanos[i] / 1000U) % 0xFFFFFFFFU);
+
+    result[i] = 0U;
+    if ((flags[i] & REPLAY_TICK) != 0U) {
+      safety_tick_current_safety_config();
+      if (safety_config_valid()) {
+        result[i] |= REPLAY_RX_CHECKS_VALID;
+      }
+    }
+
+    if ((flags[i] & (REPLAY_RX | REPLAY_TX)) != 0U) {
+      msg.extended = (addr[i] >= 0x800U) ? 1U : 0U;
+      msg.addr = addr[i];
+      // bus is the src of the frame, the fwd hook gets it as is and the packet the panda bus
+      msg.bus = bus[i] % 4U;
+      msg.data_len_code = dlc_from_len(len[i]);
+      for (int j = 0; j < len[i]; j++) {
+        msg.data[j] = data[(i * 64) + j];
+      }
+
+      bool ok;
+      if ((flags[i] & REPLAY_TX) != 0U) {
+        ok = safety_tx_hook(&msg);
+      } else {
+        safety_fwd_hook(bus[i], addr[i]);
+        ok = safety_rx_hook(&msg);
+      }
+      if (ok) {
+        result[i] |= REPLAY_OK;
+      }
+    }
+
+    const MADSState *mads = get_mads_state();
+    state[i] = (controls_allowed ? REPLAY_CONTROLS_ALLOWED : 0U) |
+               (controls_allowed_lateral ? REPLAY_CONTROLS_ALLOWED_LATERAL : 0U) |
+               (get_longitudinal_allowed() ? REPLAY_LONGITUDINAL_ALLOWED : 0U) |
+               (mads->controls_requested_lateral ? REPLAY_CONTROLS_REQUESTED_LATERAL : 0U) |
+               (acc_main_on ? REPLAY_ACC_MAIN_ON : 0U) |
+               (m_mads_state.acc_main.current ? REPLAY_MADS_ACC_MAIN : 0U) |
+               (mads->system_enabled ? REPLAY_MADS_ENABLED : 0U) |
+               ((uint32_t)mads->current_disengage.active_reason << 24U);
+  }
+}
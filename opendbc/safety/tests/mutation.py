@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
 import io
 import os
 import re
+import shutil
+import signal
 import subprocess
 import sys
 import tempfile
@@ -50,6 +53,42 @@ MUTATOR_FAMILIES = {
 }
 
 
+# test modules for the sites in each safety mode header, headers shared by several modes map to all of them.
+# a header missing here would run no tests and all its mutants would survive, so main() checks it's complete
+MODE_TESTS = {
+  "body.h": ("test_body.py",),
+  "chrysler.h": ("test_chrysler.py",),
+  "chrysler_common.h": ("test_chrysler.py", "test_chrysler_cusw.py"),
+  "chrysler_cusw.h": ("test_chrysler_cusw.py",),
+  "defaults.h": ("test_defaults.py", "test_elm327.py"),
+  "elm327.h": ("test_elm327.py",),
+  "ford.h": ("test_ford.py",),
+  "gm.h": ("test_gm.py",),
+  "honda.h": ("test_honda.py",),
+  "hyundai.h": ("test_hyundai.py",),
+  "hyundai_canfd.h": ("test_hyundai_canfd.py",),
+  "hyundai_common.h": ("test_hyundai.py", "test_hyundai_canfd.py"),
+  "mazda.h": ("test_mazda.py",),
+  "nissan.h": ("test_nissan.py",),
+  "psa.h": ("test_psa.py",),
+  "rivian.h": ("test_rivian.py",),
+  "subaru.h": ("test_subaru.py",),
+  "subaru_common.h": ("test_subaru.py", "test_subaru_preglobal.py"),
+  "subaru_preglobal.h": ("test_subaru_preglobal.py",),
+  "tesla.h": ("test_tesla.py",),
+  "toyota.h": ("test_toyota.py",),
+  "volkswagen_common.h": ("test_volkswagen_mqb.py", "test_volkswagen_meb.py", "test_volkswagen_mlb.py", "test_volkswagen_pq.py"),
+  "volkswagen_meb.h": ("test_volkswagen_meb.py",),
+  "volkswagen_mlb.h": ("test_volkswagen_mlb.py",),
+  "volkswagen_mqb.h": ("test_volkswagen_mqb.py",),
+  "volkswagen_pq.h": ("test_volkswagen_pq.py",),
+}
+
+# a mutant whose tests run longer than this is stuck, e.g. in a loop whose exit condition was mutated
+MUTANT_TIMEOUT = 120.
+
+MUTATION_CFLAGS = ["-shared", "-fPIC", "-w", "-fno-builtin", "-std=gnu11", "-g0", "-O0", "-DALLOW_DEBUG"]
+
 _RawSite = namedtuple('_RawSite', 'expr_start expr_end op_start op_end line original_op mutated_op mutator')
 
 
@@ -308,11 +347,19 @@ def build_priority_tests(site, catalog, core_tests):
   is_mode = len(rel_parts) >= 4 and rel_parts[:3] == ("opendbc", "safety", "modes")
 
   if is_mode:
-    mode_file = f"test_{src.stem}.py"
-    return list(catalog.get(mode_file, []))
+    return [test_id for test_file in MODE_TESTS[src.name] for test_id in catalog.get(test_file, [])]
   return core_tests
 
 
+def check_mode_tests(catalog):
+  """Names the mode headers missing from MODE_TESTS, and the test modules it maps to that don't exist"""
+  errors = [f"{header.relative_to(ROOT)} has no entry in MODE_TESTS"
+            for header in sorted((SAFETY_DIR / "modes").glob("*.h")) if header.name not in MODE_TESTS]
+  errors += [f"{test_file} in MODE_TESTS[{header!r}] has no tests"
+             for header, test_files in MODE_TESTS.items() for test_file in test_files if not catalog.get(test_file)]
+  return errors
+
+
 def format_site_snippet(site, context_lines=2):
   source = site.origin_file
   text = source.read_text()
@@ -469,24 +516,68 @@ def compile_mutated_library(preprocessed_source, sites, output_so):
   mutation_source = output_so.with_suffix(".c")
   mutation_source.write_text(instrumented)
 
-  subprocess.run([
-    "cc", "-shared", "-fPIC", "-w", "-fno-builtin", "-std=gnu11",
-    "-g0", "-O0", "-DALLOW_DEBUG",
-    str(mutation_source), "-o", str(output_so),
-  ], cwd=ROOT, check=True)
+  # every mutant is in the one library, so the safety code only changing between runs invalidates it
+  from opendbc.safety.tests.libsafety.libsafety_py import CACHE_DIR
+  key = hashlib.sha256(instrumented.encode() + " ".join(MUTATION_CFLAGS).encode() + subprocess.check_output(["cc", "--version"])).hexdigest()
+  cached_so = Path(CACHE_DIR) / f"mutation-{key[:16]}.so" if CACHE_DIR else None
+  if cached_so is not None and cached_so.exists():
+    shutil.copyfile(cached_so, output_so)
+    return True
+
+  subprocess.run(["cc", *MUTATION_CFLAGS, str(mutation_source), "-o", str(output_so)], cwd=ROOT, check=True)
+  if cached_so is not None:
+    try:
+      cached_so.parent.mkdir(parents=True, exist_ok=True)
+      tmp_so = cached_so.with_suffix(f".{os.getpid()}.tmp")
+      shutil.copyfile(output_so, tmp_so)
+      os.replace(tmp_so, cached_so)
+    except OSError:
+      pass  # the cache is best effort
+  return False
 
 
-def eval_mutant(site, targets, lib_path, verbose):
+def eval_mutant(site, targets, lib_path, verbose, timeout=MUTANT_TIMEOUT):
+  """Runs a mutant's tests in a forked process, until the first failure. A mutant that crashes
+  or hangs is killed, and only takes its own process down instead of the pool worker."""
+  t0 = time.perf_counter()
   try:
-    t0 = time.perf_counter()
-    failed_test = run_unittest(targets, lib_path, mutant_id=site.site_id, verbose=verbose)
-    duration = time.perf_counter() - t0
-    if failed_test is not None:
-      return MutantResult(site, "killed", duration, "")
-    return MutantResult(site, "survived", duration, "")
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+      os.close(read_fd)
+      status = 2
+      try:
+        failed_test = run_unittest(targets, lib_path, mutant_id=site.site_id, verbose=verbose)
+        status = 0 if failed_test is None else 1
+      except BaseException as exc:
+        os.write(write_fd, repr(exc).encode()[:4096])
+      finally:
+        os._exit(status)
+
+    os.close(write_fd)
+    while (waited := os.waitpid(pid, os.WNOHANG))[0] == 0:
+      if time.perf_counter() - t0 > timeout:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        os.close(read_fd)
+        return MutantResult(site, "killed", time.perf_counter() - t0, "timed out")
+      time.sleep(0.005)
+    with os.fdopen(read_fd) as f:
+      details = f.read()
   except Exception as exc:
     return MutantResult(site, "infra_error", 0.0, str(exc))
 
+  duration = time.perf_counter() - t0
+  status = waited[1]
+  if os.WIFSIGNALED(status):
+    return MutantResult(site, "killed", duration, f"crashed with signal {os.WTERMSIG(status)}")
+  code = os.WEXITSTATUS(status)
+  if code == 0:
+    return MutantResult(site, "survived", duration, "")
+  if code == 1:
+    return MutantResult(site, "killed", duration, "")
+  return MutantResult(site, "infra_error", duration, details or f"exit code {code}")
+
 
 def main():
   parser = argparse.ArgumentParser(description="Run strict safety mutation")
@@ -528,11 +619,17 @@ def main():
       return 2
 
     mutation_lib = Path(run_tmp_dir) / "libsafety_mutation.so"
-    compile_mutated_library(preprocessed_source, sites, mutation_lib)
+    if compile_mutated_library(preprocessed_source, sites, mutation_lib):
+      print("Using cached mutation library", flush=True)
 
     # Discover all tests by importing modules in the main process.
     # Forked workers inherit these imports, eliminating per-worker import cost.
     catalog = _discover_test_catalog()
+    if errors := check_mode_tests(catalog):
+      print("Mode headers without tests, add them to MODE_TESTS:", flush=True)
+      for error in errors:
+        print(f"  {error}", flush=True)
+      return 2
 
     # Baseline smoke check
     baseline_ids = catalog.get("test_defaults.py", [])[:5]
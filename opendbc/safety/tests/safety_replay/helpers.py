@@ -1,3 +1,7 @@
+from typing import NamedTuple
+
+import numpy as np
+
 from opendbc.car.ford.values import FordSafetyFlags
 from opendbc.car.hyundai.values import HyundaiSafetyFlags
 from opendbc.car.toyota.values import ToyotaSafetyFlags
@@ -111,3 +115,40 @@ def init_segment(safety, msgs, mode, param):
     safety.set_desired_curvature_last(angle)
     safety.set_curvature_meas(angle, angle)
   assert safety.safety_tx_hook(msg), "failed to initialize safety for segment"
+
+
+class ReplayBatch(NamedTuple):
+  nanos: np.ndarray
+  address: np.ndarray
+  src: np.ndarray
+  length: np.ndarray
+  data: np.ndarray
+  flags: np.ndarray
+
+
+def build_replay_batch(can_msgs, start_t, end_t):
+  """Flattens can and sendcan events into the columns taken by libsafety_py.replay_batch(). Frames
+  we sent on can are left out, and the first frame of each event between 1s after start_t and 1s
+  before end_t also ticks the safety config, or a tick-only entry if the event has no frames"""
+  rows = []
+  for msg in can_msgs:
+    t = msg.logMonoTime
+    tick = libsafety_py.REPLAY_TICK if (t - start_t > 1e9 and end_t - t > 1e9) else 0
+    if msg.which() == 'sendcan':
+      frames = [(c, libsafety_py.REPLAY_TX) for c in msg.sendcan]
+    else:
+      frames = [(c, libsafety_py.REPLAY_RX) for c in msg.can if c.src < 128]
+    if tick and not frames:
+      rows.append((t, 0, 0, b'', tick))
+    for c, kind in frames:
+      rows.append((t, c.address, c.src, c.dat, kind | tick))
+      tick = 0
+
+  nanos, address, src, dat, flags = zip(*rows, strict=True) if rows else ((),) * 5
+  data = np.frombuffer(b''.join(bytes(d).ljust(64, b'\0') for d in dat), dtype=np.uint8).reshape(-1, 64)
+  return ReplayBatch(np.array(nanos, dtype=np.uint64), np.array(address, dtype=np.uint32), np.array(src, dtype=np.uint8),
+                     np.array([len(d) for d in dat], dtype=np.uint8), data, np.array(flags, dtype=np.uint8))
+
+
+def replay_batch(safety, batch: ReplayBatch):
+  return libsafety_py.replay_batch(safety, batch.nanos, batch.address, batch.src, batch.length, batch.data, batch.flags)
@@ -2,27 +2,27 @@
 import argparse
 import os
 from collections import Counter, defaultdict
-from tqdm import tqdm
+
+import numpy as np
 
 from opendbc.safety import ALTERNATIVE_EXPERIENCE
 from opendbc.safety.tests.libsafety import libsafety_py
+from opendbc.safety.tests.libsafety.libsafety_py import REPLAY_OK, REPLAY_RX, REPLAY_RX_CHECKS_VALID, REPLAY_TICK, REPLAY_TX, replay_state
 from opendbc.car.carlog import carlog
-from opendbc.safety.tests.safety_replay.helpers import package_can_msg, init_segment
+from opendbc.safety.tests.safety_replay.helpers import build_replay_batch, init_segment, replay_batch
 
-# Define debug variables and their getter methods
-DEBUG_VARS = {
-  'controls_allowed': lambda safety: safety.get_controls_allowed(),
-  'controls_allowed_lateral': lambda safety: safety.get_controls_allowed_lateral(),
-  'longitudinal_tx_allowed': lambda safety: safety.get_longitudinal_allowed(),
-  'controls_requested_lateral': lambda safety: safety.get_controls_requested_lateral(),
-  'current_disengage_reason': lambda safety: safety.mads_get_current_disengage_reason(),
-  'stock_acc_main': lambda safety: safety.get_acc_main_on(),
-  'mads_acc_main': lambda safety: safety.get_mads_acc_main(),
-}
+# debug variables, as sampled by the batched replay after each frame
+DEBUG_VARS = ('controls_allowed', 'controls_allowed_lateral', 'longitudinal_tx_allowed', 'controls_requested_lateral',
+              'current_disengage_reason', 'stock_acc_main', 'mads_acc_main')
 
 
-# replay a drive to check for safety violations
-def replay_drive(msgs, safety_mode, param, alternative_experience, param_sp):
+def debug_state(state):
+  decoded = replay_state(int(state))
+  return {var: decoded[var] for var in DEBUG_VARS}
+
+
+# replay a drive and count safety violations
+def replay_segment(msgs, safety_mode, param, alternative_experience, param_sp) -> dict:
   safety = libsafety_py.libsafety
   msgs.sort(key=lambda m: m.logMonoTime)
 
@@ -42,11 +42,8 @@ def replay_drive(msgs, safety_mode, param, alternative_experience, param_sp):
 
   init_segment(safety, msgs, safety_mode, param)
 
-  rx_tot, rx_invalid, tx_tot, tx_blocked, tx_controls, tx_controls_lateral, tx_controls_blocked, tx_controls_lateral_blocked = 0, 0, 0, 0, 0, 0, 0, 0
   mads_mismatch = 0
-  safety_tick_rx_invalid = False
   blocked_addrs = Counter()
-  invalid_addrs = set()
 
   # Track last good state for each address
   last_good_states = defaultdict(lambda: {
@@ -57,95 +54,140 @@ def replay_drive(msgs, safety_mode, param, alternative_experience, param_sp):
   can_msgs = [m for m in msgs if m.which() in ('can', 'sendcan')]
   start_t = can_msgs[0].logMonoTime
   end_t = can_msgs[-1].logMonoTime
-  for msg in tqdm(can_msgs):
-    safety.set_timer((msg.logMonoTime // 1000) % 0xFFFFFFFF)
-
-    # skip start and end of route, warm up/down period
-    if msg.logMonoTime - start_t > 1e9 and end_t - msg.logMonoTime > 1e9:
-      safety.safety_tick_current_safety_config()
-      safety_tick_rx_invalid |= not safety.safety_config_valid() or safety_tick_rx_invalid
-
-    if msg.which() == 'sendcan':
-      for canmsg in msg.sendcan:
-        _msg = package_can_msg(canmsg)
-        sent = safety.safety_tx_hook(_msg)
-
-        # mismatch: with MADS enabled, stock controls_allowed went true but MADS didn't follow on lateral
-        if safety.get_enable_mads() and safety.get_controls_allowed() and not safety.get_controls_allowed_lateral():
-          mads_mismatch += 1
-          print(f"controls_allowed but not controls_allowed_lateral [{mads_mismatch}]")
-          print(f"msg:{canmsg.address} ({hex(canmsg.address)})")
-          for var, getter in DEBUG_VARS.items():
-            print(f"  {var}: {getter(safety)}")
-        if not sent:
-          tx_blocked += 1
-          tx_controls_blocked += safety.get_controls_allowed()
-          tx_controls_lateral_blocked += safety.get_controls_allowed_lateral()
-          blocked_addrs[canmsg.address] += 1
-
-          carlog.debug("blocked bus %d msg %d at %f" % (canmsg.src, canmsg.address, (msg.logMonoTime - start_t) / 1e9))
-
-          if "DEBUG" in os.environ:
-            last_good = last_good_states[canmsg.address]
-            print(f"\nBlocked message at {(msg.logMonoTime - start_t) / 1e9:.3f}s:")
-            print(f"Address: {hex(canmsg.address)} (bus {canmsg.src})")
-            print("Current state:")
-            for var, getter in DEBUG_VARS.items():
-              print(f"  {var}: {getter(safety)}")
-
-            if last_good['timestamp'] is not None:
-              print(f"\nLast good state ({last_good['timestamp']:.3f}s):")
-              for var in DEBUG_VARS:
-                print(f"  {var}: {last_good[var]}")
-            else:
-              print("\nNo previous good state found for this address")
-            print("-" * 80)
-        else:  # Update last good state if message is allowed
-          last_good_states[canmsg.address].update({
-            'timestamp': (msg.logMonoTime - start_t) / 1e9,
-            **{var: getter(safety) for var, getter in DEBUG_VARS.items()}
-          })
-
-        tx_controls += safety.get_controls_allowed()
-        tx_controls_lateral += safety.get_controls_allowed_lateral()
-        tx_tot += 1
-    elif msg.which() == 'can':
-      # ignore msgs we sent
-      for canmsg in filter(lambda m: m.src < 128, msg.can):
-        safety.safety_fwd_hook(canmsg.src, canmsg.address)
-        _msg = package_can_msg(canmsg)
-        recv = safety.safety_rx_hook(_msg)
-        if not recv:
-          rx_invalid += 1
-          invalid_addrs.add(canmsg.address)
-        rx_tot += 1
-
+  batch = build_replay_batch(can_msgs, start_t, end_t)
+  result, state = replay_batch(safety, batch)
+
+  ok = (result & REPLAY_OK) != 0
+  ticks = (batch.flags & REPLAY_TICK) != 0
+  safety_tick_rx_invalid = bool(np.any(ticks & ((result & REPLAY_RX_CHECKS_VALID) == 0)))
+
+  rx = (batch.flags & REPLAY_RX) != 0
+  rx_tot = int(rx.sum())
+  rx_invalid = int((rx & ~ok).sum())
+  invalid_addrs = set(batch.address[rx & ~ok].tolist())
+
+  tx = (batch.flags & REPLAY_TX) != 0
+  tx_blocked_mask = tx & ~ok
+  controls = (state & libsafety_py.REPLAY_STATE_BITS['controls_allowed']) != 0
+  controls_lateral = (state & libsafety_py.REPLAY_STATE_BITS['controls_allowed_lateral']) != 0
+  tx_tot = int(tx.sum())
+  tx_blocked = int(tx_blocked_mask.sum())
+  tx_controls = int((tx & controls).sum())
+  tx_controls_lateral = int((tx & controls_lateral).sum())
+  tx_controls_blocked = int((tx_blocked_mask & controls).sum())
+  tx_controls_lateral_blocked = int((tx_blocked_mask & controls_lateral).sum())
+  blocked_addrs.update(batch.address[tx_blocked_mask].tolist())
+
+  # mismatch: with MADS enabled, stock controls_allowed went true but MADS didn't follow on lateral
+  mads_enabled = (state & libsafety_py.REPLAY_STATE_BITS['mads_enabled']) != 0
+  mismatch = mads_enabled & controls & ~controls_lateral
+
+  debug = "DEBUG" in os.environ
+  for i in np.flatnonzero(tx):
+    address, t = int(batch.address[i]), (int(batch.nanos[i]) - start_t) / 1e9
+    if mismatch[i]:
+      mads_mismatch += 1
+      print(f"controls_allowed but not controls_allowed_lateral [{mads_mismatch}]")
+      print(f"msg:{address} ({hex(address)})")
+      for var, value in debug_state(state[i]).items():
+        print(f"  {var}: {value}")
+
+    if ok[i]:  # Update last good state if message is allowed
+      if debug:
+        last_good_states[address].update({'timestamp': t, **debug_state(state[i])})
+      continue
+
+    carlog.debug("blocked bus %d msg %d at %f" % (batch.src[i], address, t))
+    if debug:
+      last_good = last_good_states[address]
+      print(f"\nBlocked message at {t:.3f}s:")
+      print(f"Address: {hex(address)} (bus {batch.src[i]})")
+      print("Current state:")
+      for var, value in debug_state(state[i]).items():
+        print(f"  {var}: {value}")
+
+      if last_good['timestamp'] is not None:
+        print(f"\nLast good state ({last_good['timestamp']:.3f}s):")
+        for var in DEBUG_VARS:
+          print(f"  {var}: {last_good[var]}")
+      else:
+        print("\nNo previous good state found for this address")
+      print("-" * 80)
+
+  return {
+    'rx_tot': rx_tot,
+    'rx_invalid': rx_invalid,
+    'safety_tick_rx_invalid': safety_tick_rx_invalid,
+    'invalid_addrs': sorted(invalid_addrs),
+    'tx_tot': tx_tot,
+    'tx_controls': tx_controls,
+    'tx_controls_lateral': tx_controls_lateral,
+    'tx_blocked': tx_blocked,
+    'tx_controls_blocked': tx_controls_blocked,
+    'tx_controls_lateral_blocked': tx_controls_lateral_blocked,
+    'blocked_addrs': dict(blocked_addrs),
+    'mads_enabled': bool(safety.get_enable_mads()),
+    'controls_allowed_lateral': bool(safety.get_controls_allowed_lateral()),
+    'longitudinal_tx_allowed': bool(safety.get_longitudinal_allowed()),
+    'mads_mismatch': mads_mismatch,
+  }
+
+
+def replay_passed(stats: dict) -> bool:
+  return stats['tx_controls_blocked'] == 0 and stats['tx_controls_lateral_blocked'] == 0 and stats['rx_invalid'] == 0 and \
+         not stats['safety_tick_rx_invalid'] and stats['mads_mismatch'] == 0
+
+
+def print_stats(stats: dict) -> None:
   print("\nRX")
-  print("total rx msgs:", rx_tot)
-  print("invalid rx msgs:", rx_invalid)
-  print("safety tick rx invalid:", safety_tick_rx_invalid)
-  print("invalid addrs:", invalid_addrs)
+  print("total rx msgs:", stats['rx_tot'])
+  print("invalid rx msgs:", stats['rx_invalid'])
+  print("safety tick rx invalid:", stats['safety_tick_rx_invalid'])
+  print("invalid addrs:", set(stats['invalid_addrs']))
   print("\nTX")
-  print("total openpilot msgs:", tx_tot)
-  print("total msgs with controls_allowed:", tx_controls)
-  print("total msgs with controls_allowed_lateral:", tx_controls_lateral)
-  print("blocked msgs:", tx_blocked)
-  print("blocked with controls_allowed:", tx_controls_blocked)
-  print("blocked with controls_allowed_lateral:", tx_controls_lateral_blocked)
-  print("blocked addrs:", blocked_addrs)
+  print("total openpilot msgs:", stats['tx_tot'])
+  print("total msgs with controls_allowed:", stats['tx_controls'])
+  print("total msgs with controls_allowed_lateral:", stats['tx_controls_lateral'])
+  print("blocked msgs:", stats['tx_blocked'])
+  print("blocked with controls_allowed:", stats['tx_controls_blocked'])
+  print("blocked with controls_allowed_lateral:", stats['tx_controls_lateral_blocked'])
+  print("blocked addrs:", Counter(stats['blocked_addrs']))
   print("\nMADS")
-  print("mads enabled:", safety.get_enable_mads())
-  print("controls_allowed_lateral (mads):", safety.get_controls_allowed_lateral())
-  print("longitudinal_tx_allowed (controls_allowed && !gas_pressed):", safety.get_longitudinal_allowed())
-  print("mads mismatch (mads_enabled && controls_allowed && !controls_allowed_lateral):", mads_mismatch)
+  print("mads enabled:", stats['mads_enabled'])
+  print("controls_allowed_lateral (mads):", stats['controls_allowed_lateral'])
+  print("longitudinal_tx_allowed (controls_allowed && !gas_pressed):", stats['longitudinal_tx_allowed'])
+  print("mads mismatch (mads_enabled && controls_allowed && !controls_allowed_lateral):", stats['mads_mismatch'])
+
 
-  return tx_controls_blocked == 0 and tx_controls_lateral_blocked == 0 and rx_invalid == 0 and \
-         not safety_tick_rx_invalid and mads_mismatch == 0
+# replay a drive to check for safety violations
+def replay_drive(msgs, safety_mode, param, alternative_experience, param_sp):
+  stats = replay_segment(msgs, safety_mode, param, alternative_experience, param_sp)
+  print_stats(stats)
+  return replay_passed(stats)
+
+
+def get_safety_params(lr, mode=None, param=None, alternative_experience=None, param_sp=None) -> tuple[int, int, int, int]:
+  """Safety mode, param, alternative experience and sunnypilot param of a log, where not overridden"""
+  if None in (mode, param, alternative_experience, param_sp):
+    CP = lr.first('carParams')
+    CP_SP = lr.first('carParamsSP')
+    if mode is None:
+      mode = CP.safetyConfigs[-1].safetyModel.raw
+    if param is None:
+      param = CP.safetyConfigs[-1].safetyParam
+    if alternative_experience is None:
+      alternative_experience = CP.alternativeExperience
+    if param_sp is None:
+      param_sp = CP_SP.safetyParam if hasattr(CP_SP, 'safetyParam') else 0
+  return mode, param, alternative_experience, param_sp
 
 
 if __name__ == "__main__":
   from openpilot.tools.lib.logreader import LogReader
 
+  # replays don't need coverage, use the optimized and cached build unless asked otherwise
+  os.environ.setdefault("LIBSAFETY_PROFILE", "perf")
+
   parser = argparse.ArgumentParser(description="Replay CAN messages from a route or segment through a safety mode",
                                    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
   parser.add_argument("route_or_segment_name", nargs='+')
@@ -156,19 +198,8 @@ if __name__ == "__main__":
   args = parser.parse_args()
 
   lr = LogReader(args.route_or_segment_name[0])
-
-  if None in (args.mode, args.param, args.alternative_experience, args.param_sp):
-    CP = lr.first('carParams')
-    CP_SP = lr.first('carParamsSP')
-    if args.mode is None:
-      args.mode = CP.safetyConfigs[-1].safetyModel.raw
-    if args.param is None:
-      args.param = CP.safetyConfigs[-1].safetyParam
-    if args.alternative_experience is None:
-      args.alternative_experience = CP.alternativeExperience
-    if args.param_sp is None:
-      _param_sp = CP_SP.safetyParam if hasattr(CP_SP, 'safetyParam') else 0
-      args.param_sp = _param_sp
+  args.mode, args.param, args.alternative_experience, args.param_sp = get_safety_params(lr, args.mode, args.param, args.alternative_experience,
+                                                                                         args.param_sp)
 
   print(f"replaying {args.route_or_segment_name[0]} with safety mode {args.mode}, param {args.param}, alternative experience {args.alternative_experience}, " +
         f"param_sp {args.param_sp}")
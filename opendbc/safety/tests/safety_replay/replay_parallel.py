@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Replays many logs or segments through a safety mode in parallel, and merges what they found.
+
+libsafety's state is global, so each worker process loads its own copy and replays one log at a
+time. The merged report, with the stats of every log, is written as JSON, and summarized on stdout:
+
+  python opendbc/safety/tests/safety_replay/replay_parallel.py ~/drives/*/rlog.zst -j 16 -o report.json
+  python opendbc/safety/tests/safety_replay/replay_parallel.py --list segments.txt --mode 2 --param 73
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from opendbc.safety.tests.safety_replay.replay_drive import get_safety_params, replay_passed, replay_segment
+
+# summed over all logs
+COUNTERS = ('rx_tot', 'rx_invalid', 'tx_tot', 'tx_controls', 'tx_controls_lateral', 'tx_blocked', 'tx_controls_blocked',
+            'tx_controls_lateral_blocked', 'mads_mismatch')
+
+
+def replay_log(log: str, overrides: tuple) -> dict:
+  """Replays one log in this process. overrides are the mode, param, alternative experience and
+  sunnypilot param, None to take them from the log"""
+  t1 = time.monotonic()
+  try:
+    from openpilot.tools.lib.logreader import LogReader
+    lr = LogReader(log)
+    mode, param, alternative_experience, param_sp = get_safety_params(lr, *overrides)
+    # replay_segment prints each blocked msg and MADS mismatch, which would interleave between workers
+    with contextlib.redirect_stdout(io.StringIO()):
+      stats = replay_segment(list(lr), mode, param, alternative_experience, param_sp)
+  except Exception as e:
+    return {'log': log, 'error': repr(e), 'seconds': time.monotonic() - t1}
+
+  return {
+    'log': log,
+    'mode': mode,
+    'param': param,
+    'alternative_experience': alternative_experience,
+    'param_sp': param_sp,
+    'passed': replay_passed(stats),
+    'seconds': time.monotonic() - t1,
+    **stats,
+  }
+
+
+def merge_results(results: list[dict]) -> dict:
+  """Merges the results of replay_log() into one report"""
+  replayed = [r for r in results if 'error' not in r]
+  blocked_addrs: Counter = Counter()
+  invalid_addrs: set[int] = set()
+  by_mode: dict[str, dict] = defaultdict(lambda: {'logs': 0, 'failed': 0})
+  for r in replayed:
+    blocked_addrs.update({int(addr): count for addr, count in r['blocked_addrs'].items()})
+    invalid_addrs.update(r['invalid_addrs'])
+    mode = by_mode[f"{r['mode']}:{r['param']}"]
+    mode['logs'] += 1
+    mode['failed'] += not r['passed']
+
+  return {
+    'logs': len(results),
+    'replayed': len(replayed),
+    'passed': sum(r['passed'] for r in replayed),
+    'failed': sorted(r['log'] for r in replayed if not r['passed']),
+    'errors': {r['log']: r['error'] for r in results if 'error' in r},
+    **{k: sum(r[k] for r in replayed) for k in COUNTERS},
+    'safety_tick_rx_invalid': sorted(r['log'] for r in replayed if r['safety_tick_rx_invalid']),
+    'mads_mismatch_logs': sorted(r['log'] for r in replayed if r['mads_mismatch']),
+    'blocked_addrs': {hex(addr): count for addr, count in blocked_addrs.most_common()},
+    'invalid_addrs': [hex(addr) for addr in sorted(invalid_addrs)],
+    'by_mode': dict(sorted(by_mode.items())),
+    'seconds': sum(r['seconds'] for r in results),
+    'results': sorted(results, key=lambda r: r['log']),
+  }
+
+
+def format_summary(report: dict) -> str:
+  n_failed, n_errors = len(report['failed']), len(report['errors'])
+  lines = [
+    f"replayed {report['replayed']}/{report['logs']} logs, {report['passed']} passed, {n_failed} failed, {n_errors} errors",
+    "",
+    "RX",
+    f"  total rx msgs: {report['rx_tot']}",
+    f"  invalid rx msgs: {report['rx_invalid']}",
+    f"  invalid addrs: {', '.join(report['invalid_addrs']) or '-'}",
+    f"  logs with safety tick rx invalid: {len(report['safety_tick_rx_invalid'])}",
+    "TX",
+    f"  total openpilot msgs: {report['tx_tot']}",
+    f"  blocked msgs: {report['tx_blocked']}",
+    f"  blocked with controls_allowed: {report['tx_controls_blocked']}",
+    f"  blocked with controls_allowed_lateral: {report['tx_controls_lateral_blocked']}",
+    f"  blocked addrs: {', '.join(f'{addr} ({count})' for addr, count in report['blocked_addrs'].items()) or '-'}",
+    "MADS",
+    f"  mads mismatches: {report['mads_mismatch']} in {len(report['mads_mismatch_logs'])} logs",
+    "",
+    "by mode:param",
+    *(f"  {mode:12} {m['logs']:5} logs {m['failed']:5} failed" for mode, m in report['by_mode'].items()),
+  ]
+  if report['failed']:
+    lines += ["", "failed:", *(f"  {log}" for log in report['failed'])]
+  if report['errors']:
+    lines += ["", "errors:", *(f"  {log}: {error}" for log, error in report['errors'].items())]
+  return "\n".join(lines)
+
+
+def replay_logs(logs: list[str], overrides: tuple = (None,) * 4, workers: int | None = None, progress: bool = True) -> dict:
+  """Replays the logs across a pool of worker processes, and returns the merged report"""
+  results = []
+  # spawned, so no worker inherits a libsafety another process already used
+  ctx = multiprocessing.get_context("spawn")
+  with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+    futures = {pool.submit(replay_log, log, overrides): log for log in logs}
+    for future in as_completed(futures):
+      try:
+        r = future.result()
+      except Exception as e:
+        # a worker that dies, e.g. on a libsafety crash or sanitizer abort, breaks the pool for every pending log
+        r = {'log': futures[future], 'error': repr(e), 'seconds': 0.}
+      results.append(r)
+      if progress:
+        status = f"error {r['error']}" if 'error' in r else ('passed' if r['passed'] else 'FAILED')
+        print(f"[{len(results)}/{len(logs)}] {r['log']}: {status} ({r['seconds']:.1f}s)", file=sys.stderr)
+  return merge_results(results)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("logs", nargs="*", help="logs, segments or routes, anything LogReader takes")
+  parser.add_argument("--list", help="file with a log per line, added to logs")
+  parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes")
+  parser.add_argument("-o", "--output", help="write the JSON report here")
+  parser.add_argument("--mode", type=int, help="Override the safety mode from the logs")
+  parser.add_argument("--param", type=int, help="Override the safety param from the logs")
+  parser.add_argument("--alternative-experience", type=int, help="Override the alternative experience from the logs")
+  parser.add_argument("--param-sp", type=int, help="Override the sunnypilot safety param from the logs")
+  args = parser.parse_args()
+
+  logs = list(args.logs)
+  if args.list:
+    with open(args.list) as f:
+      logs += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+  if not logs:
+    parser.error("no logs given")
+
+  # inherited by the workers, which then share one optimized and cached build
+  os.environ.setdefault("LIBSAFETY_PROFILE", "perf")
+
+  t1 = time.monotonic()
+  report = replay_logs(logs, (args.mode, args.param, args.alternative_experience, args.param_sp), args.jobs)
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(report, f, indent=2)
+
+  print(format_summary(report))
+  print(f"\n{time.monotonic() - t1:.1f}s wall, {report['seconds']:.1f}s replaying")
+  sys.exit(0 if report['passed'] == report['logs'] else 1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import unittest
+
+# imported as modules so their test cases aren't collected twice
+import opendbc.safety.tests.test_honda as test_honda
+import opendbc.safety.tests.test_hyundai_canfd as test_hyundai_canfd
+import opendbc.safety.tests.test_tesla as test_tesla
+
+
+class ScannedLibsafety:
+  """libsafety, with rx_checks and tx_msgs scanned again after set_safety_hooks() rebuilds the lookup"""
+
+  def __init__(self, safety):
+    self._safety = safety
+
+  def __getattr__(self, name):
+    return getattr(self._safety, name)
+
+  def set_safety_hooks(self, mode, param):
+    ret = self._safety.set_safety_hooks(mode, param)
+    self._safety.set_addr_lookup_indexed(False)
+    return ret
+
+
+class ScannedSafetyTest:
+  """Runs a mode's tests with rx_checks and tx_msgs scanned, as they are for configs too big
+  for the address lookup. Both paths must behave the same."""
+
+  def setUp(self):
+    super().setUp()
+    self.safety = ScannedLibsafety(self.safety)
+    self.safety.set_addr_lookup_indexed(False)
+
+  def tearDown(self):
+    # tests that reset the safety hooks must not have switched back to the lookup
+    self.assertFalse(self.safety.get_addr_lookup_indexed())
+    super().tearDown()
+
+
+# rx checks with alternative messages
+class TestHondaNidecAltGasInterceptorScanned(ScannedSafetyTest, test_honda.TestHondaNidecAltGasInterceptorSafety):
+  pass
+
+
+class TestHyundaiCanfdLFASteeringAltButtonsScanned(ScannedSafetyTest, test_hyundai_canfd.TestHyundaiCanfdLFASteeringAltButtons):
+  pass
+
+
+# tx msgs with static blocking disabled
+class TestTeslaLongitudinalScanned(ScannedSafetyTest, test_tesla.TestTeslaLongitudinalSafety):
+  pass
+
+
+if __name__ == "__main__":
+  unittest.main()
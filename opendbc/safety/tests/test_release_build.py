@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
+import os
+import tempfile
 import unittest
+from unittest import mock
 
+from opendbc.safety.tests.libsafety import libsafety_py
 from opendbc.safety.tests.libsafety.libsafety_py import _build_libsafety
 
 
@@ -11,6 +15,21 @@ class TestBuild(unittest.TestCase):
   def test_release_build(self):
     _build_libsafety(release=True)
 
+  def test_perf_build(self):
+    with tempfile.TemporaryDirectory() as tmp, mock.patch.object(libsafety_py, "CACHE_DIR", tmp):
+      path = _build_libsafety(perf=True, sanitize=False)
+      mtime = os.path.getmtime(path)
+
+      # cached until the sources or flags change
+      self.assertEqual(_build_libsafety(perf=True, sanitize=False), path)
+      self.assertEqual(os.path.getmtime(path), mtime)
+      self.assertNotEqual(_build_libsafety(perf=True, sanitize=True), path)
+
+  def test_perf_build_uncached(self):
+    with mock.patch.object(libsafety_py, "CACHE_DIR", ""), \
+         mock.patch.object(libsafety_py, "_build_cached", side_effect=AssertionError("cache used")):
+      self.assertTrue(os.path.exists(_build_libsafety(perf=True, sanitize=False)))
+
 
 if __name__ == "__main__":
   unittest.main()
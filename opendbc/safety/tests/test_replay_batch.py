@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import random
+import unittest
+
+import numpy as np
+
+from opendbc.can import CANPacker
+from opendbc.car.structs import CarParams
+from opendbc.safety import ALTERNATIVE_EXPERIENCE
+from opendbc.safety.tests.libsafety import libsafety_py
+from opendbc.safety.tests.libsafety.libsafety_py import REPLAY_OK, REPLAY_RX, REPLAY_RX_CHECKS_VALID, REPLAY_STATE_BITS, REPLAY_TICK, REPLAY_TX
+
+
+def random_frames(n, seed=0):
+  rng = random.Random(seed)
+  packer = CANPacker("toyota_nodsu_pt_generated")
+  msgs = [m for m in packer.dbc.msgs.values() if m.size <= 8]
+  rows = []
+  for i in range(n):
+    msg = rng.choice(msgs)
+    if rng.random() < 0.5:
+      dat = packer.make_can_msg(msg.name, 0, {s: rng.randint(0, 3) for s in msg.sigs})[1]
+    else:
+      dat = bytes(rng.getrandbits(8) for _ in range(msg.size))
+    flags = rng.choice([REPLAY_RX] * 4 + [REPLAY_TX, REPLAY_TICK]) | (REPLAY_TICK if rng.random() < 0.05 else 0)
+    rows.append((1_000_000_000 + i * 250_000, msg.address, rng.choice([0, 0, 0, 1, 2, 4, 6]), dat, flags))
+  nanos, address, bus, dat, flags = zip(*rows, strict=True)
+  data = np.zeros((n, 64), dtype=np.uint8)
+  for i, d in enumerate(dat):
+    data[i, :len(d)] = np.frombuffer(d, dtype=np.uint8)
+  return np.array(nanos), np.array(address), np.array(bus), np.array([len(d) for d in dat]), data, np.array(flags)
+
+
+def replay_per_frame(safety, nanos, address, bus, length, data, flags):
+  # the batch, one cffi call at a time, with the src masked for the packets like package_can_msg()
+  result, state = np.zeros(len(nanos), dtype=np.uint8), np.zeros(len(nanos), dtype=np.uint32)
+  for i in range(len(nanos)):
+    safety.set_timer((int(nanos[i]) // 1000) % 0xFFFFFFFF)
+    if flags[i] & REPLAY_TICK:
+      safety.safety_tick_current_safety_config()
+      result[i] |= REPLAY_RX_CHECKS_VALID if safety.safety_config_valid() else 0
+
+    msg = libsafety_py.make_CANPacket(int(address[i]), int(bus[i]) % 4, bytes(data[i, :length[i]]))
+    ok = False
+    if flags[i] & REPLAY_TX:
+      ok = safety.safety_tx_hook(msg)
+    elif flags[i] & REPLAY_RX:
+      safety.safety_fwd_hook(int(bus[i]), int(address[i]))
+      ok = safety.safety_rx_hook(msg)
+    result[i] |= REPLAY_OK if ok else 0
+
+    values = {
+      'controls_allowed': safety.get_controls_allowed(),
+      'controls_allowed_lateral': safety.get_controls_allowed_lateral(),
+      'longitudinal_tx_allowed': safety.get_longitudinal_allowed(),
+      'controls_requested_lateral': safety.get_controls_requested_lateral(),
+      'stock_acc_main': safety.get_acc_main_on(),
+      'mads_acc_main': safety.get_mads_acc_main(),
+      'mads_enabled': safety.get_enable_mads(),
+    }
+    state[i] = sum(REPLAY_STATE_BITS[k] for k, v in values.items() if v) | (safety.mads_get_current_disengage_reason() << 24)
+  return result, state
+
+
+class TestReplayBatch(unittest.TestCase):
+  def setUp(self):
+    self.safety = libsafety_py.libsafety
+
+  def _init(self):
+    self.safety.set_safety_hooks(CarParams.SafetyModel.toyota, 73)
+    self.safety.init_tests()
+    self.safety.set_alternative_experience(ALTERNATIVE_EXPERIENCE.ENABLE_MADS)
+    self.safety.set_mads_params(True, False, False)
+    self.safety.set_controls_allowed(True)
+
+  def test_matches_per_frame(self):
+    for seed in range(3):
+      frames = random_frames(3000, seed)
+      self._init()
+      expected = replay_per_frame(self.safety, *frames)
+      self._init()
+      result, state = libsafety_py.replay_batch(self.safety, *frames)
+      np.testing.assert_array_equal(result, expected[0])
+      np.testing.assert_array_equal(state, expected[1])
+
+      # both outcomes are covered
+      assert 0 < np.count_nonzero(result & REPLAY_OK) < len(result)
+
+  def test_replay_state(self):
+    state = REPLAY_STATE_BITS['controls_allowed'] | REPLAY_STATE_BITS['mads_acc_main'] | (3 << 24)
+    decoded = libsafety_py.replay_state(state)
+    assert decoded['controls_allowed'] and decoded['mads_acc_main'] and not decoded['controls_allowed_lateral']
+    assert decoded['current_disengage_reason'] == 3
+
+  def test_empty(self):
+    result, state = libsafety_py.replay_batch(self.safety, [], [], [], [], np.zeros((0, 64)), [])
+    assert len(result) == len(state) == 0
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import unittest
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from opendbc.safety.tests.safety_replay import replay_parallel
+from opendbc.safety.tests.safety_replay.replay_parallel import COUNTERS, format_summary, merge_results
+
+
+def replay_result(log, mode=2, param=73, passed=True, **stats):
+  return {
+    'log': log, 'mode': mode, 'param': param, 'alternative_experience': 0, 'param_sp': 0, 'passed': passed, 'seconds': 1.5,
+    **dict.fromkeys(COUNTERS, 0), 'safety_tick_rx_invalid': False, 'invalid_addrs': [], 'blocked_addrs': {},
+    'mads_enabled': False, 'controls_allowed_lateral': False, 'longitudinal_tx_allowed': False, **stats,
+  }
+
+
+class TestReplayParallel(unittest.TestCase):
+  def test_merge_results(self):
+    results = [
+      replay_result("b", rx_tot=100, tx_tot=10, tx_blocked=2, blocked_addrs={0x2e4: 2}, invalid_addrs=[0x1d2]),
+      replay_result("a", param=0, passed=False, rx_tot=50, rx_invalid=3, tx_tot=5, tx_blocked=1, tx_controls_blocked=1,
+                    blocked_addrs={0x2e4: 1, 0x343: 4}, invalid_addrs=[0x1d2, 0xaa], safety_tick_rx_invalid=True),
+      {'log': "c", 'error': "RuntimeError('no can')", 'seconds': 0.5},
+    ]
+    report = merge_results(results)
+
+    assert (report['logs'], report['replayed'], report['passed']) == (3, 2, 1)
+    assert report['failed'] == ["a"]
+    assert report['errors'] == {"c": "RuntimeError('no can')"}
+    assert (report['rx_tot'], report['rx_invalid'], report['tx_tot'], report['tx_blocked'], report['tx_controls_blocked']) == (150, 3, 15, 3, 1)
+    assert report['safety_tick_rx_invalid'] == ["a"] and report['mads_mismatch_logs'] == []
+    # most blocked first
+    assert report['blocked_addrs'] == {'0x343': 4, '0x2e4': 3}
+    assert report['invalid_addrs'] == ['0xaa', '0x1d2']
+    assert report['by_mode'] == {'2:0': {'logs': 1, 'failed': 1}, '2:73': {'logs': 1, 'failed': 0}}
+    assert report['seconds'] == 3.5
+    assert [r['log'] for r in report['results']] == ["a", "b", "c"]
+
+    summary = format_summary(report)
+    assert "replayed 2/3 logs, 1 passed, 1 failed, 1 errors" in summary
+    assert "blocked addrs: 0x343 (4), 0x2e4 (3)" in summary
+    assert "failed:\n  a" in summary and "errors:\n  c: RuntimeError('no can')" in summary
+
+  def test_merge_json_results(self):
+    # blocked_addrs keys are strings once the results went through JSON
+    report = merge_results([replay_result("a", blocked_addrs={"740": 1}), replay_result("b", blocked_addrs={740: 2})])
+    assert report['blocked_addrs'] == {'0x2e4': 3}
+
+  def test_broken_pool(self):
+    # every pending log of a pool whose worker died is reported as an error, not raised
+    class BrokenPool:
+      def __init__(self, *args, **kwargs):
+        pass
+
+      def __enter__(self):
+        return self
+
+      def __exit__(self, *args):
+        pass
+
+      def submit(self, fn, log, overrides):
+        future = Future()
+        if log == "ok":
+          future.set_result(replay_result(log))
+        else:
+          future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+    with mock.patch.object(replay_parallel, "ProcessPoolExecutor", BrokenPool):
+      report = replay_parallel.replay_logs(["ok", "crash1", "crash2"], progress=False)
+    assert (report['logs'], report['replayed'], report['passed']) == (3, 1, 1)
+    assert set(report['errors']) == {"crash1", "crash2"} and "worker died" in report['errors']["crash1"]
+
+
+if __name__ == "__main__":
+  unittest.main()